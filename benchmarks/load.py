@@ -0,0 +1,569 @@
+"""Load test the server end to end.
+
+The server runs in a child process with a benchmark application (or the
+application of main.py) and is driven over localhost by load generator
+processes. Each generator keeps its connections busy with one request at a
+time (a closed loop), so the latencies are measured under the load the
+server can sustain rather than at a fixed rate.
+
+Usage:
+    python -m benchmarks.load [--engine threaded] [--duration 5]
+        [--scenarios small_get,json] [--output results.json]
+        [--baseline baseline.json] [--threshold 0.1]
+
+The results are printed and written as JSON, a previous result file can be
+given as baseline: the scenarios whose throughput dropped or whose p99
+latency grew by more than the threshold are reported and the exit code is 1.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import selectors
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+HOST = "127.0.0.1"
+PORT = 8099
+RECV_SIZE = 65536
+REQUEST_TIMEOUT = 10.0
+SERVER_START_TIMEOUT = 10.0
+
+
+@dataclass
+class Scenario:
+    """A load test scenario."""
+
+    name: str
+    path: str
+    method: str = "GET"
+    body_size: int = 0
+    connections: int = 16
+    slow_clients: int = 0
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario("small_get", "/"),
+        Scenario("json", "/json?name=bench"),
+        Scenario("template", "/template"),
+        Scenario("post_echo", "/echo", method="POST", body_size=1024 * 1024, connections=4),
+        Scenario("many_connections", "/", connections=512),
+        Scenario("slow_clients", "/", slow_clients=64),
+    )
+}
+
+
+def create_app():
+    """Create the benchmark application, its routes match the ones of main.py."""
+    from wsgi.application import WSGIApplication
+    from wsgi.application.response import HTMLResponse, PlainTextResponse
+    from wsgi.application.template import Template
+
+    app = WSGIApplication()
+    page = Template(
+        "bench.html",
+        ".",
+        source=(
+            "<html><body><h1>{{ title }}</h1><table>"
+            "{% for row in rows %}<tr><td>{{ row.id }}</td><td>{{ row.name }}</td></tr>{% endfor %}"
+            "</table></body></html>"
+        ),
+    )
+    rows = [{"id": i, "name": f"user {i}"} for i in range(20)]
+
+    @app.get("/")
+    def index(request):
+        return PlainTextResponse(body="Hello, World!")
+
+    @app.get("/json")
+    def json_page(request):
+        return {"message": f"Hello, {request.query.get('name', 'World')}!", "items": list(range(10))}
+
+    @app.get("/template")
+    def template_page(request):
+        return HTMLResponse(body=page.render(title="Benchmark", rows=rows))
+
+    @app.post("/echo")
+    def echo(request):
+        return PlainTextResponse(body=request.body)
+
+    return app
+
+
+def serve(args: argparse.Namespace):
+    """Run the server, in the child process."""
+    from wsgi.server import WSGIServer
+
+    if args.app == "main":
+        from main import app
+    else:
+        app = create_app()
+    WSGIServer(
+        args.host,
+        args.port,
+        app,
+        engine=args.engine,
+        workers=args.workers,
+        access_log=os.devnull,
+        max_keep_alive_requests=args.max_keep_alive_requests,
+    ).server_forever()
+
+
+def start_server(args: argparse.Namespace) -> subprocess.Popen:
+    """Start the server process and wait until it accepts connections."""
+    command = [
+        sys.executable, "-m", "benchmarks.load", "--serve",
+        "--host", args.host, "--port", str(args.port), "--app", args.app,
+        "--engine", args.engine, "--workers", str(args.workers),
+        "--max-keep-alive-requests", str(args.max_keep_alive_requests),
+    ]  # fmt: skip
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The server exited with code {process.returncode}")
+        try:
+            socket.create_connection((args.host, args.port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    stop_server(process)
+    raise RuntimeError("The server did not start")
+
+
+def stop_server(process: subprocess.Popen):
+    """Stop the server process."""
+    process.terminate()
+    try:
+        process.wait(5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def get_rss(pid: int) -> Optional[int]:
+    """Get the resident memory of a process and its children, Linux only.
+    Args:
+        pid (int): The process id.
+    Returns:
+        int: The bytes, None if /proc is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as status:
+            rss = next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmRSS:"))
+        children = []
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children", encoding="ascii") as file:
+                children.extend(int(child) for child in file.read().split())
+    except (OSError, StopIteration):
+        return None
+    return rss + sum(get_rss(child) or 0 for child in children)
+
+
+def build_request(scenario: Scenario, host: str, port: int) -> bytes:
+    """Encode the request of a scenario."""
+    head = f"{scenario.method} {scenario.path} HTTP/1.1\r\nHost: {host}:{port}\r\nUser-Agent: own-wsgi-bench\r\n"
+    if scenario.body_size:
+        head += f"Content-Type: application/octet-stream\r\nContent-Length: {scenario.body_size}\r\n"
+    return (head + "\r\n").encode("latin-1") + b"x" * scenario.body_size
+
+
+def response_length(buffer: bytearray) -> Optional[int]:
+    """Get the length of the response at the start of a buffer.
+    Args:
+        buffer (bytearray): The received bytes.
+    Returns:
+        int: The length, None if the response is not complete yet.
+    """
+    header_end = buffer.find(b"\r\n\r\n")
+    if header_end < 0:
+        return None
+    body_start = header_end + 4
+    headers = bytes(buffer[:header_end]).lower()
+    position = headers.find(b"\r\ncontent-length:")
+    if position >= 0:
+        end = headers.find(b"\r\n", position + 2)
+        length = int(headers[position + 17 : end if end >= 0 else None])
+        return body_start + length if len(buffer) >= body_start + length else None
+    if b"\r\ntransfer-encoding: chunked" not in headers:
+        # A response without a body (HEAD, 204, 304)
+        return body_start
+    position = body_start
+    while True:
+        line_end = buffer.find(b"\r\n", position)
+        if line_end < 0:
+            return None
+        size = int(bytes(buffer[position:line_end]).split(b";")[0], 16)
+        position = line_end + 2 + size + 2
+        if len(buffer) < position:
+            return None
+        if size == 0:
+            return position
+
+
+class ClientConnection:
+    """A non-blocking connection of the load generator."""
+
+    __slots__ = ("sock", "buffer", "pending", "started")
+
+    def __init__(self, host: str, port: int, blocking: bool = False):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if blocking:
+            self.sock.settimeout(REQUEST_TIMEOUT)
+            self.sock.connect((host, port))
+        else:
+            self.sock.setblocking(False)
+            self.sock.connect_ex((host, port))
+        self.buffer = bytearray()
+        self.pending = memoryview(b"")
+        self.started = time.perf_counter()
+
+    def send(self, request: bytes):
+        """Start sending a request."""
+        self.started = time.perf_counter()
+        self.pending = memoryview(request)
+
+    def write(self) -> bool:
+        """Send the pending bytes of the request.
+        Returns:
+            bool: Whether the request is completely sent.
+        Raises:
+            OSError: If the connection failed.
+        """
+        error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            raise OSError(error, os.strerror(error))
+        try:
+            sent = self.sock.send(self.pending)
+        except BlockingIOError:
+            return False
+        self.pending = self.pending[sent:]
+        return not self.pending
+
+    def close(self):
+        """Close the socket."""
+        self.sock.close()
+
+
+def run_client(options: dict) -> dict:
+    """Drive the server from a load generator process.
+    Args:
+        options (dict): The host, port, scenario, connections, duration and warmup.
+    Returns:
+        dict: The latencies (seconds), the status counts, the errors and the bytes received.
+    """
+    host, port = options["host"], options["port"]
+    scenario = Scenario(**options["scenario"])
+    request = build_request(scenario, host, port)
+    selector = selectors.DefaultSelector()
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = {"connect": 0, "reset": 0, "timeout": 0}
+    received = 0
+    start = time.perf_counter()
+    record_from = start + options["warmup"]
+    deadline = record_from + options["duration"]
+
+    def open_connection():
+        try:
+            connection = ClientConnection(host, port)
+        except OSError:
+            errors["connect"] += 1
+            return
+        connection.send(request)
+        selector.register(connection.sock, selectors.EVENT_WRITE, connection)
+
+    def replace(connection: ClientConnection, error: str):
+        errors[error] += 1
+        selector.unregister(connection.sock)
+        connection.close()
+        if time.perf_counter() < deadline:
+            open_connection()
+
+    for _ in range(options["connections"]):
+        open_connection()
+    while selector.get_map():
+        if time.perf_counter() >= deadline + REQUEST_TIMEOUT:
+            break
+        for key, events in selector.select(timeout=0.1):
+            connection = key.data
+            if events & selectors.EVENT_WRITE:
+                try:
+                    if connection.write():
+                        selector.modify(connection.sock, selectors.EVENT_READ, connection)
+                except OSError:
+                    replace(connection, "reset" if connection.buffer else "connect")
+                continue
+            try:
+                data = connection.sock.recv(RECV_SIZE)
+            except BlockingIOError:
+                continue
+            except OSError:
+                data = b""
+            if not data:
+                replace(connection, "reset")
+                continue
+            connection.buffer += data
+            length = response_length(connection.buffer)
+            if length is None:
+                continue
+            now = time.perf_counter()
+            if now >= record_from and connection.started < deadline:
+                latencies.append(now - connection.started)
+                status = bytes(connection.buffer[9:12]).decode("latin-1")
+                statuses[status] = statuses.get(status, 0) + 1
+                received += length
+            del connection.buffer[:length]
+            if now >= deadline:
+                selector.unregister(connection.sock)
+                connection.close()
+                continue
+            connection.send(request)
+            selector.modify(connection.sock, selectors.EVENT_WRITE, connection)
+        now = time.perf_counter()
+        for key in list(selector.get_map().values()):
+            if now - key.data.started > REQUEST_TIMEOUT:
+                replace(key.data, "timeout")
+    for key in list(selector.get_map().values()):
+        key.data.close()
+    return {"latencies": latencies, "statuses": statuses, "errors": errors, "bytes": received}
+
+
+def run_slow_clients(options: dict) -> dict:
+    """Keep connections busy sending their request one byte at a time.
+    Args:
+        options (dict): The host, port, scenario, connections, duration and warmup.
+    Returns:
+        dict: The number of responses received and of failed connections.
+    """
+    scenario = Scenario(**options["scenario"])
+    request = build_request(scenario, options["host"], options["port"])
+    deadline = time.perf_counter() + options["warmup"] + options["duration"]
+    connections = []
+    completed = failed = 0
+    for _ in range(options["connections"]):
+        try:
+            connection = ClientConnection(options["host"], options["port"], blocking=True)
+        except OSError:
+            failed += 1
+            continue
+        connections.append([connection, 0])
+    interval = 0.05
+    while connections and time.perf_counter() < deadline:
+        for item in list(connections):
+            connection, sent = item
+            try:
+                if sent < len(request):
+                    connection.sock.sendall(request[sent : sent + 1])
+                    item[1] += 1
+                    continue
+                connection.buffer += connection.sock.recv(RECV_SIZE)
+                if response_length(connection.buffer) is not None:
+                    completed += 1
+                    connection.buffer.clear()
+                    item[1] = 0
+            except OSError:
+                failed += 1
+                connection.close()
+                connections.remove(item)
+        time.sleep(interval)
+    for connection, _ in connections:
+        connection.close()
+    return {"slow_completed": completed, "slow_failed": failed}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Get a percentile of sorted values with the nearest-rank method."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+def run_scenario(scenario: Scenario, args: argparse.Namespace, server: subprocess.Popen) -> dict:
+    """Run a scenario and summarize its results."""
+    processes = max(1, min(args.processes, scenario.connections))
+    base = {
+        "host": args.host,
+        "port": args.port,
+        "scenario": asdict(scenario),
+        "duration": args.duration,
+        "warmup": args.warmup,
+    }
+    jobs = [
+        (run_client, dict(base, connections=count))
+        for count in split(scenario.connections, processes)
+    ]
+    if scenario.slow_clients:
+        slow_scenario = dict(base["scenario"], method="GET", body_size=0)
+        jobs.append((run_slow_clients, dict(base, scenario=slow_scenario, connections=scenario.slow_clients)))
+    with multiprocessing.Pool(len(jobs)) as pool:
+        pending = [pool.apply_async(function, (options,)) for function, options in jobs]
+        results = [result.get() for result in pending]
+    latencies = sorted(latency for result in results for latency in result.get("latencies", ()))
+    statuses: Dict[str, int] = {}
+    errors: Dict[str, int] = {}
+    extra: Dict[str, int] = {}
+    received = 0
+    for result in results:
+        for status, count in result.get("statuses", {}).items():
+            statuses[status] = statuses.get(status, 0) + count
+        for error, count in result.get("errors", {}).items():
+            errors[error] = errors.get(error, 0) + count
+        received += result.get("bytes", 0)
+        for name in ("slow_completed", "slow_failed"):
+            if name in result:
+                extra[name] = result[name]
+    errors["status"] = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    return {
+        "scenario": scenario.name,
+        "connections": scenario.connections,
+        "requests": len(latencies),
+        "throughput": len(latencies) / args.duration,
+        "transfer": received / args.duration,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": (latencies[-1] if latencies else 0.0) * 1000,
+        },
+        "statuses": statuses,
+        "errors": errors,
+        "server_rss": get_rss(server.pid),
+        **extra,
+    }
+
+
+def split(total: int, parts: int) -> List[int]:
+    """Split a number in nearly equal parts."""
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def report(result: dict):
+    """Print the summary of a scenario."""
+    latency = result["latency_ms"]
+    rss = result["server_rss"]
+    errors = sum(result["errors"].values())
+    line = (
+        f"{result['scenario']:<18} {result['throughput']:10.0f} req/s"
+        f"  p50 {latency['p50']:7.2f}  p95 {latency['p95']:7.2f}"
+        f"  p99 {latency['p99']:7.2f}  max {latency['max']:8.2f} ms"
+        f"  errors {errors:<5d} rss {rss / 2**20 if rss else 0:6.1f} MiB"
+    )
+    if "slow_completed" in result:
+        line += f"  slow {result['slow_completed']} ok / {result['slow_failed']} failed"
+    print(line, flush=True)
+
+
+def compare(results: List[dict], baseline: dict, threshold: float) -> List[str]:
+    """Compare the results with a baseline.
+    Args:
+        results (list): The scenario results.
+        baseline (dict): A previous result file.
+        threshold (float): The relative change reported as a regression.
+    Returns:
+        list: The regressions found.
+    """
+    previous = {result["scenario"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        old = previous.get(result["scenario"])
+        if old is None:
+            continue
+        throughput = change(old["throughput"], result["throughput"])
+        p99 = change(old["latency_ms"]["p99"], result["latency_ms"]["p99"])
+        print(f"{result['scenario']:<18} throughput {throughput:+7.1%}  p99 {p99:+7.1%}")
+        if throughput < -threshold:
+            regressions.append(f"{result['scenario']}: throughput {throughput:+.1%}")
+        if p99 > threshold:
+            regressions.append(f"{result['scenario']}: p99 latency {p99:+.1%}")
+        if sum(result["errors"].values()) > sum(old["errors"].values()):
+            regressions.append(f"{result['scenario']}: errors {sum(result['errors'].values())}")
+    return regressions
+
+
+def change(old: float, new: float) -> float:
+    """Get the relative change of a value."""
+    return (new - old) / old if old else 0.0
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--app", choices=("bench", "main"), default="bench", help="the application served")
+    parser.add_argument("--engine", default="threaded", help="threaded, selector or asyncio")
+    parser.add_argument("--workers", type=int, default=1, help="the server worker processes")
+    parser.add_argument("--max-keep-alive-requests", type=int, default=1_000_000)
+    parser.add_argument(
+        "--scenarios", default=",".join(SCENARIOS), help=f"comma separated, from {', '.join(SCENARIOS)}"
+    )
+    parser.add_argument("--duration", type=float, default=5.0, help="the seconds measured per scenario")
+    parser.add_argument("--warmup", type=float, default=1.0, help="the seconds before measuring")
+    parser.add_argument(
+        "--processes", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="the load generator processes"
+    )
+    parser.add_argument("--output", help="the JSON file the results are written to")
+    parser.add_argument("--baseline", help="a previous JSON result file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="the relative change reported as a regression")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    """Run the load test."""
+    args = parse_args()
+    if args.serve:
+        serve(args)
+        return
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)}")
+    server = start_server(args)
+    results = []
+    try:
+        print(f"engine {args.engine}, {args.workers} worker(s), {args.processes} load process(es)")
+        for name in names:
+            result = run_scenario(SCENARIOS[name], args, server)
+            report(result)
+            results.append(result)
+    finally:
+        stop_server(server)
+    document = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {
+            "engine": args.engine,
+            "workers": args.workers,
+            "app": args.app,
+            "duration": args.duration,
+            "processes": args.processes,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(document, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
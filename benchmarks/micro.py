@@ -0,0 +1,435 @@
+"""Benchmark the hot functions of the server and the application in isolation.
+
+Each benchmark is warmed up, then timed over several repeats of a fixed
+number of calls. The allocations are measured afterwards in a separate pass
+with tracemalloc, which would slow down the timed calls: the peak memory
+allocated by one call and the memory blocks still held after the calls.
+
+Usage:
+    python -m benchmarks.micro [--filter parser] [--repeat 7]
+        [--output results.json] [--baseline baseline.json] [--threshold 0.1]
+
+With --baseline the benchmarks whose median time grew by more than the
+threshold are reported and the exit code is 1.
+"""
+
+import argparse
+import gc
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+from wsgi.application import WSGIApplication
+from wsgi.application.request import Request
+from wsgi.application.response import JSONResponse
+from wsgi.application.router import Router
+from wsgi.application.template import Template
+from wsgi.server.http_request_parse import HttpRequestParser
+from wsgi.server.http_response import make_header_block, make_response
+from wsgi.server.splitbuffer import SplitBuffer
+from wsgi.server.wsgi import WSGIRequest, WSGIResponse, make_base_environ
+
+HEADERS = [
+    ("Host", "localhost:8080"),
+    ("User-Agent", "Mozilla/5.0 (X11; Linux x86_64) Gecko/20100101 Firefox/128.0"),
+    ("Accept", "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"),
+    ("Accept-Language", "en-US,en;q=0.5"),
+    ("Accept-Encoding", "gzip, deflate, br"),
+    ("Connection", "keep-alive"),
+    ("Cookie", "session=4f2a9c; theme=dark"),
+    ("Upgrade-Insecure-Requests", "1"),
+    ("Cache-Control", "max-age=0"),
+    ("Referer", "http://localhost:8080/"),
+]
+REQUEST = (
+    "GET /users/42?page=2&sort=name HTTP/1.1\r\n"
+    + "".join(f"{name}: {value}\r\n" for name, value in HEADERS)
+    + "\r\n"
+).encode("latin-1")
+PAYLOAD = {
+    "users": [
+        {"id": i, "name": f"user {i}", "email": f"user{i}@example.com", "active": i % 2 == 0}
+        for i in range(50)
+    ],
+    "page": 2,
+}
+
+
+@dataclass
+class Benchmark:
+    """A benchmark, setup returns the function called by the timed loop."""
+
+    name: str
+    setup: Callable[[], Callable[[], Any]]
+    number: int
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str, number: int = 1000):
+    """Register the setup function of a benchmark."""
+
+    def decorator(setup):
+        BENCHMARKS.append(Benchmark(name, setup, number))
+        return setup
+
+    return decorator
+
+
+class NullProtocol:
+    """A parser protocol ignoring the callbacks."""
+
+    def on_message_begin(self):
+        pass
+
+    def on_url(self, url: bytes):
+        pass
+
+    def on_header(self, name: bytes, value: bytes):
+        pass
+
+    def on_headers_complete(self):
+        pass
+
+    def on_body(self, body: bytes):
+        pass
+
+    def on_message_complete(self):
+        pass
+
+
+@benchmark("splitbuffer.pop request lines", number=5000)
+def setup_splitbuffer_pop():
+    buffer = SplitBuffer()
+
+    def run():
+        buffer.feed_data(REQUEST)
+        while buffer.pop(b"\r\n"):
+            pass
+
+    return run
+
+
+@benchmark("parser.feed_data request", number=5000)
+def setup_parser():
+    parser = HttpRequestParser(NullProtocol())
+    return lambda: parser.feed_data(REQUEST)
+
+
+@benchmark("parser.feed_data fragmented", number=1000)
+def setup_parser_fragmented():
+    parser = HttpRequestParser(NullProtocol())
+    fragments = [REQUEST[i : i + 16] for i in range(0, len(REQUEST), 16)]
+
+    def run():
+        for fragment in fragments:
+            parser.feed_data(fragment)
+
+    return run
+
+
+@benchmark("parser.feed_data 1 MiB body", number=100)
+def setup_parser_large():
+    parser = HttpRequestParser(NullProtocol())
+    body = b"x" * (1024 * 1024)
+    head = f"POST /upload HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+    chunks = [head] + [body[i : i + 65536] for i in range(0, len(body), 65536)]
+
+    def run():
+        for chunk in chunks:
+            parser.feed_data(chunk)
+
+    return run
+
+
+def create_router(size: int) -> Router:
+    """Create a router with static and parameter routes."""
+    router = Router()
+    for i in range(size // 2):
+        router.register(f"/static/{i}/page", "GET", lambda request: None)
+        router.register(f"/items{i}/{{id:int}}/detail", "GET", lambda request, id: None)
+    router.freeze()
+    return router
+
+
+@benchmark("router.get_route_handler static (1000 routes)", number=20000)
+def setup_router_static():
+    router = create_router(1000)
+    return lambda: router.get_route_handler("/static/250/page", "GET")
+
+
+@benchmark("router.get_route_handler param (1000 routes)", number=20000)
+def setup_router_param():
+    router = create_router(1000)
+    return lambda: router.get_route_handler("/items250/42/detail", "GET")
+
+
+@benchmark("router.get_route_handler miss (1000 routes)", number=20000)
+def setup_router_miss():
+    router = create_router(1000)
+    return lambda: router.get_route_handler("/missing/path", "GET")
+
+
+@benchmark("wsgirequest.to_environ", number=20000)
+def setup_to_environ():
+    base_environ = make_base_environ("localhost", 8080)
+    request = WSGIRequest("GET", "/users/42?page=2&sort=name", "HTTP/1.1", list(HEADERS))
+    return lambda: request.to_environ(base_environ, ("127.0.0.1", 50000))
+
+
+def create_environ() -> dict:
+    """Create the environ of the benchmark request."""
+    request = WSGIRequest("GET", "/users/42?page=2&sort=name", "HTTP/1.1", list(HEADERS))
+    return request.to_environ(make_base_environ("localhost", 8080), ("127.0.0.1", 50000))
+
+
+@benchmark("request.from_environ", number=50000)
+def setup_request():
+    environ = create_environ()
+    return lambda: Request.from_environ(environ)
+
+
+@benchmark("request.from_environ query+headers", number=20000)
+def setup_request_parsed():
+    environ = create_environ()
+
+    def run():
+        request = Request.from_environ(environ)
+        return request.query.get("page"), request.headers.get("Accept-Encoding")
+
+    return run
+
+
+@benchmark("make_response", number=20000)
+def setup_make_response():
+    headers = [("Content-Type", "text/plain"), ("Content-Length", "13")]
+    return lambda: make_response("200 OK", headers, b"Hello, World!")
+
+
+@benchmark("make_header_block", number=20000)
+def setup_header_block():
+    headers = [("Content-Type", "application/json"), ("Content-Length", "2048")]
+    return lambda: make_header_block("200 OK", headers, True, True)
+
+
+@benchmark("template.render 20 rows", number=5000)
+def setup_template():
+    template = Template(
+        "bench.html",
+        ".",
+        source=(
+            "<html><body><h1>{{ title }}</h1><table>"
+            "{% for row in rows %}<tr><td>{{ row.id }}</td><td>{{ row.name }}</td></tr>{% endfor %}"
+            "</table></body></html>"
+        ),
+    )
+    rows = [{"id": i, "name": f"user <{i}>"} for i in range(20)]
+    return lambda: template.render(title="Benchmark", rows=rows)
+
+
+@benchmark("jsonresponse 50 objects", number=5000)
+def setup_json_response():
+    # The body is encoded when it is first read
+    return lambda: JSONResponse(body=PAYLOAD).body
+
+
+@benchmark("wsgiresponse serialize json", number=5000)
+def setup_wsgi_response():
+    body = JSONResponse(body=PAYLOAD).body
+    request = WSGIRequest("GET", "/users", "HTTP/1.1", list(HEADERS))
+    sent = []
+
+    def run():
+        response = WSGIResponse(send=sent.extend)
+        response.prepare(request, True)
+        response.start_response("200 OK", [("Content-Type", "application/json")])
+        response.set_length_hint([body])
+        response.write(body)
+        response.finish()
+        sent.clear()
+
+    return run
+
+
+@benchmark("application call json route", number=5000)
+def setup_application():
+    app = WSGIApplication()
+
+    @app.get("/users/{id:int}")
+    def user(request, id):
+        return {"id": id, "page": request.query.get("page")}
+
+    app.freeze()
+    environ = create_environ()
+    start_response = lambda status, headers: None
+
+    def run():
+        environ["wsgi.input"] = io.BytesIO()
+        return b"".join(app(environ, start_response))
+
+    return run
+
+
+def time_benchmark(func: Callable[[], Any], number: int, repeat: int, warmup: float) -> List[float]:
+    """Time a function.
+    Args:
+        func (callable): The function.
+        number (int): The calls per repeat.
+        repeat (int): The number of repeats.
+        warmup (float): The seconds the function is called before timing.
+    Returns:
+        list: The seconds per call of each repeat.
+    """
+    deadline = time.perf_counter() + warmup
+    while time.perf_counter() < deadline:
+        func()
+    loop = range(number)
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in loop:
+                func()
+            timings.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return timings
+
+
+def measure_allocations(func: Callable[[], Any], number: int) -> Dict[str, float]:
+    """Measure the memory allocated by a function with tracemalloc.
+    Args:
+        func (callable): The function.
+        number (int): The calls measured for the retained blocks.
+    Returns:
+        dict: The peak bytes allocated by a call and the blocks retained per call.
+    """
+    number = max(1, min(number, 1000))
+    tracemalloc.start()
+    try:
+        func()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        before = tracemalloc.take_snapshot()
+        for _ in range(number):
+            func()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return {"peak_bytes": max(peak - current, 0), "retained_blocks": retained / number}
+
+
+def run_benchmark(bench: Benchmark, args: argparse.Namespace) -> dict:
+    """Run a benchmark and summarize it."""
+    func = bench.setup()
+    number = max(1, int(bench.number * args.scale))
+    timings = time_benchmark(func, number, args.repeat, args.warmup)
+    result = {
+        "name": bench.name,
+        "number": number,
+        "repeat": args.repeat,
+        "min_us": min(timings) * 1e6,
+        "median_us": statistics.median(timings) * 1e6,
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "stdev_us": statistics.stdev(timings) * 1e6 if len(timings) > 1 else 0.0,
+    }
+    if not args.no_allocations:
+        result.update(measure_allocations(func, number))
+    return result
+
+
+def report(result: dict):
+    """Print the summary of a benchmark."""
+    line = (
+        f"{result['name']:<48} {result['median_us']:10.2f} us"
+        f"  min {result['min_us']:10.2f}  stdev {result['stdev_us']:8.2f}"
+    )
+    if "peak_bytes" in result:
+        line += f"  peak {result['peak_bytes'] / 1024:8.1f} KiB  retained {result['retained_blocks']:6.2f}"
+    print(line, flush=True)
+
+
+def compare(results: List[dict], baseline: dict, threshold: float) -> List[str]:
+    """Compare the results with a baseline.
+    Args:
+        results (list): The benchmark results.
+        baseline (dict): A previous result file.
+        threshold (float): The relative slowdown reported as a regression.
+    Returns:
+        list: The regressions found.
+    """
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        old = previous.get(result["name"])
+        if old is None:
+            continue
+        change = (result["median_us"] - old["median_us"]) / old["median_us"]
+        line = f"{result['name']:<48} {change:+7.1%}"
+        if "peak_bytes" in result and "peak_bytes" in old:
+            line += f"  peak {result['peak_bytes'] - old['peak_bytes']:+8.0f} B"
+        print(line)
+        if change > threshold:
+            regressions.append(f"{result['name']}: {change:+.1%}")
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--filter", default="", help="only run the benchmarks whose name contains it")
+    parser.add_argument("--repeat", type=int, default=7, help="the timed repeats")
+    parser.add_argument("--warmup", type=float, default=0.2, help="the seconds of warmup")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the calls per repeat")
+    parser.add_argument("--no-allocations", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks")
+    parser.add_argument("--output", help="the JSON file the results are written to")
+    parser.add_argument("--baseline", help="a previous JSON result file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="the relative slowdown reported as a regression")
+    return parser.parse_args()
+
+
+def main():
+    """Run the benchmarks."""
+    args = parse_args()
+    selected = [bench for bench in BENCHMARKS if args.filter in bench.name]
+    if args.list:
+        print("\n".join(bench.name for bench in selected))
+        return
+    results = []
+    for bench in selected:
+        result = run_benchmark(bench, args)
+        report(result)
+        results.append(result)
+    document = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(document, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
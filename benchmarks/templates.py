@@ -0,0 +1,102 @@
+"""Benchmark the compiled templates against the str.format rendering.
+
+Usage:
+    python -m benchmarks.templates [--number 2000]
+"""
+
+import argparse
+import timeit
+
+from wsgi.application.template import Template
+
+FORMAT_PAGE = "<html><body><h1>{title}</h1><p>{message}</p>{rows}</body></html>"
+TEMPLATE_PAGE = (
+    "<html><body><h1>{{ title }}</h1><p>{{ message }}</p>"
+    "{% for row in rows %}<tr><td>{{ row.id }}</td><td>{{ row.name }}</td></tr>{% endfor %}"
+    "</body></html>"
+)
+SIMPLE_FORMAT = "<p>Message: {message}</p>"
+SIMPLE_TEMPLATE = "<p>Message: {{ message }}</p>"
+
+
+def render_format(context):
+    """Render the page with str.format, the rows are formatted by hand."""
+    rows = "".join(
+        "<tr><td>{id}</td><td>{name}</td></tr>".format(**row) for row in context["rows"]
+    )
+    return FORMAT_PAGE.format(title=context["title"], message=context["message"], rows=rows)
+
+
+def report(name: str, seconds: float, number: int):
+    """Print the time of one call."""
+    print(f"{name:<32} {seconds / number * 1e6:10.2f} us")
+
+
+def main():
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000, help="the calls per benchmark")
+    parser.add_argument("--rows", type=int, default=100, help="the rows of the page")
+    args = parser.parse_args()
+    number = args.number
+    context = {
+        "title": "Benchmark",
+        "message": "Hello, World!",
+        "rows": [{"id": i, "name": f"user {i}"} for i in range(args.rows)],
+    }
+
+    report(
+        "compile simple",
+        timeit.timeit(lambda: Template("simple.txt", ".", source=SIMPLE_TEMPLATE), number=number),
+        number,
+    )
+    report(
+        "compile page",
+        timeit.timeit(lambda: Template("page.txt", ".", source=TEMPLATE_PAGE), number=number),
+        number,
+    )
+
+    simple = Template("simple.txt", ".", source=SIMPLE_TEMPLATE)
+    simple_html = Template("simple.html", ".", source=SIMPLE_TEMPLATE)
+    report(
+        "str.format simple",
+        timeit.timeit(lambda: SIMPLE_FORMAT.format(message="Hello"), number=number),
+        number,
+    )
+    report(
+        "render simple",
+        timeit.timeit(lambda: simple.render(message="Hello"), number=number),
+        number,
+    )
+    report(
+        "render simple (autoescape)",
+        timeit.timeit(lambda: simple_html.render(message="Hello"), number=number),
+        number,
+    )
+
+    page = Template("page.txt", ".", source=TEMPLATE_PAGE)
+    page_html = Template("page.html", ".", source=TEMPLATE_PAGE)
+    report(
+        f"str.format page ({args.rows} rows)",
+        timeit.timeit(lambda: render_format(context), number=number),
+        number,
+    )
+    report(
+        f"render page ({args.rows} rows)",
+        timeit.timeit(lambda: page.render(context), number=number),
+        number,
+    )
+    report(
+        "render page (autoescape)",
+        timeit.timeit(lambda: page_html.render(context), number=number),
+        number,
+    )
+    report(
+        "generate page (autoescape)",
+        timeit.timeit(lambda: list(page_html.generate(context)), number=number),
+        number,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Helpers shared by the tests."""
+
+import io
+import socket
+import threading
+import time
+
+from wsgi.server.server import WSGIServer
+
+
+def call(
+    app, path: str = "/", method: str = "GET", body: bytes = b"", read: bool = True, **headers
+):
+    """Call a WSGI application.
+    Args:
+        app (callable): The WSGI application.
+        path (str, optional): The path, with an optional query string. Defaults to "/".
+        method (str, optional): The request method. Defaults to "GET".
+        body (bytes, optional): The request body.
+        read (bool, optional): Join the body chunks, False returns the iterable. Defaults to True.
+        **headers: The request headers, e.g. Content_Type="text/plain".
+    Returns:
+        tuple: The status, the headers (a dict) and the body.
+    """
+    path, _, query = path.partition("?")
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SCRIPT_NAME": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+    }
+    if body:
+        environ["CONTENT_LENGTH"] = str(len(body))
+    for name, value in headers.items():
+        key = name.upper()
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        environ[key] = value
+    result = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        result["status"] = status
+        result["headers"] = dict(response_headers)
+
+    chunks = app(environ, start_response)
+    if not read:
+        return result["status"], result["headers"], chunks
+    try:
+        body = b"".join(chunks)
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+    return result["status"], result["headers"], body
+
+
+def start_server(app, **options) -> tuple:
+    """Run a server on a free local port in a daemon thread.
+    Args:
+        app (callable): The WSGI application.
+        **options: The WSGIServer options.
+    Returns:
+        tuple: The address of the server.
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = WSGIServer("127.0.0.1", port, app, **options)
+    threading.Thread(target=server.server_forever, daemon=True).start()
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return "127.0.0.1", port
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
+
+
+def exchange(address: tuple, data: bytes, timeout: float = 5.0) -> bytes:
+    """Send raw bytes to a server and read until it closes the connection.
+    Args:
+        address (tuple): The server address.
+        data (bytes): The bytes to send.
+        timeout (float, optional): Seconds to wait for the server. Defaults to 5.
+    Returns:
+        bytes: The bytes received.
+    """
+    with socket.create_connection(address, timeout=timeout) as client:
+        client.sendall(data)
+        received = []
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                return b"".join(received)
+            received.append(chunk)
+
+
+def parse_responses(data: bytes) -> list:
+    """Split the bytes received on a connection into HTTP responses.
+    Args:
+        data (bytes): The bytes received.
+    Returns:
+        list: The status line, the headers (a dict with lowercase names) and
+            the body of every response, the chunked bodies are decoded.
+    """
+    responses = []
+    while data:
+        head, separator, data = data.partition(b"\r\n\r\n")
+        if not separator:
+            raise ValueError(f"Incomplete response head: {head!r}")
+        status_line, *lines = head.decode("latin-1").split("\r\n")
+        headers = {}
+        for line in lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding") == "chunked":
+            body = b""
+            while True:
+                size_line, _, data = data.partition(b"\r\n")
+                size = int(size_line, 16)
+                if size == 0:
+                    # No trailers are sent
+                    data = data[2:]
+                    break
+                body += data[:size]
+                data = data[size + 2 :]
+        else:
+            length = int(headers.get("content-length", 0))
+            body, data = data[:length], data[length:]
+        responses.append((status_line, headers, body))
+    return responses
@@ -0,0 +1,110 @@
+"""Tests of the application response cache."""
+
+import unittest
+
+from wsgi.application.application import WSGIApplication
+from wsgi.application.cache import ResponseCache
+from wsgi.application.response import JSONResponse
+
+from .helpers import call
+
+
+class ResponseCacheCredentialsTest(unittest.TestCase):
+    def setUp(self):
+        self.app = WSGIApplication(cache=ResponseCache())
+
+        @self.app.get("/me", cache_ttl=60)
+        def me(request):
+            return {"user": request.headers.get("AUTHORIZATION")}
+
+        @self.app.get("/public", cache_ttl=60)
+        def public(request):
+            response = JSONResponse(body={"user": request.headers.get("AUTHORIZATION")})
+            response.headers.append(("Cache-Control", "public, max-age=60"))
+            return response
+
+    def test_different_authorization_get_different_responses(self):
+        _, _, alice = call(self.app, "/me", Authorization="Bearer alice")
+        _, headers, bob = call(self.app, "/me", Authorization="Bearer bob")
+        self.assertIn(b"alice", alice)
+        self.assertIn(b"bob", bob)
+        self.assertNotIn("Age", headers)
+        self.assertEqual(self.app.cache.stats()["stores"], 0)
+
+    def test_anonymous_response_not_served_with_cookie(self):
+        call(self.app, "/me")
+        _, headers, body = call(self.app, "/me", Cookie="session=alice")
+        self.assertNotIn("Age", headers)
+        self.assertEqual(self.app.cache.stats()["hits"], 0)
+
+    def test_public_response_is_shared(self):
+        call(self.app, "/public", Authorization="Bearer alice")
+        _, headers, body = call(self.app, "/public", Authorization="Bearer bob")
+        self.assertIn("Age", headers)
+        self.assertIn(b"alice", body)
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+        self.app = WSGIApplication(cache=ResponseCache(max_bytes=4096))
+
+        @self.app.get("/items", cache_ttl=60)
+        def items(request):
+            self.calls += 1
+            return f"{request.query.get('page')} {self.calls}"
+
+        @self.app.get("/big/{name}", cache_ttl=60)
+        def big(request, name):
+            return name * 1000
+
+        @self.app.get("/short", cache_ttl=60)
+        def short(request):
+            self.calls += 1
+            response = JSONResponse(body={"calls": self.calls})
+            response.headers.append(("Cache-Control", "max-age=0"))
+            return response
+
+    def test_hit_served_with_age(self):
+        _, headers, first = call(self.app, "/items?page=1&sort=a")
+        self.assertNotIn("Age", headers)
+        _, headers, second = call(self.app, "/items?sort=a&page=1")
+        self.assertEqual(headers["Age"], "0")
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+        _, _, other = call(self.app, "/items?page=2")
+        self.assertEqual(other, b"2 2")
+
+    def test_expired_entry_not_served(self):
+        cache = self.app.cache
+        call(self.app, "/items")
+        key = next(iter(cache.entries))
+        cache.entries[key] = cache.entries[key][:4] + (0.0,) + cache.entries[key][5:]
+        call(self.app, "/items")
+        self.assertEqual(self.calls, 2)
+
+    def test_cache_control_overrides_ttl(self):
+        call(self.app, "/short")
+        call(self.app, "/short")
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.app.cache.stats()["entries"], 0)
+
+    def test_bounded_by_bytes(self):
+        for name in "abcdef":
+            call(self.app, f"/big/{name}")
+        stats = self.app.cache.stats()
+        self.assertLessEqual(stats["bytes"], 4096)
+        self.assertGreater(stats["evictions"], 0)
+        # The least recently used entries are evicted first
+        self.assertEqual(self.app.cache.invalidate("/big/f"), 1)
+        self.assertEqual(self.app.cache.invalidate("/big/a"), 0)
+
+    def test_invalidate_prefix(self):
+        call(self.app, "/big/a")
+        call(self.app, "/items")
+        self.assertEqual(self.app.cache.invalidate("/big", prefix=True), 1)
+        self.assertEqual(self.app.cache.stats()["entries"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Tests of the response compression middleware."""
+
+import gzip
+import os
+import unittest
+
+from wsgi.application.application import WSGIApplication
+from wsgi.application.compression import CompressionMiddleware, negotiate_encoding
+
+from .helpers import call
+
+TEXT = "hello world " * 100
+
+
+class CompressionMiddlewareTest(unittest.TestCase):
+    def setUp(self):
+        self.app = WSGIApplication(middleware=[CompressionMiddleware()])
+        self.app.get("/text")(lambda request: TEXT)
+        self.app.get("/small")(lambda request: "small")
+
+    def test_gzip_when_accepted(self):
+        _, headers, body = call(self.app, "/text", Accept_Encoding="deflate;q=0.5, gzip")
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(headers["Vary"], "Accept-Encoding")
+        self.assertEqual(int(headers["Content-Length"]), len(body))
+        self.assertEqual(gzip.decompress(body), TEXT.encode())
+
+    def test_identity_without_accept_encoding(self):
+        _, headers, body = call(self.app, "/text")
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(headers["Vary"], "Accept-Encoding")
+        self.assertEqual(body, TEXT.encode())
+
+    def test_small_body_not_compressed(self):
+        _, headers, body = call(self.app, "/small", Accept_Encoding="gzip")
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(body, b"small")
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate_encoding("gzip;q=0, deflate"), "deflate")
+        self.assertEqual(negotiate_encoding("*"), "gzip")
+        self.assertIsNone(negotiate_encoding("br"))
+
+
+class CompressionCacheTest(unittest.TestCase):
+    def test_cache_keyed_by_digest(self):
+        middleware = CompressionMiddleware()
+        body = b"hello world " * 100
+        compressed = middleware.compress(body, "gzip")
+        self.assertEqual(gzip.decompress(compressed), body)
+        self.assertIs(middleware.compress(bytes(body), "gzip"), compressed)
+        for key in middleware.cache:
+            self.assertNotIn(body, key)
+
+    def test_cache_bounded_by_bytes(self):
+        middleware = CompressionMiddleware(cache_max_bytes=100000)
+        for _ in range(20):
+            middleware.compress(os.urandom(20000), "deflate")
+        self.assertLessEqual(middleware.cache_bytes, 100000)
+        self.assertEqual(
+            middleware.cache_bytes, sum(len(value) for value in middleware.cache.values())
+        )
+        self.assertLess(len(middleware.cache), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""Tests of the WSGI environ built for the requests."""
+
+import sys
+import unittest
+
+from wsgi.server.wsgi import WSGIRequest, make_base_environ
+
+
+class EnvironTest(unittest.TestCase):
+    def setUp(self):
+        self.base_environ = make_base_environ("localhost", 8080, script_name="app")
+
+    def to_environ(self, path: str = "/", headers=(), **fields) -> dict:
+        request = WSGIRequest(http_method="GET", path=path, headers=list(headers), **fields)
+        return request.to_environ(self.base_environ, ("127.0.0.1", 5000))
+
+    def test_required_keys(self):
+        environ = self.to_environ("/app/users?page=1", http_version="HTTP/1.0")
+        self.assertEqual(environ["REQUEST_METHOD"], "GET")
+        self.assertEqual(environ["SCRIPT_NAME"], "/app")
+        self.assertEqual(environ["PATH_INFO"], "/users")
+        self.assertEqual(environ["QUERY_STRING"], "page=1")
+        self.assertEqual(environ["SERVER_NAME"], "localhost")
+        self.assertEqual(environ["SERVER_PORT"], "8080")
+        self.assertEqual(environ["SERVER_PROTOCOL"], "HTTP/1.0")
+        self.assertEqual(environ["REMOTE_ADDR"], "127.0.0.1")
+        self.assertEqual(environ["wsgi.version"], (1, 0))
+        self.assertIs(environ["wsgi.errors"], sys.stderr)
+        self.assertNotIn("REQUEST_METHOD", self.base_environ)
+
+    def test_script_name_matches_whole_segments(self):
+        self.assertEqual(self.to_environ("/application")["PATH_INFO"], "/application")
+
+    def test_path_decoded_as_latin1(self):
+        environ = self.to_environ("/app/caf%C3%A9%2Fx")
+        self.assertEqual(environ["PATH_INFO"], "/café/x".encode("utf-8").decode("latin-1"))
+
+    def test_headers(self):
+        environ = self.to_environ(
+            headers=[
+                ("Content-Type", "text/plain"),
+                ("X-Forwarded-For", "a"),
+                ("x-forwarded-for", "b"),
+                ("Cookie", "a=1"),
+                ("Cookie", "b=2"),
+                ("X_Smuggled", "ignored"),
+            ]
+        )
+        self.assertEqual(environ["CONTENT_TYPE"], "text/plain")
+        self.assertNotIn("HTTP_CONTENT_TYPE", environ)
+        self.assertEqual(environ["HTTP_X_FORWARDED_FOR"], "a,b")
+        self.assertEqual(environ["HTTP_COOKIE"], "a=1; b=2")
+        self.assertNotIn("HTTP_X_SMUGGLED", environ)
+
+
+if __name__ == "__main__":
+    unittest.main()
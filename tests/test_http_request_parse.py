@@ -0,0 +1,92 @@
+"""Tests of the HTTP request parser."""
+
+import unittest
+
+from wsgi.server.http_request_parse import HttpParserError, HttpRequestParser
+
+
+class RecordingProtocol:
+    """A parser protocol recording the callbacks."""
+
+    def __init__(self):
+        self.headers = []
+        self.body = b""
+        self.complete = 0
+        self.urls = []
+
+    def on_message_begin(self):
+        pass
+
+    def on_url(self, url: bytes):
+        self.urls.append(url)
+
+    def on_header(self, name: bytes, value: bytes):
+        self.headers.append((name, value))
+
+    def on_headers_complete(self):
+        pass
+
+    def on_body(self, body: bytes):
+        self.body += body
+
+    def on_message_complete(self):
+        self.complete += 1
+
+
+class HttpRequestParserFramingTest(unittest.TestCase):
+    def test_chunked_body(self):
+        protocol = RecordingProtocol()
+        HttpRequestParser(protocol).feed_data(
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n0\r\n\r\n"
+        )
+        self.assertEqual(protocol.body, b"abc")
+        self.assertEqual(protocol.complete, 1)
+
+    def test_chunked_with_content_length_is_rejected(self):
+        parser = HttpRequestParser(RecordingProtocol())
+        with self.assertRaises(HttpParserError) as context:
+            parser.feed_data(
+                b"POST / HTTP/1.1\r\nContent-Length: 3\r\nTransfer-Encoding: chunked\r\n\r\n"
+                b"5\r\nabcde\r\n0\r\n\r\n"
+            )
+        self.assertEqual(context.exception.status, "400 Bad Request")
+
+    def test_pipelined_requests_fed_byte_by_byte(self):
+        protocol = RecordingProtocol()
+        parser = HttpRequestParser(protocol)
+        data = (
+            b"POST /a HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"3\r\nabc\r\n2;ext=1\r\nde\r\n0\r\nTrailer: x\r\n\r\n"
+            b"POST /b HTTP/1.1\r\nContent-Length: 2\r\n\r\nfg"
+        )
+        for index in range(len(data)):
+            parser.feed_data(data[index : index + 1])
+        self.assertEqual(protocol.urls, [b"/a", b"/b"])
+        self.assertEqual(protocol.body, b"abcdefg")
+        self.assertEqual(protocol.complete, 2)
+
+
+class HttpRequestParserLimitsTest(unittest.TestCase):
+    def assert_rejected(self, parser, data: bytes, status: str):
+        with self.assertRaises(HttpParserError) as context:
+            parser.feed_data(data)
+        self.assertEqual(context.exception.status, status)
+
+    def test_request_line_too_long(self):
+        parser = HttpRequestParser(RecordingProtocol(), max_request_line=32)
+        # Rejected before the end of the line is received
+        self.assert_rejected(parser, b"GET /" + b"a" * 64, "414 URI Too Long")
+
+    def test_too_many_headers(self):
+        parser = HttpRequestParser(RecordingProtocol(), max_headers=2)
+        data = b"GET / HTTP/1.1\r\n" + b"X-A: 1\r\n" * 3 + b"\r\n"
+        self.assert_rejected(parser, data, "431 Request Header Fields Too Large")
+
+    def test_invalid_chunk_size(self):
+        parser = HttpRequestParser(RecordingProtocol())
+        data = b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n"
+        self.assert_rejected(parser, data, "400 Bad Request")
+
+
+if __name__ == "__main__":
+    unittest.main()
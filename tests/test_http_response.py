@@ -0,0 +1,53 @@
+"""Tests of the serialization of the response headers."""
+
+import unittest
+from unittest import mock
+from email.utils import parsedate_to_datetime
+
+from wsgi.server import http_response
+from wsgi.server.http_response import get_status_line, make_header_block
+from wsgi.server.wsgi import WSGIResponse
+
+from .helpers import parse_responses
+
+
+class HeaderBlockTest(unittest.TestCase):
+    def test_status_lines_cached(self):
+        self.assertIs(get_status_line("404 Not Found"), get_status_line("404 Not Found"))
+        self.assertEqual(get_status_line("299 Custom"), b"HTTP/1.1 299 Custom\r\n")
+
+    def test_header_block(self):
+        block = make_header_block("200 OK", [("Content-Type", "text/plain")], connection=False)
+        (status, headers, _), = parse_responses(block)
+        self.assertEqual(status, "HTTP/1.1 200 OK")
+        self.assertEqual(headers["content-type"], "text/plain")
+        self.assertEqual(headers["connection"], "close")
+        self.assertEqual(headers["server"], http_response.SERVER_NAME)
+        parsedate_to_datetime(headers["date"])
+
+    def test_date_formatted_once_per_second(self):
+        with mock.patch.object(http_response.time, "time", return_value=1000.2):
+            first = http_response.get_common_headers()
+            self.assertIn(b"Date: Thu, 01 Jan 1970 00:16:40 GMT\r\n", first)
+        with mock.patch.object(http_response.time, "time", return_value=1000.9):
+            self.assertIs(http_response.get_common_headers(), first)
+        with mock.patch.object(http_response.time, "time", return_value=1001.0):
+            self.assertIsNot(http_response.get_common_headers(), first)
+
+    def test_without_common_headers(self):
+        block = make_header_block("204 No Content", [], common=False)
+        self.assertEqual(block, b"HTTP/1.1 204 No Content\r\n\r\n")
+
+    def test_application_date_kept(self):
+        sent = []
+        response = WSGIResponse(send=sent.extend)
+        response.start_response("200 OK", [("Date", "Thu, 01 Jan 1970 00:00:00 GMT")])
+        response.finish()
+        (_, headers, _), = parse_responses(b"".join(sent))
+        self.assertEqual(headers["date"], "Thu, 01 Jan 1970 00:00:00 GMT")
+        self.assertEqual(headers["server"], http_response.SERVER_NAME)
+        self.assertEqual(headers["connection"], "keep-alive")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Tests of the JSON encoder of the applications."""
+
+import json
+import unittest
+
+from wsgi.application.application import WSGIApplication
+from wsgi.application.middleware import Middleware
+from wsgi.application.json_backend import get_json_backend
+from wsgi.application.response import JSONResponse, StreamingJSONResponse
+
+from .helpers import call
+
+
+class ReadBody(Middleware):
+    """A middleware reading the body of the responses."""
+
+    def after_response(self, request, response):
+        response.headers.append(("X-Length", str(len(response.body))))
+        return response
+
+
+def make_app(marker, middleware=None):
+    app = WSGIApplication(middleware=middleware, json_backend=lambda value: marker)
+
+    @app.get("/")
+    def index(request):
+        return {"a": 1}
+
+    @app.get("/response")
+    def response(request):
+        return JSONResponse(body={"a": 1})
+
+    return app
+
+
+class JSONBackendTest(unittest.TestCase):
+    def test_each_application_keeps_its_encoder(self):
+        first = make_app(b"first")
+        second = make_app(b"second")
+        self.assertEqual(call(first)[2], b"first")
+        self.assertEqual(call(first, "/response")[2], b"first")
+        self.assertEqual(call(second)[2], b"second")
+
+    def test_content_length_of_lazy_body(self):
+        _, headers, body = call(make_app(b"[1,2]"), "/response")
+        self.assertEqual(headers["Content-Length"], str(len(body)))
+
+    def test_middleware_sees_the_application_encoder(self):
+        _, headers, body = call(make_app(b"middleware", [ReadBody()]), "/response")
+        self.assertEqual(body, b"middleware")
+        self.assertEqual(headers["X-Length"], "10")
+
+    def test_mounted_application_keeps_its_encoder(self):
+        parent = make_app(b"parent")
+        parent.mount("/child", make_app(b"child"))
+        self.assertEqual(call(parent, "/child/")[2], b"child")
+        self.assertEqual(call(parent)[2], b"parent")
+
+    def test_default_encoder(self):
+        self.assertEqual(JSONResponse(body={"a": 1}).body, b'{"a":1}')
+
+
+class StreamingJSONResponseTest(unittest.TestCase):
+    def test_array(self):
+        response = StreamingJSONResponse(iter([{"a": 1}, [2], "3"]), chunk_size=4)
+        chunks = list(response.body)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(json.loads(b"".join(chunks)), [{"a": 1}, [2], "3"])
+        self.assertEqual(b"".join(StreamingJSONResponse(iter([])).body), b"[]")
+
+    def test_ndjson(self):
+        response = StreamingJSONResponse(range(3), mode="ndjson")
+        self.assertIn(("Content-Type", "application/x-ndjson"), response.headers)
+        self.assertEqual(b"".join(response.body), b"0\n1\n2\n")
+
+    def test_items_closed_when_the_response_is_closed(self):
+        closed = []
+
+        def items():
+            try:
+                yield from range(100)
+            finally:
+                closed.append(True)
+
+        body = StreamingJSONResponse(items(), chunk_size=1).body
+        next(body)
+        body.close()
+        self.assertEqual(closed, [True])
+
+    def test_stdlib_backend_is_compact(self):
+        self.assertEqual(get_json_backend("stdlib")({"a": [1, 2]}), b'{"a":[1,2]}')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Tests of the log writer."""
+
+import os
+import sys
+import tempfile
+import unittest
+
+from wsgi.application.middleware import timing_middleware
+from wsgi.server.log import ACCESS, ACCESS_LOG_FIELDS, DEBUG, ERROR, MESSAGE, LogWriter, writer
+
+
+class LogWriterTest(unittest.TestCase):
+    def test_configure_closes_previous_files(self):
+        log_writer = LogWriter()
+        with tempfile.TemporaryDirectory() as directory:
+            log_writer.configure(access_log=os.path.join(directory, "access.log"))
+            access_stream = log_writer.access_stream
+            log_writer.configure(error_log=os.path.join(directory, "error.log"))
+            self.assertTrue(access_stream.closed)
+            self.assertIs(log_writer.access_stream, sys.stdout)
+            log_writer.configure()
+            self.assertEqual(log_writer.files, [])
+            self.assertFalse(sys.stdout.closed)
+
+    def test_unknown_format_field_rejected(self):
+        log_writer = LogWriter()
+        with self.assertRaises(ValueError):
+            log_writer.configure(access_log_format="{method} {nope}")
+        log_writer.configure(access_log_format="{method} {duration:.3f} {time_clf}")
+
+    def test_bad_access_record_keeps_the_batch(self):
+        log_writer = LogWriter()
+        with tempfile.TemporaryDirectory() as directory:
+            error_log = os.path.join(directory, "error.log")
+            access_log = os.path.join(directory, "access.log")
+            log_writer.configure(access_log=access_log, error_log=error_log)
+            log_writer.write([(ACCESS, 0.0, {"method": "GET"}), (ERROR, 0.0, "kept")])
+            log_writer.configure()
+            with open(error_log, encoding="utf-8") as file:
+                lines = file.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("Cannot format an access record", lines[0])
+        self.assertTrue(lines[1].endswith("kept"))
+
+    def test_records_written_by_the_background_thread(self):
+        log_writer = LogWriter()
+        with tempfile.TemporaryDirectory() as directory:
+            access_log = os.path.join(directory, "access.log")
+            error_log = os.path.join(directory, "error.log")
+            log_writer.configure(
+                access_log=access_log, error_log=error_log, access_log_format="common"
+            )
+            # The times are formatted by the writer
+            fields = {key: value for key, value in ACCESS_LOG_FIELDS.items() if "time" not in key}
+            fields.update(path="/logged", bytes=12)
+            for _ in range(3):
+                log_writer.emit((ACCESS, 0.0, fields))
+            log_writer.emit((MESSAGE, 0.0, "started"))
+            self.assertIsNotNone(log_writer.thread)
+            log_writer.close()
+            log_writer.configure()
+            with open(access_log, encoding="utf-8") as file:
+                lines = file.read().splitlines()
+            with open(error_log, encoding="utf-8") as file:
+                self.assertTrue(file.read().rstrip().endswith("] started"))
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("127.0.0.1 - - ["))
+        self.assertTrue(lines[0].endswith('"GET /logged HTTP/1.1" 200 12'))
+
+    def test_sampling_by_prefix(self):
+        log_writer = LogWriter()
+        log_writer.configure(access_log_sampling={"/health": 0, "/health/deep": 1})
+        self.assertFalse(log_writer.sample("/health"))
+        self.assertTrue(log_writer.sample("/health/deep"))
+        self.assertTrue(log_writer.sample("/users"))
+
+
+class TimingMiddlewareTest(unittest.TestCase):
+    def test_logged_as_debug(self):
+        class FakeRequest:
+            method = "GET"
+            path = "/timed"
+
+        records = []
+        writer.emit = records.append
+        writer.debug = True
+        try:
+            self.assertEqual(timing_middleware(lambda request: "ok")(FakeRequest()), "ok")
+        finally:
+            del writer.emit
+            writer.debug = False
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0][0], DEBUG)
+        self.assertTrue(records[0][2].startswith("GET /timed took "))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""Tests of the metrics registry and the Prometheus text format."""
+
+import unittest
+
+from wsgi.application.application import WSGIApplication
+from wsgi.metrics import CONTENT_TYPE, MetricsRegistry, metrics_app
+
+from .helpers import call, exchange, parse_responses, start_server
+
+
+class PrometheusFormatTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_with_labels(self):
+        counter = self.registry.counter("requests_total", "Requests.", ("route", "code"))
+        counter.inc(("/", "200"))
+        counter.inc(("/", "200"), 2)
+        counter.inc(('a"b', "404"))
+        self.assertEqual(
+            self.registry.render(),
+            "# HELP requests_total Requests.\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{route="/",code="200"} 3\n'
+            'requests_total{route="a\\"b",code="404"} 1\n',
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram("duration_seconds", "Durations.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+        lines = self.registry.render().splitlines()
+        self.assertEqual(lines[1], "# TYPE duration_seconds histogram")
+        self.assertEqual(
+            lines[2:],
+            [
+                'duration_seconds_bucket{le="0.1"} 1',
+                'duration_seconds_bucket{le="1"} 2',
+                'duration_seconds_bucket{le="+Inf"} 3',
+                "duration_seconds_sum 5.55",
+                "duration_seconds_count 3",
+            ],
+        )
+
+    def test_gauge_function_replaced_on_registration(self):
+        first = self.registry.gauge("threads", "Threads.", function=lambda: {(): 1})
+        second = self.registry.gauge("threads", "Threads.", function=lambda: {(): 2})
+        self.assertIs(first, second)
+        self.assertIn("\nthreads 2", self.registry.render())
+
+    def test_metrics_app(self):
+        status, headers, body = call(metrics_app, "/metrics")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(headers["Content-Type"], CONTENT_TYPE)
+        self.assertEqual(int(headers["Content-Length"]), len(body))
+
+
+class MetricsEndpointTest(unittest.TestCase):
+    def test_requests_counted_and_served(self):
+        app = WSGIApplication()
+        app.get("/hello")(lambda request: "hello")
+        address = start_server(app, metrics_path="/metrics")
+        for path in (b"/hello", b"/metrics"):
+            request = b"GET " + path + b" HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n"
+            data = exchange(address, request)
+        (status, headers, body), = parse_responses(data)
+        self.assertTrue(status.endswith("200 OK"))
+        self.assertEqual(headers["content-type"], CONTENT_TYPE)
+        text = body.decode()
+        self.assertIn("# TYPE server_threads gauge", text)
+        self.assertIn('http_requests_total{route="/hello",method="GET",status="200"} 1', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
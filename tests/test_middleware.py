@@ -0,0 +1,88 @@
+"""Tests of the middleware chains of the application."""
+
+import unittest
+
+from wsgi.application.application import WSGIApplication
+from wsgi.application.middleware import Middleware
+from wsgi.application.response import PlainTextResponse
+
+from .helpers import call
+
+
+class Recorder(Middleware):
+    """A middleware recording the order its hooks are called in."""
+
+    def __init__(self, name: str, calls: list):
+        self.name = name
+        self.calls = calls
+
+    def before_request(self, request):
+        self.calls.append(f"{self.name} before")
+
+    def after_response(self, request, response):
+        self.calls.append(f"{self.name} after")
+        response.headers.append(("X-Seen-By", self.name))
+
+
+class Auth(Middleware):
+    def before_request(self, request):
+        if request.headers.get("AUTHORIZATION") is None:
+            return PlainTextResponse(status="401 UNAUTHORIZED", body="Unauthorized")
+
+
+class MiddlewareChainTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.app = WSGIApplication(middleware=[Recorder("app", self.calls)])
+        self.app.use(Recorder("prefix", self.calls), prefix="/admin")
+        self.app.use(Auth(), prefix="/admin")
+
+        @self.app.get("/admin/panel", middleware=[Recorder("route", self.calls)])
+        def panel(request):
+            self.calls.append("handler")
+            return "panel"
+
+        @self.app.get("/public")
+        def public(request):
+            self.calls.append("handler")
+            return "public"
+
+    def test_chain_order(self):
+        status, _, body = call(self.app, "/admin/panel", Authorization="token")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, b"panel")
+        self.assertEqual(
+            self.calls,
+            [
+                "app before",
+                "prefix before",
+                "route before",
+                "handler",
+                "route after",
+                "prefix after",
+                "app after",
+            ],
+        )
+
+    def test_prefix_middleware_only_on_its_routes(self):
+        call(self.app, "/public")
+        self.assertEqual(self.calls, ["app before", "handler", "app after"])
+
+    def test_before_request_short_circuits(self):
+        status, headers, _ = call(self.app, "/admin/panel")
+        self.assertEqual(status, "401 UNAUTHORIZED")
+        self.assertNotIn("handler", self.calls)
+        self.assertNotIn("route before", self.calls)
+        self.assertEqual(headers["X-Seen-By"], "app")
+
+    def test_after_request_hook(self):
+        @self.app.after_request
+        def add_header(request, response):
+            response.headers.append(("X-Frame-Options", "DENY"))
+
+        _, headers, _ = call(self.app, "/public")
+        self.assertEqual(headers["X-Frame-Options"], "DENY")
+
+
+if __name__ == "__main__":
+    unittest.main()
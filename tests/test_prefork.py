@@ -0,0 +1,88 @@
+"""Tests of the pre-fork mode, the server runs in a child process."""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import textwrap
+import time
+import unittest
+
+from .helpers import exchange, parse_responses
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_SCRIPT = """
+import os
+import sys
+
+from wsgi.application.application import WSGIApplication
+from wsgi.server import prefork
+from wsgi.server.server import WSGIServer
+
+prefork.WORKER_RESTART_BACKOFF = 0.01
+prefork.WORKER_MAX_FAST_FAILURES = 2
+app = WSGIApplication()
+app.get("/pid")(lambda request: str(os.getpid()))
+server = WSGIServer("127.0.0.1", int(sys.argv[1]), app, workers=2, reuse_port=sys.argv[2] == "1")
+server.server_forever()
+"""
+
+
+def free_port() -> int:
+    """Get a local port nothing listens on."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def run_server(port: int, reuse_port: bool) -> subprocess.Popen:
+    """Start a pre-fork server with two workers."""
+    script = textwrap.dedent(SERVER_SCRIPT)
+    return subprocess.Popen(
+        [sys.executable, "-c", script, str(port), "1" if reuse_port else "0"],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+class PreforkTest(unittest.TestCase):
+    def test_workers_serve_and_stop_on_sigterm(self):
+        port = free_port()
+        process = run_server(port, reuse_port=False)
+        try:
+            deadline = time.monotonic() + 10
+            while True:
+                try:
+                    request = b"GET /pid HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n"
+                    data = exchange(("127.0.0.1", port), request)
+                    break
+                except OSError:
+                    self.assertLess(time.monotonic(), deadline, "the server did not start")
+                    time.sleep(0.05)
+            (status, _, body), = parse_responses(data)
+            self.assertTrue(status.endswith("200 OK"))
+            self.assertNotEqual(int(body), process.pid)
+            process.send_signal(signal.SIGTERM)
+            self.assertEqual(process.wait(timeout=15), 0)
+        finally:
+            process.kill()
+            process.wait()
+
+    def test_master_stops_when_workers_keep_failing(self):
+        # The workers cannot bind a port already bound without SO_REUSEPORT
+        with socket.socket() as taken:
+            taken.bind(("127.0.0.1", 0))
+            taken.listen()
+            process = run_server(taken.getsockname()[1], reuse_port=True)
+            try:
+                self.assertEqual(process.wait(timeout=15), 1)
+            finally:
+                process.kill()
+                process.wait()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Tests of the sampling profiler."""
+
+import os
+import tempfile
+import unittest
+
+from wsgi.application.application import WSGIApplication
+from wsgi.application.profiler import Profiler
+
+from .helpers import call
+
+
+def slow_part(count: int) -> int:
+    return sum(range(count))
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.profiler = Profiler(sample_rate=0, paths=("/sampled",), header="X-Profile")
+        self.app = WSGIApplication(profiler=self.profiler)
+        self.app.get("/users/{id:int}")(lambda request, id: str(slow_part(1000)))
+        self.app.get("/sampled")(lambda request: "sampled")
+        self.app.mount("/_admin/profiler", self.profiler.admin_app)
+
+    def test_only_selected_requests_profiled(self):
+        call(self.app, "/users/1")
+        self.assertEqual(self.profiler.routes, {})
+        call(self.app, "/users/1", X_Profile="1")
+        call(self.app, "/users/2", X_Profile="1")
+        call(self.app, "/sampled")
+        self.assertEqual(self.profiler.routes["/users/{id:int}"].requests, 2)
+        self.assertEqual(self.profiler.routes["/sampled"].requests, 1)
+
+    def test_summary(self):
+        call(self.app, "/users/1", X_Profile="1")
+        call(self.app, "/sampled")
+        status, _, body = call(self.app, "/_admin/profiler/?route=/users/%7Bid:int%7D")
+        self.assertEqual(status, "200 OK")
+        self.assertIn(b"=== /users/{id:int}: 1 requests", body)
+        self.assertIn(b"slow_part", body)
+        self.assertNotIn(b"=== /sampled", body)
+        status, _, _ = call(self.app, "/_admin/profiler/?sort=nope")
+        self.assertEqual(status, "400 Bad Request")
+
+    def test_admin_actions(self):
+        status, _, _ = call(self.app, "/_admin/profiler/?action=disable", method="POST")
+        self.assertEqual(status, "200 OK")
+        call(self.app, "/sampled")
+        self.assertEqual(self.profiler.routes, {})
+        call(self.app, "/_admin/profiler/?action=enable", method="POST")
+        call(self.app, "/sampled")
+        self.assertIn("/sampled", self.profiler.routes)
+        call(self.app, "/_admin/profiler/?action=reset", method="POST")
+        self.assertEqual(self.profiler.routes, {})
+
+    def test_dump(self):
+        call(self.app, "/users/1", X_Profile="1")
+        with tempfile.TemporaryDirectory() as directory:
+            (path,) = self.profiler.dump(directory)
+            self.assertTrue(os.path.basename(path).startswith("users_id_int"))
+            self.assertTrue(os.path.getsize(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Tests of the application request."""
+
+import io
+import unittest
+
+from wsgi.application.request import Request
+
+
+def make_request(body: bytes, content_type: str) -> Request:
+    return Request(
+        {
+            "REQUEST_METHOD": "POST",
+            "CONTENT_TYPE": content_type,
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": io.BytesIO(body),
+        }
+    )
+
+
+class RequestFormTest(unittest.TestCase):
+    def test_urlencoded_defaults_to_utf8(self):
+        form = make_request(
+            "name=Zoë&city=K%C3%B6ln".encode("utf-8"), "application/x-www-form-urlencoded"
+        ).form
+        self.assertEqual(form["name"], "Zoë")
+        self.assertEqual(form["city"], "Köln")
+
+    def test_urlencoded_charset(self):
+        form = make_request(
+            "name=Zoë&city=K%F6ln".encode("latin-1"),
+            "application/x-www-form-urlencoded; charset=ISO-8859-1",
+        ).form
+        self.assertEqual(form["name"], "Zoë")
+        self.assertEqual(form["city"], "Köln")
+
+    def test_unknown_charset(self):
+        request = make_request(b"a=1", "application/x-www-form-urlencoded; charset=nope")
+        self.assertEqual(request.charset, "utf-8")
+        self.assertEqual(request.form["a"], "1")
+
+
+class RequestParsingTest(unittest.TestCase):
+    def test_query_repeated_and_percent_decoded(self):
+        request = Request({"QUERY_STRING": "tag=a&tag=b%20c&empty=&q=%C3%A9"})
+        self.assertEqual(request.query["tag"], "a")
+        self.assertEqual(request.query.getlist("tag"), ["a", "b c"])
+        self.assertEqual(request.query["empty"], "")
+        self.assertEqual(request.query["q"], "é")
+        self.assertEqual(request.query.getlist("missing"), [])
+
+    def test_headers_case_insensitive(self):
+        request = Request({"HTTP_ACCEPT_ENCODING": "gzip", "CONTENT_TYPE": "text/plain"})
+        self.assertEqual(request.headers["Accept-Encoding"], "gzip")
+        self.assertEqual(request.headers.get("accept_encoding"), "gzip")
+        self.assertIn("Content-Type", request.headers)
+        self.assertIsNone(request.headers.get("Cookie"))
+
+    def test_cookies(self):
+        request = Request({"HTTP_COOKIE": 'session=abc; theme="dark"; session=other; bad'})
+        self.assertEqual(request.cookies, {"session": "abc", "theme": "dark"})
+
+    def test_parsed_once(self):
+        request = Request({"QUERY_STRING": "a=1"})
+        self.assertIs(request.query, request.query)
+        with self.assertRaises(AttributeError):
+            request.other = 1
+
+    def test_body_read_up_to_content_length(self):
+        request = make_request(b'{"a": 1}trailing', "application/json")
+        request.environ["CONTENT_LENGTH"] = "8"
+        self.assertEqual(request.json(), {"a": 1})
+
+    def test_multipart_form(self):
+        body = (
+            b"--b\r\nContent-Disposition: form-data; name=\"title\"\r\n\r\nhello\r\n"
+            b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.bin\"\r\n"
+            b"Content-Type: application/octet-stream\r\n\r\n\x00\x01\r\n--b--\r\n"
+        )
+        form = make_request(body, "multipart/form-data; boundary=b").form
+        self.assertEqual(form["title"], "hello")
+        self.assertEqual(form["file"], b"\x00\x01")
+
+
+if __name__ == "__main__":
+    unittest.main()
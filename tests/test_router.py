@@ -0,0 +1,61 @@
+"""Tests of the router."""
+
+import json
+import unittest
+
+from wsgi.application.application import WSGIApplication
+from wsgi.application.router import convert_float
+
+from .helpers import call
+
+
+class RouterTest(unittest.TestCase):
+    def setUp(self):
+        self.app = WSGIApplication()
+        self.app.get("/users/{id:int}")(lambda request, id: {"id": id, "type": type(id).__name__})
+        self.app.get("/users/me")(lambda request: "me")
+        self.app.post("/users/me")(lambda request: "posted")
+        self.app.get("/files/{name:path}")(lambda request, name: name)
+        self.app.freeze()
+
+    def test_typed_parameter(self):
+        status, _, body = call(self.app, "/users/42")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(json.loads(body), {"id": 42, "type": "int"})
+
+    def test_static_segment_takes_precedence(self):
+        _, _, body = call(self.app, "/users/me")
+        self.assertEqual(body, b"me")
+
+    def test_unconverted_parameter_not_found(self):
+        status, _, _ = call(self.app, "/users/abc")
+        self.assertEqual(status[:3], "404")
+
+    def test_path_parameter_matches_the_rest(self):
+        _, _, body = call(self.app, "/files/a/b.txt")
+        self.assertEqual(body, b"a/b.txt")
+
+    def test_method_not_allowed(self):
+        status, headers, _ = call(self.app, "/users/me", method="DELETE")
+        self.assertEqual(status[:3], "405")
+        self.assertEqual(sorted(headers["Allow"].split(", ")), ["GET", "HEAD", "POST"])
+
+    def test_register_after_freeze(self):
+        with self.assertRaises(RuntimeError):
+            self.app.get("/late")(lambda request: "late")
+
+
+class ConvertFloatTest(unittest.TestCase):
+    def test_float_literals(self):
+        cases = {"1.5": 1.5, "-2": -2.0, "+.5": 0.5, "1e3": 1000.0, "-2.5E-2": -0.025}
+        for value, expected in cases.items():
+            self.assertEqual(convert_float(value), expected)
+
+    def test_rejected(self):
+        for value in ("inf", "-Infinity", "nan", "1e999", " 1", "1.2.3", "abc", "١"):
+            with self.assertRaises(ValueError):
+                convert_float(value)
+
+
+if __name__ == "__main__":
+    unittest.main()
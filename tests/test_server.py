@@ -0,0 +1,122 @@
+"""Tests of the connection handling of the server engines."""
+
+import asyncio
+import socket
+import unittest
+
+from wsgi.application.application import WSGIApplication
+
+from .helpers import exchange, parse_responses, start_server
+
+# Large enough for the transport to pause the writes
+WRITE_SIZE = 8 * 1024 * 1024
+
+
+def make_app() -> WSGIApplication:
+    """An application answering the method, the path and the body of the requests."""
+    app = WSGIApplication()
+
+    def echo(method, path):
+        def handler(request):
+            return f"{method} {path} {request.body.decode()}"
+
+        return handler
+
+    for path in ("/one", "/three", "/first", "/second", "/old"):
+        app.get(path)(echo("GET", path))
+    app.post("/two")(echo("POST", "/two"))
+    return app
+
+
+class KeepAliveTests:
+    """The keep-alive and pipelining tests, run against every engine."""
+
+    options = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.address = start_server(make_app(), **cls.options)
+
+    def test_pipelined_requests_answered_in_order(self):
+        data = exchange(
+            self.address,
+            b"GET /one HTTP/1.1\r\nHost: test\r\n\r\n"
+            b"POST /two HTTP/1.1\r\nHost: test\r\nContent-Length: 4\r\n\r\nbody"
+            b"GET /three HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n",
+        )
+        responses = parse_responses(data)
+        self.assertEqual(
+            [body for _, _, body in responses], [b"GET /one ", b"POST /two body", b"GET /three "]
+        )
+        self.assertTrue(all(status.endswith("200 OK") for status, _, _ in responses))
+
+    def test_connection_kept_alive_between_requests(self):
+        with socket.create_connection(self.address, timeout=5) as client:
+            for path in (b"/first", b"/second"):
+                client.sendall(b"GET " + path + b" HTTP/1.1\r\nHost: test\r\n\r\n")
+                response = b""
+                while not response.endswith(b"GET " + path + b" "):
+                    chunk = client.recv(65536)
+                    self.assertTrue(chunk, "the connection was closed")
+                    response += chunk
+                self.assertNotIn(b"Connection: close", response)
+
+    def test_http10_closes_by_default(self):
+        data = exchange(self.address, b"GET /old HTTP/1.0\r\n\r\n")
+        (status, _, body), = parse_responses(data)
+        self.assertTrue(status.startswith("HTTP/1.0 200") or status.startswith("HTTP/1.1 200"))
+        self.assertEqual(body, b"GET /old ")
+
+
+class ThreadedEngineTest(KeepAliveTests, unittest.TestCase):
+    options = {}
+
+
+class SelectorEngineTest(KeepAliveTests, unittest.TestCase):
+    options = {"engine": "selector"}
+
+
+class WriteApp(WSGIApplication):
+    """An application sending its body with the write callable, it has no
+    `call_async` so the asyncio engine calls it in the executor."""
+
+    call_async = None
+
+    def __call__(self, environ, start_response):
+        write = start_response("200 OK", [("Content-Length", str(WRITE_SIZE))])
+        for _ in range(WRITE_SIZE // 65536):
+            write(b"x" * 65536)
+        return []
+
+
+class AsyncioEngineTest(KeepAliveTests, unittest.TestCase):
+    options = {"engine": "asyncio"}
+
+    @classmethod
+    def setUpClass(cls):
+        app = make_app()
+
+        @app.get("/async")
+        async def handler(request):
+            await asyncio.sleep(0)
+            return "awaited"
+
+        cls.address = start_server(app, **cls.options)
+
+    def test_async_handler(self):
+        request = b"GET /async HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n"
+        data = exchange(self.address, request)
+        (status, _, body), = parse_responses(data)
+        self.assertTrue(status.endswith("200 OK"))
+        self.assertEqual(body, b"awaited")
+
+    def test_write_from_the_executor(self):
+        address = start_server(WriteApp(), **self.options)
+        data = exchange(address, b"GET / HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n")
+        (status, _, body), = parse_responses(data)
+        self.assertTrue(status.endswith("200 OK"))
+        self.assertEqual(body, b"x" * WRITE_SIZE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+"""Tests of the receive buffer of the request parser."""
+
+import socket
+import unittest
+
+from wsgi.server.splitbuffer import SplitBuffer
+
+
+class SplitBufferTest(unittest.TestCase):
+    def test_separator_split_across_feeds(self):
+        buffer = SplitBuffer(16)
+        buffer.feed_data(b"GET / HTTP/1.1\r")
+        self.assertIsNone(buffer.pop(b"\r\n"))
+        buffer.feed_data(b"\nHost: a\r\n")
+        self.assertEqual(buffer.pop(b"\r\n"), b"GET / HTTP/1.1")
+        self.assertEqual(buffer.pop(b"\r\n"), b"Host: a")
+        self.assertEqual(len(buffer), 0)
+
+    def test_grows_and_compacts(self):
+        buffer = SplitBuffer(8)
+        buffer.feed_data(b"0123456789abcdef")
+        self.assertEqual(buffer.read(10), b"0123456789")
+        buffer.feed_data(b"ghijkl")
+        self.assertEqual(buffer.flush(), b"abcdefghijkl")
+        self.assertEqual(buffer.read(4), b"")
+
+    def test_write_buffer_and_recv_into(self):
+        buffer = SplitBuffer(8)
+        with buffer.get_write_buffer(5) as view:
+            view[:5] = b"hello"
+        buffer.commit(5)
+        left, right = socket.socketpair()
+        with left, right:
+            left.sendall(b" world")
+            self.assertEqual(buffer.recv_into(right, 64), 6)
+        self.assertEqual(buffer.flush(), b"hello world")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Tests of the static files application."""
+
+import os
+import tempfile
+import unittest
+
+from wsgi.application.static import StaticFiles
+
+from .helpers import call, exchange, parse_responses, start_server
+
+
+class StaticFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for name in ("a.txt", "b.txt"):
+            with open(os.path.join(self.directory.name, name), "wb") as file:
+                file.write(name.encode() * 100)
+        self.app = StaticFiles(self.directory.name, cache_size=1)
+
+    def test_readinto(self):
+        status, _, body = call(self.app, "/a.txt", read=False, Range="bytes=2-9")
+        self.assertEqual(status, "206 Partial Content")
+        buffer = bytearray(5)
+        self.assertEqual(body.readinto(buffer), 5)
+        self.assertEqual(bytes(buffer), b"txta.")
+        self.assertEqual(body.readinto(buffer), 3)
+        self.assertEqual(bytes(buffer[:3]), b"txt")
+        self.assertEqual(body.readinto(buffer), 0)
+        body.close()
+
+    def test_evicted_file_closed_after_last_response(self):
+        _, _, body = call(self.app, "/a.txt", read=False)
+        static_file = self.app.cache["/a.txt"]
+        call(self.app, "/b.txt")
+        self.assertNotIn("/a.txt", self.app.cache)
+        self.assertFalse(static_file.file.closed)
+        self.assertEqual(b"".join(body), b"a.txt" * 100)
+        body.close()
+        body.close()
+        self.assertTrue(static_file.file.closed)
+        self.assertFalse(self.app.cache["/b.txt"].file.closed)
+
+    def test_not_modified_releases_file(self):
+        _, _, body = call(self.app, "/a.txt", read=False)
+        body.close()
+        static_file = self.app.cache["/a.txt"]
+        call(self.app, "/a.txt", If_None_Match=static_file.etag)
+        self.assertEqual(static_file.users, 0)
+
+    def test_ranges(self):
+        status, headers, body = call(self.app, "/a.txt", Range="bytes=-3")
+        self.assertEqual(status, "206 Partial Content")
+        self.assertEqual(headers["Content-Range"], "bytes 497-499/500")
+        self.assertEqual(body, b"txt")
+        status, headers, _ = call(self.app, "/a.txt", Range="bytes=600-")
+        self.assertEqual(status, "416 Range Not Satisfiable")
+        self.assertEqual(headers["Content-Range"], "bytes */500")
+
+    def test_not_modified(self):
+        _, headers, _ = call(self.app, "/a.txt")
+        status, _, body = call(self.app, "/a.txt", If_None_Match=headers["ETag"])
+        self.assertEqual(status, "304 Not Modified")
+        self.assertEqual(body, b"")
+
+    def test_path_outside_the_directory_not_found(self):
+        status, _, _ = call(self.app, "/../a.txt")
+        self.assertEqual(status, "404 Not Found")
+
+    def test_served_with_sendfile(self):
+        address = start_server(self.app)
+        data = exchange(
+            address,
+            b"GET /a.txt HTTP/1.1\r\nHost: test\r\nRange: bytes=5-9\r\n\r\n"
+            b"GET /b.txt HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n",
+        )
+        (first, _, partial), (_, _, whole) = parse_responses(data)
+        self.assertTrue(first.endswith("206 Partial Content"))
+        self.assertEqual(partial, b"a.txt")
+        self.assertEqual(whole, b"b.txt" * 100)
+
+    def test_null_byte_not_found(self):
+        self.assertIsNone(self.app.get_file("/a\x00b"))
+        status, _, _ = call(self.app, "/a\x00b")
+        self.assertEqual(status, "404 Not Found")
+
+
+if __name__ == "__main__":
+    unittest.main()
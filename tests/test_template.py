@@ -0,0 +1,113 @@
+"""Tests of the template environment."""
+
+import os
+import tempfile
+import unittest
+
+from wsgi.application.template import TemplateEnvironment
+
+
+class TemplateEnvironmentTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.environment = TemplateEnvironment(self.directory.name, cache_size=2)
+
+    def write(self, name, body):
+        with open(os.path.join(self.directory.name, name), "w", encoding="utf-8") as file:
+            file.write(body)
+
+    def test_cached_until_modified(self):
+        self.write("page.html", "first")
+        environment = TemplateEnvironment(self.directory.name, check_interval=0)
+        template = environment("page.html")
+        self.assertIs(environment("page.html"), template)
+        self.write("page.html", "second")
+        path = os.path.join(self.directory.name, "page.html")
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+        self.assertEqual(environment("page.html").render(), "second")
+
+    def test_not_checked_without_auto_reload(self):
+        self.write("page.html", "first")
+        environment = TemplateEnvironment(self.directory.name, auto_reload=False, preload=True)
+        self.assertIn("page.html", environment.cache)
+        os.remove(os.path.join(self.directory.name, "page.html"))
+        self.assertEqual(environment("page.html").render(), "first")
+
+    def test_least_recently_used_evicted(self):
+        for name in ("a.html", "b.html", "c.html"):
+            self.write(name, name)
+        self.environment("a.html")
+        self.environment("b.html")
+        self.environment("a.html")
+        self.environment("c.html")
+        self.assertEqual(list(self.environment.cache), ["a.html", "c.html"])
+
+    def test_missing_template_not_cached(self):
+        self.write("page.html", "page")
+        self.environment("page.html")
+        for index in range(10):
+            self.assertIsNone(self.environment(f"missing{index}.html").root)
+        self.assertEqual(list(self.environment.cache), ["page.html"])
+
+    def test_template_created_after_miss(self):
+        self.assertIsNone(self.environment("late.html").root)
+        self.write("late.html", "{{ value }}")
+        self.assertEqual(self.environment("late.html").render(value=1), "1")
+
+    def test_deleted_template_evicted(self):
+        self.write("gone.html", "here")
+        environment = TemplateEnvironment(self.directory.name, check_interval=0)
+        self.assertEqual(environment("gone.html").render(), "here")
+        os.remove(os.path.join(self.directory.name, "gone.html"))
+        self.assertIsNone(environment("gone.html").root)
+        self.assertNotIn("gone.html", environment.cache)
+
+    def test_block_sees_loop_and_set_variables(self):
+        self.write(
+            "base.html",
+            "{% set sep = ',' %}{% for item in items %}{% block row %}{% endblock %}{% endfor %}",
+        )
+        self.write(
+            "child.html",
+            '{% extends "base.html" %}{% block row %}{{ item }}{{ sep }}{% endblock %}',
+        )
+        self.assertEqual(self.environment("child.html").render(items=[1, 2]), "1,2,")
+
+
+class TemplateLanguageTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.environment = TemplateEnvironment(self.directory.name)
+
+    def render(self, body: str, name: str = "page.html", **context) -> str:
+        with open(os.path.join(self.directory.name, name), "w", encoding="utf-8") as file:
+            file.write(body)
+        return self.environment(name).render(**context)
+
+    def test_html_escaped(self):
+        body = "{{ value }} {{ value|safe }}"
+        self.assertEqual(self.render(body, value="<b>"), "&lt;b&gt; <b>")
+        self.assertEqual(self.render(body, "page.txt", value="<b>"), "<b> <b>")
+
+    def test_control_flow(self):
+        body = (
+            "{# a comment #}{% for item in items %}"
+            "{% if item > 1 %}big{% elif item == 1 %}one{% else %}zero{% endif %} "
+            "{% endfor %}"
+        )
+        self.assertEqual(self.render(body, items=[0, 1, 2]), "zero one big ")
+
+    def test_include(self):
+        self.render("[{{ value }}]", "part.html")
+        self.assertEqual(self.render('{% include "part.html" %}!', value=1), "[1]!")
+
+    def test_generate_streams_chunks(self):
+        self.render("{% for row in rows %}{{ row }}{% endfor %}", rows=[])
+        chunks = list(self.environment("page.html").generate(rows=range(3)))
+        self.assertEqual("".join(chunks), "012")
+
+
+if __name__ == "__main__":
+    unittest.main()
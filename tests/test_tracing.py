@@ -0,0 +1,78 @@
+"""Tests of the per-request traces."""
+
+import json
+import unittest
+
+from wsgi.application.application import WSGIApplication
+from wsgi.tracing import Tracer, get_request_id, tracer
+
+from .helpers import exchange, parse_responses, start_server
+
+
+class TracerTest(unittest.TestCase):
+    def make_trace(self, tracer: Tracer, request_id: str, duration: float):
+        trace = tracer.start(request_id)
+        trace.start, trace.end = 1.0, 1.0 + duration
+        trace.add_span("handler", 1.2, 1.5)
+        trace.add_span("request", 1.0, 1.0 + duration, "server")
+        trace.add_instant("accept", 1.0)
+        tracer.finish(trace)
+        return trace
+
+    def test_slow_traces_kept_apart(self):
+        tracer = Tracer()
+        tracer.enable(buffer_size=2, slow_threshold=0.5)
+        self.make_trace(tracer, "slow", 1.0)
+        for index in range(3):
+            self.make_trace(tracer, f"fast{index}", 0.1)
+        self.assertEqual([trace.request_id for trace in tracer.get_traces()], ["fast1", "fast2"])
+        self.assertEqual([trace.request_id for trace in tracer.get_traces(slow=True)], ["slow"])
+
+    def test_chrome_trace_events(self):
+        tracer = Tracer()
+        trace = self.make_trace(tracer, "id", 1.0)
+        events = Tracer.export([trace])["traceEvents"]
+        self.assertEqual([event["ph"] for event in events], ["M", "M", "X", "i", "X"])
+        request, _, handler = events[2:]
+        # The enclosing span comes first
+        self.assertEqual(request["name"], "request")
+        self.assertEqual(request["dur"], 1e6)
+        self.assertEqual(handler["ts"], 1.2e6)
+        self.assertEqual(handler["tid"], trace.index)
+
+    def test_request_id(self):
+        self.assertEqual(get_request_id({"HTTP_X_REQUEST_ID": "abc-1"}), "abc-1")
+        generated = get_request_id({"HTTP_X_REQUEST_ID": "bad id\n"})
+        self.assertNotEqual(generated, get_request_id({}))
+        self.assertNotIn(" ", generated)
+
+
+class TraceEndpointTest(unittest.TestCase):
+    def tearDown(self):
+        tracer.disable()
+        tracer.reset()
+
+    def test_trace_of_a_request(self):
+        app = WSGIApplication()
+        app.get("/traced")(lambda request: "traced")
+        address = start_server(app, trace_path="/_trace")
+        exchange(
+            address,
+            b"GET /traced HTTP/1.1\r\nHost: test\r\nX-Request-ID: trace-me\r\n"
+            b"Connection: close\r\n\r\n",
+        )
+        data = exchange(
+            address,
+            b"GET /_trace?request_id=trace-me HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n",
+        )
+        (status, _, body), = parse_responses(data)
+        self.assertTrue(status.endswith("200 OK"))
+        events = json.loads(body)["traceEvents"]
+        names = {event["name"] for event in events}
+        self.assertIn("handler", names)
+        tracks = [event["args"]["name"] for event in events if event["name"] == "thread_name"]
+        self.assertEqual(tracks, ["GET /traced trace-me"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Tests of the bounded worker pool."""
+
+import threading
+import unittest
+
+from wsgi.server.worker_pool import WorkerPool
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def stop(self, pool: WorkerPool):
+        """Shut the pool down and wait for its threads."""
+        threads = list(pool.threads)
+        pool.shutdown()
+        for thread in threads:
+            thread.join(5)
+
+    def test_runs_tasks_and_grows(self):
+        pool = WorkerPool(1, 4, 8, 0.1, name="test")
+        pool.start()
+        release = threading.Event()
+        started = threading.Semaphore(0)
+
+        def task():
+            started.release()
+            release.wait(5)
+
+        for _ in range(4):
+            pool.submit(task)
+            self.assertTrue(started.acquire(timeout=5))
+        self.assertEqual(pool.stats()["busy_threads"], 4)
+        release.set()
+        self.stop(pool)
+        self.assertEqual(pool.stats()["threads"], 0)
+
+    def test_shutdown_with_a_full_queue(self):
+        pool = WorkerPool(1, 1, 2, 30.0, name="test")
+        pool.start()
+        release = threading.Event()
+        done = []
+        pool.submit(lambda: release.wait(5))
+        for index in range(2):
+            pool.submit(lambda index=index: done.append(index))
+        self.assertEqual(pool.stats()["queued_tasks"], 2)
+        stopper = threading.Thread(target=pool.shutdown, daemon=True)
+        stopper.start()
+        stopper.join(2)
+        # The shutdown returns while the queue is full and the thread busy
+        self.assertFalse(stopper.is_alive())
+        release.set()
+        for thread in list(pool.threads):
+            thread.join(5)
+        self.assertEqual(done, [0, 1])
+        self.assertEqual(pool.stats()["threads"], 0)
+
+    def test_thread_names_are_unique(self):
+        pool = WorkerPool(1, 3, 4, 0.05, name="test")
+        pool.start()
+        names = set()
+        started = threading.Semaphore(0)
+        for _ in range(3):
+            barrier = threading.Barrier(4, timeout=5)
+
+            def task():
+                names.add(threading.current_thread().name)
+                started.release()
+                barrier.wait()
+
+            for _ in range(3):
+                pool.submit(task)
+                self.assertTrue(started.acquire(timeout=5))
+            barrier.wait()
+            # Let the extra threads time out
+            for _ in range(100):
+                if pool.stats()["threads"] == 1:
+                    break
+                threading.Event().wait(0.02)
+        self.stop(pool)
+        self.assertGreater(len(names), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
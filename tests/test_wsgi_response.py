@@ -0,0 +1,62 @@
+"""Tests of the framing of the streamed WSGI responses."""
+
+import unittest
+
+from wsgi.server.wsgi import WSGIResponse
+
+from .helpers import parse_responses
+
+
+class WSGIResponseFramingTest(unittest.TestCase):
+    def respond(self, body_chunks, http_version: str = "HTTP/1.1", headers=()):
+        """Send a response the way the sessions do, return the bytes sent."""
+        sent = []
+        response = WSGIResponse(send=sent.extend, http_version=http_version)
+        response.start_response("200 OK", list(headers))
+        response.set_length_hint(body_chunks)
+        for chunk in body_chunks:
+            response.write(chunk)
+        response.finish()
+        return response, b"".join(sent)
+
+    def test_generator_body_is_chunked(self):
+        response, data = self.respond(chunk for chunk in (b"hello ", b"", b"world"))
+        self.assertIn(b"0\r\n\r\n", data)
+        (_, headers, body), = parse_responses(data)
+        self.assertEqual(headers["transfer-encoding"], "chunked")
+        self.assertNotIn("content-length", headers)
+        self.assertEqual(body, b"hello world")
+        self.assertTrue(response.keep_alive)
+
+    def test_list_body_gets_a_content_length(self):
+        _, data = self.respond([b"hello ", b"world"])
+        (_, headers, body), = parse_responses(data)
+        self.assertEqual(headers["content-length"], "11")
+        self.assertNotIn("transfer-encoding", headers)
+        self.assertEqual(body, b"hello world")
+
+    def test_application_content_length_is_kept(self):
+        _, data = self.respond(iter([b"abc"]), headers=[("Content-Length", "3")])
+        (_, headers, body), = parse_responses(data)
+        self.assertNotIn("transfer-encoding", headers)
+        self.assertEqual(body, b"abc")
+
+    def test_http10_body_is_delimited_by_closing(self):
+        response, data = self.respond(iter([b"abc"]), http_version="HTTP/1.0")
+        self.assertFalse(response.keep_alive)
+        self.assertNotIn(b"chunked", data)
+        self.assertTrue(data.endswith(b"\r\n\r\nabc"))
+
+    def test_small_writes_are_coalesced(self):
+        sent = []
+        response = WSGIResponse(send=sent.append)
+        write = response.start_response("200 OK", [])
+        for _ in range(10):
+            write(b"x")
+        self.assertEqual(sent, [])
+        response.finish()
+        self.assertEqual(len(sent), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
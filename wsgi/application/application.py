@@ -1,70 +1,212 @@
 """A module for the WSGI application class."""
 
+import asyncio
+import inspect
 import sys
-
+import time
 
 from .router import Router
-from .template import Template
-from .request import Request
-from .response import PlainTextResponse, BaseResponse, JSONResponse, NotFoundResponse
+from .static import StaticFiles
+from .template import TemplateEnvironment
+from .cache import ResponseCache
+from .middleware import HookMiddleware
+from .profiler import Profiler
+from .request import Request, get_path_info
+from ..metrics import ROUTE_ENVIRON_KEY, registry
+from ..tracing import TRACE_ENVIRON_KEY, tracer
+from .json_backend import get_json_backend
+from .response import (
+    BaseResponse,
+    MethodNotAllowedResponse,
+    NotFoundResponse,
+    to_response,
+)
+
+HANDLER_DURATION = registry.histogram(
+    "app_handler_duration_seconds",
+    "Seconds spent in the middleware and the handler of a route.",
+    ("route",),
+)
 
 
 class WSGIApplication:
     """A class representing a WSGI application."""
 
     def __init__(
-        self, middleware: list[callable] = None, template_engine: object = None
+        self,
+        middleware: list[callable] = None,
+        template_engine: object = None,
+        cache: ResponseCache = None,
+        json_backend=None,
+        profiler: Profiler = None,
     ):
         """Initialize the WSGI application.
         Args:
             middleware (list[callable], optional): The middleware. Defaults to None.
-            template_engine (object, optional): The template engine. Defaults to None.
+            template_engine (object, optional): The template engine, called with a template name. Defaults to a TemplateEnvironment.
+            cache (ResponseCache, optional): The cache of the responses of the routes with a cache_ttl. Defaults to None.
+            json_backend (str | callable, optional): The encoder of the JSON responses of this application, "auto"
+                (orjson if installed), "stdlib", "orjson" or a function encoding a value to bytes. Defaults to the
+                default encoder, see set_json_backend.
+            profiler (Profiler, optional): Profile a sample of the requests with cProfile. Defaults to None.
         """
         self.router = Router()
         self.app_dir = self._get_app_dir()
-        self.middleware = middleware
+        self.middleware = list(middleware) if middleware is not None else []
+        self.prefix_middleware = []
+        self.route_middleware = {}
+        self.chains = None
+        self.cache = cache
+        self.cache_ttls = {}
+        self.json_dumps = get_json_backend(json_backend) if json_backend is not None else None
+        self.mounts = []
+        self.profiler = profiler
         self.template_engine = (
-            template_engine if template_engine is not None else Template
+            template_engine if template_engine is not None else TemplateEnvironment()
         )
 
     def _get_app_dir(self):
         return sys.path[0]
 
-    def get(self, path: str):
+    def get(
+        self, path: str, middleware: list[callable] = None, cache_ttl: float = None
+    ):
         """Register a GET handler.
         Args:
             path (str): The path.
+            middleware (list[callable], optional): The route middleware. Defaults to None.
+            cache_ttl (float, optional): Seconds the responses are kept in the application cache. Defaults to None.
         Returns:
             callable: The decorator.
         """
-        return self.router.get(path)
+        return self.route(path, "GET", middleware, cache_ttl)
 
-    def post(self, path: str):
+    def post(self, path: str, middleware: list[callable] = None):
         """Register a POST handler.
         Args:
             path (str): The path.
+            middleware (list[callable], optional): The route middleware. Defaults to None.
         Returns:
-            callable: The decorator
+            callable: The decorator.
         """
-        return self.router.post(path)
+        return self.route(path, "POST", middleware)
 
-    def put(self, path: str):
+    def put(self, path: str, middleware: list[callable] = None):
         """Register a PUT handler.
         Args:
             path (str): The path.
+            middleware (list[callable], optional): The route middleware. Defaults to None.
         Returns:
-            callable: The decorator
+            callable: The decorator.
         """
-        return self.router.put(path)
+        return self.route(path, "PUT", middleware)
 
-    def delete(self, path: str):
+    def delete(self, path: str, middleware: list[callable] = None):
         """Register a DELETE handler.
         Args:
             path (str): The path.
+            middleware (list[callable], optional): The route middleware. Defaults to None.
+        Returns:
+            callable: The decorator.
+        """
+        return self.route(path, "DELETE", middleware)
+
+    def route(
+        self,
+        path: str,
+        http_method: str,
+        middleware: list[callable] = None,
+        cache_ttl: float = None,
+    ):
+        """Register a handler.
+        Args:
+            path (str): The path.
+            http_method (str): The HTTP method.
+            middleware (list[callable], optional): The route middleware. Defaults to None.
+            cache_ttl (float, optional): Seconds the responses are kept in the application cache. Defaults to None.
         Returns:
-            callable: The decorator
+            callable: The decorator.
+        """
+
+        def decorator(func: callable):
+            route = self.router.register(path, http_method, func)
+            if middleware:
+                self.route_middleware[route] = list(middleware)
+            if cache_ttl is not None:
+                self.cache_ttls[route] = cache_ttl
+            return func
+
+        return decorator
+
+    def use(self, middleware: callable, prefix: str = None):
+        """Add a middleware to all the routes or to the routes under a prefix.
+        Args:
+            middleware (callable): The middleware.
+            prefix (str, optional): The path prefix. Defaults to None.
+        """
+        if self.chains is not None:
+            raise RuntimeError("Cannot add a middleware to a frozen application")
+        if prefix is None:
+            self.middleware.append(middleware)
+        else:
+            self.prefix_middleware.append((prefix.rstrip("/"), middleware))
+
+    def before_request(self, func: callable):
+        """Register a hook called before the handlers, it may return a
+        response to short-circuit them.
+        Args:
+            func (callable): The hook, called with the request.
+        Returns:
+            callable: The hook.
+        """
+        self.use(HookMiddleware(before_request=func))
+        return func
+
+    def after_request(self, func: callable):
+        """Register a hook called with the response of the handlers.
+        Args:
+            func (callable): The hook, called with the request and the response.
+        Returns:
+            callable: The hook.
+        """
+        self.use(HookMiddleware(after_response=func))
+        return func
+
+    def mount(self, prefix: str, app: callable):
+        """Mount a WSGI application under a path prefix, it receives the
+        requests matching no route.
+        Args:
+            prefix (str): The path prefix.
+            app (callable): The WSGI application.
+        """
+        self.mounts.append((prefix.rstrip("/"), app))
+
+    def static(self, prefix: str, directory: str, **kwargs):
+        """Serve the files of a directory under a path prefix.
+        Args:
+            prefix (str): The path prefix.
+            directory (str): The directory.
+            **kwargs: The StaticFiles options.
         """
-        return self.router.delete(path)
+        self.mount(prefix, StaticFiles(directory, **kwargs))
+
+    def get_mount(self, environ):
+        """Get the mounted application matching the request path.
+        Args:
+            environ (dict): The WSGI environment.
+        Returns:
+            tuple: The application and its environ or None if no prefix matches.
+        """
+        path = environ["PATH_INFO"]
+        for prefix, app in self.mounts:
+            if path == prefix or path.startswith(prefix + "/"):
+                # The requests of a mount are grouped under its prefix in the metrics
+                environ[ROUTE_ENVIRON_KEY] = prefix + "/*"
+                mount_environ = dict(environ)
+                mount_environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + prefix
+                mount_environ["PATH_INFO"] = path[len(prefix) :] or "/"
+                return app, mount_environ
+        return None
 
     def __call__(self, environ, start_response):
         """This is the entry point for the WSGI server.
@@ -74,30 +216,355 @@ class WSGIApplication:
         Returns:
             list: The response body.
         """
-        route_handler = self.router.get_route_handler(
-            environ["PATH_INFO"], environ["REQUEST_METHOD"]
-        )
-        if route_handler is None:
-            response = NotFoundResponse()
+        if self.profiler is not None and self.profiler.enabled:
+            return self.profiler.call(self.handle, environ, start_response)
+        return self.handle(environ, start_response)
+
+    def handle(self, environ, start_response):
+        """Answer a request.
+        Args:
+            environ (dict): The WSGI environment.
+            start_response (callable): The start response function.
+        Returns:
+            list: The response body.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(environ)
+            if cached is not None:
+                status, headers, body = cached
+                environ[ROUTE_ENVIRON_KEY] = "cache"
+                start_response(status, headers)
+                return [body]
+        trace = environ.get(TRACE_ENVIRON_KEY) if tracer.enabled else None
+        match = self.match_route(environ, trace)
+        if match.handler is None:
+            mount = None if match.allowed_methods else self.get_mount(environ)
+            if mount is not None:
+                app, mount_environ = mount
+                return app(mount_environ, start_response)
+            response = self.no_route_response(match)
+        else:
+            route_handler, _ = self.get_chain(match.route)
+            environ[ROUTE_ENVIRON_KEY] = match.route.path
+            request = Request.from_environ(environ)
+            request.path_params = match.params
+            response = route_handler(request)
+            if inspect.iscoroutine(response):
+                # An async handler served by a synchronous server
+                response = asyncio.run(response)
+            response = self.serialize(environ, match, response, trace)
+        start_response(response.status, response.headers)
+        return response.iter_body()
+
+    async def call_async(self, environ, start_response):
+        """This is the entry point for the asyncio server. Async handlers are
+        awaited on the event loop, sync handlers and mounted WSGI applications
+        run in the loop executor.
+        Args:
+            environ (dict): The WSGI environment.
+            start_response (callable): The start response function.
+        Returns:
+            list: The response body.
+        """
+        if self.profiler is not None and self.profiler.enabled:
+            return await self.profiler.call_async(self.handle_async, environ, start_response)
+        return await self.handle_async(environ, start_response)
+
+    async def handle_async(self, environ, start_response):
+        """Answer a request on the event loop.
+        Args:
+            environ (dict): The WSGI environment.
+            start_response (callable): The start response function.
+        Returns:
+            list: The response body.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(environ)
+            if cached is not None:
+                status, headers, body = cached
+                environ[ROUTE_ENVIRON_KEY] = "cache"
+                start_response(status, headers)
+                return [body]
+        trace = environ.get(TRACE_ENVIRON_KEY) if tracer.enabled else None
+        match = self.match_route(environ, trace)
+        if match.handler is None:
+            mount = None if match.allowed_methods else self.get_mount(environ)
+            if mount is not None:
+                app, mount_environ = mount
+                call_async = getattr(app, "call_async", None)
+                if call_async is not None:
+                    return await call_async(mount_environ, start_response)
+                # A mounted WSGI application may block, e.g. reading files
+                return await asyncio.get_running_loop().run_in_executor(
+                    None, app, mount_environ, start_response
+                )
+            response = self.no_route_response(match)
         else:
-            route_handler = self.apply_middleware(route_handler)
+            route_handler, is_async = self.get_chain(match.route)
+            environ[ROUTE_ENVIRON_KEY] = match.route.path
             request = Request.from_environ(environ)
-            response = route_handler(request=request)
-            if isinstance(response, dict):
-                response = JSONResponse(body=response)
-            elif not isinstance(response, BaseResponse):
-                response = PlainTextResponse(body=response)
+            request.path_params = match.params
+            if is_async:
+                response = await route_handler(request)
+            else:
+                response = await asyncio.get_running_loop().run_in_executor(
+                    None, route_handler, request
+                )
+            response = self.serialize(environ, match, response, trace)
         start_response(response.status, response.headers)
-        return [response.body]
+        return response.iter_body()
 
-    def apply_middleware(self, func):
+    def match_route(self, environ, trace=None):
+        """Find the route of a request.
+        Args:
+            environ (dict): The WSGI environment.
+            trace (Trace, optional): The trace of the request, the lookup is recorded in it.
+        Returns:
+            RouteMatch: The route match.
+        """
+        if trace is None:
+            return self.router.match(get_path_info(environ), environ["REQUEST_METHOD"])
+        start = time.perf_counter()
+        match = self.router.match(get_path_info(environ), environ["REQUEST_METHOD"])
+        trace.add_span("route lookup", start, time.perf_counter())
+        return match
+
+    def serialize(self, environ, match, response, trace=None) -> BaseResponse:
+        """Convert the value returned by a handler to a response and cache it.
+        Args:
+            environ (dict): The WSGI environment.
+            match (RouteMatch): The route match.
+            response: The handler result.
+            trace (Trace, optional): The trace of the request, the serialization is recorded in it.
+        Returns:
+            BaseResponse: The response.
+        """
+        start = time.perf_counter() if trace is not None else 0.0
+        response = self.to_response(response)
+        response.encode()
+        self.store_response(environ, match, response)
+        if trace is not None:
+            trace.add_span("serialize", start, time.perf_counter())
+        return response
+
+    def store_response(self, environ, match, response: BaseResponse):
+        """Store the response of a route with a cache TTL in the cache.
+        Args:
+            environ (dict): The WSGI environment.
+            match (RouteMatch): The route match.
+            response (BaseResponse): The response.
+        """
+        if self.cache is None:
+            return
+        cache_ttl = self.cache_ttls.get(match.route)
+        if cache_ttl is not None:
+            self.cache.store(environ, response, cache_ttl)
+
+    def freeze(self):
+        """Freeze the routes and compose the middleware chain of each route,
+        called by the server before accepting requests.
+        """
+        if self.chains is not None:
+            return
+        self.router.freeze()
+        self.chains = {
+            route: self.build_chain(route, func)
+            for route, func in self.router.routes.items()
+        }
+
+    def get_chain(self, route):
+        """Get the composed handler of a route.
+        Args:
+            route (Routes): The route.
+        Returns:
+            tuple: The handler wrapped by its middleware and whether it is async.
+        """
+        if self.chains is None:
+            self.freeze()
+        return self.chains[route]
+
+    def build_chain(self, route, func):
+        """Wrap a handler with its middleware, the route middleware is the
+        innermost and the application middleware the outermost.
+        Args:
+            route (Routes): The route.
+            func (callable): The handler.
+        Returns:
+            tuple: The wrapped handler and whether the handler is async.
+        """
+        is_async = inspect.iscoroutinefunction(func)
+        if "{" in route.path:
+            func = self.bind_params(func, is_async)
+        middleware = list(self.route_middleware.get(route, ()))
+        for prefix, prefix_middleware in self.prefix_middleware:
+            if route.path == prefix or route.path.startswith(prefix + "/"):
+                middleware.append(prefix_middleware)
+        middleware.extend(self.middleware)
+        if middleware and self.json_dumps is not None:
+            # The middleware may read the body, give the JSON encoder first
+            func = self.use_json_backend(func, is_async)
+        if tracer.enabled:
+            chain = self.apply_traced_middleware(func, middleware)
+        else:
+            chain = self.apply_middleware(func, middleware)
+        if registry.enabled:
+            chain = self.time_handler(chain, route.path, is_async)
+        return chain, is_async
+
+    @staticmethod
+    def time_handler(func, path, is_async):
+        """Record the time spent in the middleware and the handler of a route.
+        Args:
+            func (callable): The handler wrapped by its middleware.
+            path (str): The route path.
+            is_async (bool): Whether the handler is a coroutine function.
+        Returns:
+            callable: The timed handler.
+        """
+        labels = (path,)
+        if is_async:
+
+            async def async_wrapper(request):
+                start = time.perf_counter()
+                try:
+                    return await func(request)
+                finally:
+                    HANDLER_DURATION.observe(time.perf_counter() - start, labels)
+
+            return async_wrapper
+
+        def wrapper(request):
+            start = time.perf_counter()
+            try:
+                return func(request)
+            finally:
+                HANDLER_DURATION.observe(time.perf_counter() - start, labels)
+
+        return wrapper
+
+    @staticmethod
+    def trace_span(func, name):
+        """Record the time spent in a handler or a middleware in the trace of the request.
+        Args:
+            func (callable): The handler, or the handler wrapped by the middleware.
+            name (str): The span name.
+        Returns:
+            callable: The traced handler.
+        """
+        if inspect.iscoroutinefunction(func):
+
+            async def async_wrapper(request):
+                trace = request.environ.get(TRACE_ENVIRON_KEY)
+                if trace is None:
+                    return await func(request)
+                start = time.perf_counter()
+                try:
+                    return await func(request)
+                finally:
+                    trace.add_span(name, start, time.perf_counter())
+
+            return async_wrapper
+
+        def wrapper(request):
+            trace = request.environ.get(TRACE_ENVIRON_KEY)
+            if trace is None:
+                return func(request)
+            start = time.perf_counter()
+            try:
+                return func(request)
+            finally:
+                trace.add_span(name, start, time.perf_counter())
+
+        return wrapper
+
+    @staticmethod
+    def bind_params(func, is_async):
+        """Pass the path parameters to the handler, the middleware still
+        calls it with the request only.
+        Args:
+            func (callable): The handler.
+            is_async (bool): Whether the handler is a coroutine function.
+        Returns:
+            callable: The handler called with the request.
+        """
+        if is_async:
+
+            async def async_endpoint(request):
+                return await func(request, **request.path_params)
+
+            return async_endpoint
+
+        def endpoint(request):
+            return func(request, **request.path_params)
+
+        return endpoint
+
+    def no_route_response(self, match) -> BaseResponse:
+        """Get the response for a request matching no route.
+        Args:
+            match (RouteMatch): The route match.
+        Returns:
+            BaseResponse: A 405 response if the path matches other methods, else a 404.
+        """
+        if match.allowed_methods:
+            return MethodNotAllowedResponse(match.allowed_methods)
+        return NotFoundResponse()
+
+    def to_response(self, response) -> BaseResponse:
+        """Convert the value returned by a handler to a response.
+        Args:
+            response: The handler result.
+        Returns:
+            BaseResponse: The response.
+        """
+        return to_response(response, self.json_dumps)
+
+    def use_json_backend(self, func, is_async):
+        """Give the JSON encoder of the application to the JSON responses of a handler.
+        Args:
+            func (callable): The handler.
+            is_async (bool): Whether the handler is a coroutine function.
+        Returns:
+            callable: The handler returning responses.
+        """
+        dumps = self.json_dumps
+        if is_async:
+
+            async def async_wrapper(request):
+                return to_response(await func(request), dumps)
+
+            return async_wrapper
+
+        def wrapper(request):
+            return to_response(func(request), dumps)
+
+        return wrapper
+
+    @staticmethod
+    def apply_middleware(func, middleware):
         """Apply middleware to the function.
         Args:
             func: The function.
+            middleware (list[callable]): The middleware, the last one is the outermost.
+        Returns:
+            callable: The wrapped function.
+        """
+        for wrap in middleware:
+            func = wrap(func)
+        return func
+
+    @classmethod
+    def apply_traced_middleware(cls, func, middleware):
+        """Apply middleware to the function, the handler and each middleware
+        record a span in the trace of the request.
+        Args:
+            func: The function.
+            middleware (list[callable]): The middleware, the last one is the outermost.
         Returns:
             callable: The wrapped function.
         """
-        if self.middleware is not None:
-            for middleware in self.middleware:
-                func = middleware(func)
+        func = cls.trace_span(func, "handler")
+        for wrap in middleware:
+            name = getattr(wrap, "__name__", None) or type(wrap).__name__
+            func = cls.trace_span(wrap(func), f"middleware {name}")
         return func
@@ -0,0 +1,259 @@
+"""An in-memory cache of the application responses."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from .request import get_path_info
+from .response import BaseResponse
+
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHEABLE_STATUSES = ("200", "203", "301", "404", "410")
+# Bytes accounted for each entry besides its headers and body
+ENTRY_OVERHEAD = 256
+# The request headers identifying a user, their responses are not shared
+CREDENTIAL_KEYS = ("HTTP_AUTHORIZATION", "HTTP_COOKIE")
+
+
+def normalize_path(path: str) -> str:
+    """Remove the trailing slash of a path, like the router."""
+    return path.rstrip("/") if path != "/" else path
+
+
+def normalize_query(query: str) -> str:
+    """Sort the parameters of a query string."""
+    if "&" not in query:
+        return query
+    return "&".join(sorted(query.split("&")))
+
+
+def has_credentials(environ: dict) -> bool:
+    """Check if a request carries an Authorization or Cookie header."""
+    for key in CREDENTIAL_KEYS:
+        if environ.get(key):
+            return True
+    return False
+
+
+def parse_cache_control(value: str) -> dict:
+    """Parse a Cache-Control header.
+    Args:
+        value (str): The header value.
+    Returns:
+        dict: The directives, the ones without a value map to None.
+    """
+    directives = {}
+    for directive in value.split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+class ResponseCache:
+    """A cache of complete responses shared by all the threads.
+
+    The routes opt in with a TTL on their decorator. An entry is keyed by the
+    method, the path, the query string with its parameters sorted and the
+    values of the request headers listed in the Vary header of the response.
+    The handler can shorten or extend the TTL with Cache-Control max-age or
+    s-maxage, or disable caching with no-store, no-cache or private. The
+    requests with an Authorization or Cookie header are answered for one
+    user: their responses are only stored, and they are only answered from
+    the cache, when the response has Cache-Control public. The entries are
+    evicted in LRU order once their size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        """Initialize the cache.
+        Args:
+            max_bytes (int, optional): The size of the cached headers and bodies. Defaults to 64 MiB.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        # The request headers of the Vary header and the number of variants,
+        # by method, path and query
+        self.vary = {}
+        self.variants = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def primary_key(environ: dict) -> Optional[tuple]:
+        """Get the key of a request without the Vary headers.
+        Args:
+            environ (dict): The WSGI environment.
+        Returns:
+            tuple: The key or None if the method is not cacheable.
+        """
+        method = environ["REQUEST_METHOD"]
+        if method == "HEAD":
+            method = "GET"
+        elif method != "GET":
+            return None
+        return (
+            method,
+            normalize_path(get_path_info(environ)),
+            normalize_query(environ.get("QUERY_STRING", "")),
+        )
+
+    def get(self, environ: dict) -> Optional[tuple]:
+        """Get the cached response of a request.
+        Args:
+            environ (dict): The WSGI environment.
+        Returns:
+            tuple: The status, the headers and the body, or None.
+        """
+        primary_key = self.primary_key(environ)
+        if primary_key is None:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            vary = self.vary.get(primary_key)
+            entry = None
+            if vary is not None:
+                key = (primary_key, tuple(environ.get(name) for name in vary))
+                entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            status, headers, body, stored_at, expires, size, public = entry
+            if now >= expires:
+                self.remove(key)
+                self.misses += 1
+                return None
+            if not public and has_credentials(environ):
+                # The entry may have been built for another user, or for no user
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        headers = list(headers)
+        headers.append(("Age", str(int(now - stored_at))))
+        return status, headers, body
+
+    def store(self, environ: dict, response: BaseResponse, ttl: float) -> bool:
+        """Store a response if it can be cached.
+        Args:
+            environ (dict): The WSGI environment.
+            response (BaseResponse): The response.
+            ttl (float): The seconds the response is fresh, unless its Cache-Control says otherwise.
+        Returns:
+            bool: Whether the response was stored.
+        """
+        primary_key = self.primary_key(environ)
+        if primary_key is None or not isinstance(response.body, (bytes, bytearray)):
+            return False
+        if not response.status.startswith(CACHEABLE_STATUSES):
+            return False
+        headers = {name.lower(): value for name, value in response.headers}
+        if "set-cookie" in headers:
+            return False
+        cache_control = parse_cache_control(headers.get("cache-control", ""))
+        if {"no-store", "no-cache", "private"} & cache_control.keys():
+            return False
+        public = "public" in cache_control
+        if not public and has_credentials(environ):
+            return False
+        max_age = cache_control.get("s-maxage") or cache_control.get("max-age")
+        if max_age is not None:
+            try:
+                ttl = int(max_age)
+            except ValueError:
+                return False
+        if ttl <= 0:
+            return False
+        vary = tuple(
+            "HTTP_" + name.strip().upper().replace("-", "_")
+            for name in headers.get("vary", "").split(",")
+            if name.strip()
+        )
+        if "HTTP_*" in vary:
+            return False
+        body = bytes(response.body)
+        stored_headers = tuple(response.headers)
+        size = ENTRY_OVERHEAD + len(body) + sum(
+            len(name) + len(value) for name, value in stored_headers
+        )
+        if size > self.max_bytes:
+            return False
+        key = (primary_key, tuple(environ.get(name) for name in vary))
+        now = time.monotonic()
+        with self.lock:
+            if primary_key in self.vary and self.vary[primary_key] != vary:
+                # The resource varies on other headers now, drop its variants
+                self.remove_matching(lambda entry_key: entry_key[0] == primary_key)
+            self.remove(key)
+            self.vary[primary_key] = vary
+            self.variants[primary_key] = self.variants.get(primary_key, 0) + 1
+            self.entries[key] = (response.status, stored_headers, body, now, now + ttl, size, public)
+            self.size += size
+            self.stores += 1
+            while self.size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+        return True
+
+    def invalidate(self, path: str, prefix: bool = False) -> int:
+        """Remove the cached responses of a path.
+        Args:
+            path (str): The path.
+            prefix (bool, optional): Also remove the paths under it. Defaults to False.
+        Returns:
+            int: The number of removed responses.
+        """
+        path = normalize_path(path)
+        if prefix:
+            base = path.rstrip("/") + "/"
+            matches = lambda key: key[0][1] == path or key[0][1].startswith(base)
+        else:
+            matches = lambda key: key[0][1] == path
+        with self.lock:
+            return self.remove_matching(matches)
+
+    def clear(self):
+        """Remove all the cached responses."""
+        with self.lock:
+            self.entries.clear()
+            self.vary.clear()
+            self.variants.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        """Get the cache counters.
+        Returns:
+            dict: The hits, misses, stores, evictions, entries and bytes.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+            }
+
+    def remove(self, key: tuple):
+        """Remove an entry, the lock must be held."""
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry[5]
+        primary_key = key[0]
+        self.variants[primary_key] -= 1
+        if not self.variants[primary_key]:
+            del self.variants[primary_key]
+            del self.vary[primary_key]
+
+    def remove_matching(self, matches) -> int:
+        """Remove the entries whose key matches, the lock must be held."""
+        keys = [key for key in self.entries if matches(key)]
+        for key in keys:
+            self.remove(key)
+        return len(keys)
@@ -0,0 +1,218 @@
+"""Response compression for the application."""
+
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from .middleware import Middleware
+from .response import BaseResponse
+
+ENCODINGS = ("gzip", "deflate")
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/xhtml+xml",
+    "image/svg+xml",
+)
+MINIMUM_SIZE = 500
+COMPRESSION_LEVEL = 6
+CACHE_SIZE = 128
+CACHE_MAX_BODY_SIZE = 1024 * 1024
+CACHE_MAX_BYTES = 8 * 1024 * 1024
+# The bytes of the body digest keying the cache
+DIGEST_SIZE = 16
+
+
+def parse_accept_encoding(header: str) -> List[Tuple[str, float]]:
+    """Parse an Accept-Encoding header.
+    Args:
+        header (str): The header value.
+    Returns:
+        list: The content codings and their q-values.
+    """
+    codings = []
+    for item in header.split(","):
+        coding, *params = item.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        codings.append((coding, quality))
+    return codings
+
+
+def negotiate_encoding(header: Optional[str], available=ENCODINGS) -> Optional[str]:
+    """Choose the content coding preferred by the client.
+    Args:
+        header (str): The Accept-Encoding header value.
+        available (tuple): The supported content codings, by server preference.
+    Returns:
+        str: The content coding or None to send the body as is.
+    """
+    if not header:
+        return None
+    qualities = dict(parse_accept_encoding(header))
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressionMiddleware(Middleware):
+    """Middleware compressing the responses with gzip or deflate.
+
+    The coding is negotiated from the Accept-Encoding request header. Small
+    bodies, content types that are not compressible (images, archives...)
+    and responses already encoded are left alone. Bodies given as bytes are
+    compressed at once and kept in an LRU cache keyed by a digest of the body
+    and bounded by the total size of the compressed bodies, so repeated
+    identical responses are compressed only once. Iterable bodies are compressed while
+    they are streamed.
+    """
+
+    def __init__(
+        self,
+        minimum_size: int = MINIMUM_SIZE,
+        level: int = COMPRESSION_LEVEL,
+        cache_size: int = CACHE_SIZE,
+        cache_max_body_size: int = CACHE_MAX_BODY_SIZE,
+        cache_max_bytes: int = CACHE_MAX_BYTES,
+    ):
+        """Initialize the middleware.
+        Args:
+            minimum_size (int, optional): Smaller bodies are not compressed. Defaults to 500.
+            level (int, optional): The zlib compression level. Defaults to 6.
+            cache_size (int, optional): The number of cached compressed bodies. Defaults to 128.
+            cache_max_body_size (int, optional): Larger bodies are not cached. Defaults to 1 MiB.
+            cache_max_bytes (int, optional): The total size of the cached compressed
+                bodies. Defaults to 8 MiB.
+        """
+        self.minimum_size = minimum_size
+        self.level = level
+        self.cache_size = cache_size
+        self.cache_max_body_size = cache_max_body_size
+        self.cache_max_bytes = cache_max_bytes
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        self.lock = threading.Lock()
+
+    def after_response(self, request, response) -> BaseResponse:
+        """Compress a response if the client accepts it and it is worth it.
+        Args:
+            request (Request): The request.
+            response (BaseResponse): The response.
+        Returns:
+            BaseResponse: The response.
+        """
+        headers = {name.lower(): value for name, value in response.headers}
+        if not self.is_compressible(response, headers):
+            return response
+        self.add_vary(response, headers)
+        encoding = negotiate_encoding(request.headers.get("ACCEPT_ENCODING"))
+        if encoding is None:
+            return response
+        response.headers = [
+            (name, value)
+            for name, value in response.headers
+            if name.lower() != "content-length"
+        ]
+        response.headers.append(("Content-Encoding", encoding))
+        if isinstance(response.body, (bytes, bytearray)):
+            response.body = self.compress(bytes(response.body), encoding)
+            response.headers.append(("Content-Length", str(len(response.body))))
+        else:
+            response.body = self.compress_stream(response.body, encoding)
+        return response
+
+    def is_compressible(self, response: BaseResponse, headers: dict) -> bool:
+        """Check if a response should be compressed."""
+        if "content-encoding" in headers or not response.status.startswith("200"):
+            return False
+        content_type = headers.get("content-type", response.content_type).lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        if isinstance(response.body, (bytes, bytearray)):
+            return len(response.body) >= self.minimum_size
+        return True
+
+    def add_vary(self, response: BaseResponse, headers: dict):
+        """Tell caches the response depends on Accept-Encoding."""
+        vary = headers.get("vary")
+        if vary is None:
+            response.headers.append(("Vary", "Accept-Encoding"))
+        elif "accept-encoding" not in vary.lower() and vary.strip() != "*":
+            response.headers = [
+                (name, f"{value}, Accept-Encoding" if name.lower() == "vary" else value)
+                for name, value in response.headers
+            ]
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        """Compress a body, using the cache for repeated bodies.
+        Args:
+            body (bytes): The body.
+            encoding (str): The content coding.
+        Returns:
+            bytes: The compressed body.
+        """
+        cacheable = len(body) <= self.cache_max_body_size and self.cache_size > 0
+        if cacheable:
+            # The key holds a digest, not the body, so the cache only keeps
+            # the compressed bodies alive
+            key = (encoding, len(body), hashlib.blake2b(body, digest_size=DIGEST_SIZE).digest())
+            with self.lock:
+                compressed = self.cache.get(key)
+                if compressed is not None:
+                    self.cache.move_to_end(key)
+                    return compressed
+        if encoding == "gzip":
+            compressed = gzip.compress(body, self.level, mtime=0)
+        else:
+            compressed = zlib.compress(body, self.level)
+        if cacheable and len(compressed) <= self.cache_max_bytes:
+            with self.lock:
+                previous = self.cache.pop(key, None)
+                if previous is not None:
+                    self.cache_bytes -= len(previous)
+                self.cache[key] = compressed
+                self.cache_bytes += len(compressed)
+                while len(self.cache) > self.cache_size or self.cache_bytes > self.cache_max_bytes:
+                    _, evicted = self.cache.popitem(last=False)
+                    self.cache_bytes -= len(evicted)
+        return compressed
+
+    def compress_stream(self, chunks, encoding: str):
+        """Compress an iterable body while it is streamed.
+        Args:
+            chunks (iterable): The body chunks.
+            encoding (str): The content coding.
+        Yields:
+            bytes: The compressed chunks.
+        """
+        # wbits 31 writes the gzip container, 15 the zlib one used by deflate
+        wbits = 31 if encoding == "gzip" else 15
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, wbits)
+        try:
+            for chunk in chunks:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
@@ -0,0 +1,67 @@
+"""JSON encoders used by the JSON responses.
+
+The "stdlib" backend uses the json module with compact separators, "orjson"
+uses the orjson package when it is installed and "auto" picks orjson if it is
+available. Values orjson cannot encode are encoded by the json module.
+"""
+
+import json
+from typing import Any, Callable, Union
+
+JSON_BACKENDS = ("auto", "stdlib", "orjson")
+
+stdlib_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def stdlib_dumps(value: Any) -> bytes:
+    """Encode a value with the json module.
+    Args:
+        value: The value.
+    Returns:
+        bytes: The UTF-8 JSON document.
+    """
+    return stdlib_encoder.encode(value).encode("utf-8")
+
+
+def get_orjson_dumps() -> Callable[[Any], bytes]:
+    """Get the orjson encoder, falling back to the json module for the values
+    orjson rejects (e.g. non-str keys or big integers).
+    Raises:
+        ImportError: If orjson is not installed.
+    """
+    import orjson
+
+    options = orjson.OPT_NON_STR_KEYS
+
+    def orjson_dumps(value: Any) -> bytes:
+        try:
+            return orjson.dumps(value, option=options)
+        except TypeError:
+            return stdlib_dumps(value)
+
+    return orjson_dumps
+
+
+def get_json_backend(backend: Union[str, Callable[[Any], bytes]] = "auto"):
+    """Get the encoder of a JSON backend.
+    Args:
+        backend (str | callable): "auto", "stdlib", "orjson" or a function
+            encoding a value to bytes.
+    Returns:
+        callable: The function encoding a value to bytes.
+    Raises:
+        ValueError: If the backend is unknown.
+        ImportError: If orjson is requested and not installed.
+    """
+    if callable(backend):
+        return backend
+    if backend not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend {backend!r}, expected one of {JSON_BACKENDS}")
+    if backend == "stdlib":
+        return stdlib_dumps
+    try:
+        return get_orjson_dumps()
+    except ImportError:
+        if backend == "orjson":
+            raise
+        return stdlib_dumps
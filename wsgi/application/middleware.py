@@ -1,16 +1,46 @@
 """Middlewares for the application."""
 
+import inspect
 import time
 
+from ..server.log import print_debug
+from .response import to_response
+
+
+def log_timing(request, duration: float):
+    """Log the time taken by a request.
+    Args:
+        request (Request): The request.
+        duration (float): The seconds taken.
+    """
+    print_debug(f"{request.method} {request.path} took {duration * 1000:.3f} ms.")
+
 
 def timing_middleware(func):
-    """Middleware to print the time taken for each request.
+    """Middleware to log the time taken by the handler of each request, with
+    the debug messages of the server (debug=True).
     Args:
         func (callable): The function to call.
     Returns:
         callable: The wrapper function.
     """
 
+    if inspect.iscoroutinefunction(func):
+
+        async def async_wrapper(request):
+            """Wrapper function for the middleware around async handlers.
+            Args:
+                request (Request): The request.
+            Returns:
+                Response: The response.
+            """
+            start = time.perf_counter()
+            response = await func(request)
+            log_timing(request, time.perf_counter() - start)
+            return response
+
+        return async_wrapper
+
     def wrapper(request):
         """Wrapper function for the middleware.
         Args:
@@ -18,10 +48,100 @@ def timing_middleware(func):
         Returns:
             Response: The response.
         """
-        start = time.time()
+        start = time.perf_counter()
         response = func(request)
-        end = time.time()
-        print(f"Request took {end - start} seconds.")
+        log_timing(request, time.perf_counter() - start)
         return response
 
     return wrapper
+
+
+class Middleware:
+    """Base class for the middleware with request and response phases.
+
+    Subclasses override `before_request`, which may return a response to
+    short-circuit the handler, and/or `after_response`, which receives the
+    response returned by the handler (or by `before_request`). An instance
+    wraps a handler like any other middleware, the wrapper is built once per
+    route when the application is frozen and only calls the overridden hooks.
+    """
+
+    def before_request(self, request):
+        """Called before the handler.
+        Args:
+            request (Request): The request.
+        Returns:
+            Response: A response to send without calling the handler, or None.
+        """
+        return None
+
+    def after_response(self, request, response):
+        """Called with the response of the handler.
+        Args:
+            request (Request): The request.
+            response (BaseResponse): The response.
+        Returns:
+            BaseResponse: The response to send, None keeps the response.
+        """
+        return response
+
+    def get_hooks(self):
+        """Get the hooks to call, None for the ones not overridden.
+        Returns:
+            tuple: The before request and after response hooks.
+        """
+        cls = type(self)
+        before = after = None
+        if cls.before_request is not Middleware.before_request:
+            before = self.before_request
+        if cls.after_response is not Middleware.after_response:
+            after = self.after_response
+        return before, after
+
+    def __call__(self, func):
+        """Wrap a route handler.
+        Args:
+            func (callable): The function to call.
+        Returns:
+            callable: The wrapper function.
+        """
+        before, after = self.get_hooks()
+
+        def finish(request, response):
+            response = to_response(response)
+            result = after(request, response)
+            return response if result is None else result
+
+        if inspect.iscoroutinefunction(func):
+
+            async def async_wrapper(request):
+                response = before(request) if before is not None else None
+                if response is None:
+                    response = await func(request)
+                return finish(request, response) if after is not None else response
+
+            return async_wrapper
+
+        def wrapper(request):
+            response = before(request) if before is not None else None
+            if response is None:
+                response = func(request)
+            return finish(request, response) if after is not None else response
+
+        return wrapper
+
+
+class HookMiddleware(Middleware):
+    """Middleware calling plain functions as the request and response hooks."""
+
+    def __init__(self, before_request=None, after_response=None):
+        """Initialize the middleware.
+        Args:
+            before_request (callable, optional): Called with the request. Defaults to None.
+            after_response (callable, optional): Called with the request and the response. Defaults to None.
+        """
+        self.before_hook = before_request
+        self.after_hook = after_response
+
+    def get_hooks(self):
+        return self.before_hook, self.after_hook
@@ -0,0 +1,256 @@
+"""Profile a sample of the live requests with cProfile.
+
+The sampled requests are profiled from the routing to the response of the
+handler, the stats are added up by route pattern. They are read from the
+admin application (a summary in text or the toggles), dumped as pstats
+files, or toggled with a signal.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import signal
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import parse_qsl
+
+from ..metrics import ROUTE_ENVIRON_KEY
+
+PROFILE_SORT_KEYS = ("cumulative", "tottime", "calls", "ncalls", "time", "name")
+
+
+class RouteProfile:
+    """The profile stats of the sampled requests of a route."""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.stats: Optional[pstats.Stats] = None
+        self.requests = 0
+        self.seconds = 0.0
+
+    def add(self, profile: cProfile.Profile, seconds: float):
+        """Add the profile of a request."""
+        if self.stats is None:
+            self.stats = pstats.Stats(profile, stream=io.StringIO())
+        else:
+            self.stats.add(profile)
+        self.requests += 1
+        self.seconds += seconds
+
+
+class Profiler:
+    """Profile 1 request in `sample_rate`, the requests under some paths or
+    the requests sending a header.
+
+    The application checks `enabled` before anything else, a disabled
+    profiler costs a single branch. A thread profiles one request at a time,
+    the requests arriving meanwhile are not sampled. With the asyncio engine
+    only the event loop thread is profiled, which includes the other tasks
+    running while a sampled request awaits. The body of a streamed response
+    is produced after the profile ends.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 100,
+        paths: Iterable[str] = (),
+        header: Optional[str] = None,
+        enabled: bool = True,
+        output_dir: Optional[str] = None,
+        toggle_signal: Optional[int] = None,
+    ):
+        """Initialize the profiler.
+        Args:
+            sample_rate (int, optional): Profile 1 request in sample_rate, 0 only
+                profiles the requests matching paths or header. Defaults to 100.
+            paths (iterable, optional): Profile every request whose path starts with one of them.
+            header (str, optional): Profile every request sending this header, e.g. "X-Profile".
+            enabled (bool, optional): Start profiling right away. Defaults to True.
+            output_dir (str, optional): The directory `dump` writes the pstats files to.
+            toggle_signal (int, optional): A signal toggling the profiler, e.g.
+                signal.SIGUSR2. Stats are dumped when it is turned off.
+        """
+        self.sample_rate = sample_rate
+        self.paths = tuple(paths)
+        self.header_key = "HTTP_" + header.upper().replace("-", "_") if header else None
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.routes: Dict[str, RouteProfile] = {}
+        if toggle_signal is not None:
+            signal.signal(toggle_signal, self.handle_signal)
+
+    def enable(self):
+        """Start sampling requests."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop sampling requests, the stats are kept."""
+        self.enabled = False
+
+    def reset(self):
+        """Drop the stats."""
+        with self.lock:
+            self.routes = {}
+
+    def handle_signal(self, signum, frame):
+        """Toggle the profiler, dumping the stats when it is turned off."""
+        if self.enabled:
+            self.disable()
+            if self.output_dir is not None:
+                threading.Thread(target=self.dump, name="profiler-dump", daemon=True).start()
+        else:
+            self.enable()
+
+    def should_profile(self, environ: dict) -> bool:
+        """Decide if a request is profiled.
+        Args:
+            environ (dict): The WSGI environ.
+        Returns:
+            bool: Whether the request is sampled.
+        """
+        if getattr(self.local, "active", False):
+            return False
+        if self.header_key is not None and self.header_key in environ:
+            return True
+        if self.paths and environ.get("PATH_INFO", "").startswith(self.paths):
+            return True
+        # Random rather than every Nth request, which would follow the request patterns
+        return self.sample_rate > 0 and random.random() * self.sample_rate < 1
+
+    def call(self, func: Callable, environ: dict, start_response: Callable):
+        """Call the application, profiling the sampled requests.
+        Args:
+            func (callable): The application entry point.
+            environ (dict): The WSGI environ.
+            start_response (callable): The start response function.
+        Returns:
+            iterable: The response body.
+        """
+        if not self.should_profile(environ):
+            return func(environ, start_response)
+        profile = cProfile.Profile()
+        self.local.active = True
+        start = time.perf_counter()
+        try:
+            return profile.runcall(func, environ, start_response)
+        finally:
+            self.local.active = False
+            self.record(environ, profile, time.perf_counter() - start)
+
+    async def call_async(self, func: Callable, environ: dict, start_response: Callable):
+        """Await the asynchronous application entry point, profiling the sampled requests."""
+        if not self.should_profile(environ):
+            return await func(environ, start_response)
+        profile = cProfile.Profile()
+        self.local.active = True
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return await func(environ, start_response)
+        finally:
+            profile.disable()
+            self.local.active = False
+            self.record(environ, profile, time.perf_counter() - start)
+
+    def record(self, environ: dict, profile: cProfile.Profile, seconds: float):
+        """Add the profile of a request to the stats of its route."""
+        route = environ.get(ROUTE_ENVIRON_KEY, "unmatched")
+        with self.lock:
+            route_profile = self.routes.get(route)
+            if route_profile is None:
+                route_profile = self.routes[route] = RouteProfile(route)
+            route_profile.add(profile, seconds)
+
+    def summary(self, route: Optional[str] = None, sort: str = "cumulative", limit: int = 25) -> str:
+        """Format the stats of the routes.
+        Args:
+            route (str, optional): Only this route. Defaults to all the routes.
+            sort (str, optional): The pstats sort key. Defaults to "cumulative".
+            limit (int, optional): The functions listed per route. Defaults to 25.
+        Returns:
+            str: The summary.
+        """
+        if sort not in PROFILE_SORT_KEYS:
+            raise ValueError(f"Unknown sort key {sort!r}, expected one of {PROFILE_SORT_KEYS}")
+        state = "enabled" if self.enabled else "disabled"
+        output = io.StringIO()
+        output.write(f"Profiler {state}, sample rate 1/{self.sample_rate}\n")
+        with self.lock:
+            for route_profile in sorted(self.routes.values(), key=lambda item: -item.seconds):
+                if route is not None and route_profile.route != route:
+                    continue
+                mean = route_profile.seconds / route_profile.requests * 1000
+                output.write(
+                    f"\n=== {route_profile.route}: {route_profile.requests} requests,"
+                    f" {mean:.3f} ms mean\n"
+                )
+                route_profile.stats.stream = output
+                route_profile.stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def dump(self, directory: Optional[str] = None) -> list:
+        """Write the stats of every route as a pstats file, named after the route.
+        Args:
+            directory (str, optional): The directory. Defaults to output_dir.
+        Returns:
+            list: The written files.
+        """
+        directory = directory or self.output_dir or "."
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        with self.lock:
+            for route_profile in self.routes.values():
+                name = re.sub(r"[^A-Za-z0-9_.-]+", "_", route_profile.route).strip("_") or "root"
+                path = os.path.join(directory, f"{name}.{os.getpid()}.pstats")
+                route_profile.stats.dump_stats(path)
+                files.append(path)
+        return files
+
+    def admin_app(self, environ, start_response):
+        """A WSGI application to read and toggle the profiler, mount it under
+        a path that is not public.
+
+        GET answers the summary (query parameters route, sort and limit),
+        POST runs the action of the query parameter action: enable, disable,
+        reset or dump.
+        """
+        query = dict(parse_qsl(environ.get("QUERY_STRING", "")))
+        status = "200 OK"
+        try:
+            if environ["REQUEST_METHOD"] == "POST":
+                action = query.get("action")
+                if action == "enable":
+                    self.enable()
+                    body = "Profiler enabled.\n"
+                elif action == "disable":
+                    self.disable()
+                    body = "Profiler disabled.\n"
+                elif action == "reset":
+                    self.reset()
+                    body = "Profiler stats dropped.\n"
+                elif action == "dump":
+                    body = "".join(f"{path}\n" for path in self.dump())
+                else:
+                    status, body = "400 Bad Request", "Expected action=enable|disable|reset|dump.\n"
+            else:
+                body = self.summary(
+                    query.get("route"), query.get("sort", "cumulative"), int(query.get("limit", 25))
+                )
+        except ValueError as e:
+            status, body = "400 Bad Request", f"{e}\n"
+        data = body.encode("utf-8")
+        start_response(
+            status,
+            [
+                ("Content-Type", "text/plain; charset=utf-8"),
+                ("Content-Length", str(len(data))),
+                ("Cache-Control", "no-store"),
+            ],
+        )
+        return [data]
@@ -1,16 +1,117 @@
 """Request class for handling incoming requests."""
 
-from typing import Dict
-from dataclasses import dataclass
+import codecs
+import json
+from email import policy
+from email.parser import BytesParser
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+
+def get_path_info(environ: Dict) -> str:
+    """Get the request path as text. The server passes PATH_INFO as the
+    decoded bytes of the path in a latin-1 string (PEP 3333), they are
+    decoded again as UTF-8.
+    Args:
+        environ (dict): The WSGI environ.
+    Returns:
+        str: The path.
+    """
+    path = environ.get("PATH_INFO", "")
+    if path.isascii():
+        return path
+    try:
+        return path.encode("latin-1").decode("utf-8")
+    except UnicodeError:
+        return path
+
+
+class MultiDict(dict):
+    """A dict keeping every value of the repeated keys.
+
+    The dict interface returns the first value of a key, `getlist` returns
+    all of them.
+    """
+
+    __slots__ = ("lists",)
+
+    def __init__(self, items: Iterable[Tuple[str, Any]] = ()):
+        super().__init__()
+        self.lists = {}
+        for key, value in items:
+            values = self.lists.get(key)
+            if values is None:
+                self.lists[key] = [value]
+                dict.__setitem__(self, key, value)
+            else:
+                values.append(value)
+
+    def getlist(self, key: str) -> List[Any]:
+        """Get all the values of a key.
+        Args:
+            key (str): The key.
+        Returns:
+            list: The values, empty if the key is missing.
+        """
+        return list(self.lists.get(key, ()))
+
+
+class Headers(dict):
+    """The request headers, looked up without regard to the case, "-" or "_".
+
+    The keys are stored like in the WSGI environ without the HTTP_ prefix,
+    e.g. "ACCEPT_ENCODING", and `headers.get("Accept-Encoding")` finds it.
+    """
+
+    __slots__ = ()
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        """Normalize a header name to its key."""
+        return name.upper().replace("-", "_")
+
+    def __getitem__(self, name: str) -> str:
+        return dict.__getitem__(self, self.normalize(name))
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and dict.__contains__(self, self.normalize(name))
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return dict.get(self, self.normalize(name), default)
 
 
-@dataclass
 class Request:
-    """A class representing a request."""
+    """A class representing a request.
+
+    The query string, the headers, the body, the form and the cookies are
+    only parsed when a handler reads them, then they are cached.
+    """
 
-    query: Dict[str, str]
-    body: bytes
-    headers: Dict[str, str]
+    __slots__ = (
+        "environ",
+        "path_params",
+        "_query",
+        "_headers",
+        "_body",
+        "_json",
+        "_form",
+        "_cookies",
+    )
+
+    def __init__(self, environ: Dict, path_params: Optional[Dict[str, Any]] = None):
+        """Initialize the request.
+        Args:
+            environ (dict): The WSGI environ.
+            path_params (dict, optional): The parameters captured from the path.
+        """
+        self.environ = environ
+        self.path_params = path_params if path_params is not None else {}
+        self._query = None
+        self._headers = None
+        self._body = None
+        self._json = None
+        self._form = None
+        self._cookies = None
 
     @classmethod
     def from_environ(cls, environ: Dict):
@@ -20,18 +121,137 @@ class Request:
         Returns:
             Request: The request object.
         """
-        query = {}
-        if environ["QUERY_STRING"]:
-            qs = environ["QUERY_STRING"]
-            query = (
-                dict(entry.split("=") for entry in qs.split("&"))
-                if qs.count("=") > 0
-                else {qs: None}
+        return cls(environ)
+
+    @property
+    def method(self) -> str:
+        """The HTTP method."""
+        return self.environ["REQUEST_METHOD"]
+
+    @property
+    def path(self) -> str:
+        """The path, relative to the application."""
+        return get_path_info(self.environ)
+
+    @property
+    def query(self) -> MultiDict:
+        """The percent-decoded query string parameters."""
+        if self._query is None:
+            self._query = MultiDict(
+                parse_qsl(self.environ.get("QUERY_STRING", ""), keep_blank_values=True)
             )
-        body = environ["wsgi.input"].read()
-        headers = {
-            k.replace("HTTP_", ""): v
-            for k, v in environ.items()
-            if k.startswith("HTTP_")
-        }
-        return cls(query, body, headers)
+        return self._query
+
+    @property
+    def headers(self) -> Headers:
+        """The request headers."""
+        if self._headers is None:
+            headers = Headers()
+            for key, value in self.environ.items():
+                if key.startswith("HTTP_"):
+                    headers[key[5:]] = value
+            for key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                if self.environ.get(key):
+                    headers[key] = self.environ[key]
+            self._headers = headers
+        return self._headers
+
+    @property
+    def content_type(self) -> str:
+        """The media type of the body, without its parameters."""
+        return self.environ.get("CONTENT_TYPE", "").partition(";")[0].strip().lower()
+
+    @property
+    def charset(self) -> str:
+        """The charset parameter of the Content-Type, UTF-8 when it is missing
+        or unknown."""
+        for param in self.environ.get("CONTENT_TYPE", "").split(";")[1:]:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "charset":
+                try:
+                    return codecs.lookup(value.strip().strip('"')).name
+                except LookupError:
+                    break
+        return "utf-8"
+
+    @property
+    def body(self) -> bytes:
+        """The request body, read from wsgi.input on the first access."""
+        if self._body is None:
+            stream = self.environ["wsgi.input"]
+            try:
+                length = int(self.environ.get("CONTENT_LENGTH") or -1)
+            except ValueError:
+                length = -1
+            self._body = stream.read(length) if length >= 0 else stream.read()
+        return self._body
+
+    def json(self) -> Any:
+        """Decode the body as JSON.
+        Returns:
+            Any: The decoded value, None for an empty body.
+        Raises:
+            ValueError: If the body is not valid JSON.
+        """
+        if self._json is None:
+            body = self.body
+            self._json = (json.loads(body),) if body else (None,)
+        return self._json[0]
+
+    @property
+    def form(self) -> MultiDict:
+        """The fields of an urlencoded or multipart form body. The files of a
+        multipart form are bytes, the other fields are strings.
+        """
+        if self._form is None:
+            content_type = self.content_type
+            if content_type == "application/x-www-form-urlencoded":
+                # The raw and the percent-encoded bytes are in the request charset
+                charset = self.charset
+                self._form = MultiDict(
+                    parse_qsl(
+                        self.body.decode(charset, "replace"),
+                        keep_blank_values=True,
+                        encoding=charset,
+                        errors="replace",
+                    )
+                )
+            elif content_type == "multipart/form-data":
+                self._form = MultiDict(self.parse_multipart())
+            else:
+                self._form = MultiDict()
+        return self._form
+
+    def parse_multipart(self) -> List[Tuple[str, Any]]:
+        """Parse a multipart/form-data body.
+        Returns:
+            list: The field names and values.
+        """
+        header = f"Content-Type: {self.environ['CONTENT_TYPE']}\r\n\r\n".encode("latin-1")
+        message = BytesParser(policy=policy.HTTP).parsebytes(header + self.body)
+        if not message.is_multipart():
+            return []
+        fields = []
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name is None:
+                continue
+            payload = part.get_payload(decode=True) or b""
+            if part.get_filename() is None:
+                payload = payload.decode(part.get_content_charset() or "utf-8", "replace")
+            fields.append((name, payload))
+        return fields
+
+    @property
+    def cookies(self) -> Dict[str, str]:
+        """The cookies sent by the client."""
+        if self._cookies is None:
+            cookies = {}
+            for item in self.environ.get("HTTP_COOKIE", "").split(";"):
+                name, separator, value = item.strip().partition("=")
+                if separator and name and name not in cookies:
+                    if len(value) > 1 and value[0] == value[-1] == '"':
+                        value = value[1:-1]
+                    cookies[name] = value
+            self._cookies = cookies
+        return self._cookies
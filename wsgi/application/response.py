@@ -1,8 +1,34 @@
 """Response classes for the application."""
 
-import json
+from typing import Any, Callable, Iterable, List, Optional, Tuple
 
-from typing import List, Tuple, Optional, Any
+from .json_backend import get_json_backend
+
+STREAM_CHUNK_SIZE = 16384
+
+json_dumps = get_json_backend("auto")
+
+
+def set_json_backend(backend="auto"):
+    """Set the default encoder of the JSON responses, used by the
+    applications without a json_backend of their own.
+    Args:
+        backend (str | callable): "auto", "stdlib", "orjson" or a function
+            encoding a value to bytes.
+    """
+    global json_dumps
+    json_dumps = get_json_backend(backend)
+
+
+def encode_body(body):
+    """Encode a text body, an iterable of strings is encoded while it is
+    streamed, e.g. a template rendered with Template.generate.
+    """
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if isinstance(body, (bytes, bytearray)):
+        return body
+    return (chunk.encode("utf-8") for chunk in body)
 
 
 class BaseResponse:
@@ -23,10 +49,15 @@ class BaseResponse:
 
     def add_content_type_and_content_length(self):
         """Add the Content-Type and Content-Length headers."""
-        header_names = {name for name, value in self.headers}
+        # Most responses are built without headers, skip the lookup set
+        header_names = {name for name, value in self.headers} if self.headers else ()
         if not "Content-Type" in header_names:
             self.headers.append(("Content-Type", self.content_type))
-        if self.body and not "Content-Length" in header_names:
+        if (
+            isinstance(self.body, (bytes, bytearray))
+            and self.body
+            and not "Content-Length" in header_names
+        ):
             self.headers.append(("Content-Length", str(len(self.body))))
 
     @classmethod
@@ -34,6 +65,18 @@ class BaseResponse:
         """Convert the body to bytes."""
         return body
 
+    def encode(self):
+        """Encode the body, for the responses encoding it lazily."""
+
+    def iter_body(self):
+        """Get the body as the iterable returned to the WSGI server.
+        Returns:
+            iterable: The body chunks.
+        """
+        if isinstance(self.body, (bytes, bytearray)):
+            return [self.body]
+        return self.body
+
 
 class PlainTextResponse(BaseResponse):
     """A plain text response class for the application."""
@@ -50,7 +93,7 @@ class PlainTextResponse(BaseResponse):
 
     @classmethod
     def body_conversion(cls, body):
-        return body.encode("utf-8")
+        return encode_body(body)
 
 
 class HTMLResponse(BaseResponse):
@@ -68,11 +111,17 @@ class HTMLResponse(BaseResponse):
 
     @classmethod
     def body_conversion(cls, body):
-        return body.encode("utf-8")
+        return encode_body(body)
 
 
 class JSONResponse(BaseResponse):
-    """A JSON response class for the application."""
+    """A JSON response class for the application.
+
+    The value is encoded when the body is first read, with `dumps`: the
+    encoder of the application answering the request, which sets it once
+    the handler returns, or the default encoder. Content-Length is added to
+    the headers then.
+    """
 
     content_type = "application/json"
 
@@ -81,12 +130,103 @@ class JSONResponse(BaseResponse):
         status: str = "200 OK",
         headers: Optional[List[Tuple[str, str]]] = None,
         body: Optional[Any] = None,
+        dumps: Optional[Callable[[Any], bytes]] = None,
     ):
-        super().__init__(status, headers, body, self.content_type)
+        self.value = body
+        self.dumps = dumps
+        # Only Content-Type is added until the value is encoded
+        self.encoded = True
+        super().__init__(status, headers, None, self.content_type)
+        self.encoded = body is None
 
-    @classmethod
-    def body_conversion(cls, body):
-        return json.dumps(body).encode("utf-8")
+    @property
+    def body(self):
+        if not self.encoded:
+            self.encode()
+        return self._body
+
+    @body.setter
+    def body(self, body):
+        self._body = body
+
+    def encode(self):
+        """Encode the value, once."""
+        if self.encoded:
+            return
+        self.encoded = True
+        self._body = (self.dumps or json_dumps)(self.value)
+        self.add_content_type_and_content_length()
+
+
+class StreamingJSONResponse(BaseResponse):
+    """A JSON response encoding the items of an iterable while it is sent,
+    so a large list is never held in memory as one document.
+
+    In "array" mode the body is a JSON array, in "ndjson" mode it is one JSON
+    document per line (newline delimited JSON).
+    """
+
+    def __init__(
+        self,
+        items: Iterable[Any],
+        status: str = "200 OK",
+        headers: Optional[List[Tuple[str, str]]] = None,
+        mode: str = "array",
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        dumps: Optional[Callable[[Any], bytes]] = None,
+    ):
+        """Initialize the response.
+        Args:
+            items (iterable): The items, e.g. a generator reading rows.
+            status (str, optional): The status. Defaults to "200 OK".
+            headers (list, optional): The headers. Defaults to None.
+            mode (str, optional): "array" or "ndjson". Defaults to "array".
+            chunk_size (int, optional): Encoded items are sent in chunks of this size. Defaults to 16 KiB.
+            dumps (callable, optional): The encoder, defaults to the one of the application.
+        """
+        if mode not in ("array", "ndjson"):
+            raise ValueError(f"Unknown streaming JSON mode {mode!r}")
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.dumps = dumps
+        content_type = "application/json" if mode == "array" else "application/x-ndjson"
+        super().__init__(status, headers, None, content_type)
+        self.body = self.generate(items)
+
+    def generate(self, items: Iterable[Any]):
+        """Encode the items.
+        Args:
+            items (iterable): The items.
+        Yields:
+            bytes: The chunks of the document.
+        """
+        dumps = self.dumps or json_dumps
+        array = self.mode == "array"
+        separator = b"," if array else b"\n"
+        chunks = [b"["] if array else []
+        size = 0
+        first = True
+        try:
+            for item in items:
+                if not first and array:
+                    chunks.append(separator)
+                first = False
+                data = dumps(item)
+                chunks.append(data)
+                if not array:
+                    chunks.append(separator)
+                size += len(data) + 1
+                if size >= self.chunk_size:
+                    yield b"".join(chunks)
+                    chunks, size = [], 0
+        finally:
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+        if array:
+            chunks.append(b"]")
+        if chunks:
+            yield b"".join(chunks)
 
 
 class NotFoundResponse(PlainTextResponse):
@@ -96,8 +236,38 @@ class NotFoundResponse(PlainTextResponse):
         super().__init__(status="404 NOT FOUND", body="Not Found")
 
 
+class MethodNotAllowedResponse(PlainTextResponse):
+    """A method not allowed response class for the application."""
+
+    def __init__(self, allowed_methods):
+        super().__init__(
+            status="405 METHOD NOT ALLOWED",
+            headers=[("Allow", ", ".join(allowed_methods))],
+            body="Method Not Allowed",
+        )
+
+
 class HTTPErrorResponse(PlainTextResponse):
     """A not found response class for the application."""
 
     def __init__(self, status: str, body: str):
         super().__init__(status=status, body=body)
+
+
+def to_response(value, dumps: Optional[Callable[[Any], bytes]] = None) -> BaseResponse:
+    """Convert the value returned by a handler to a response.
+    Args:
+        value: The handler result, a response, a dict (JSON) or a string.
+        dumps (callable, optional): The JSON encoder of the application, given
+            to the JSON responses without one. Defaults to the default encoder.
+    Returns:
+        BaseResponse: The response.
+    """
+    if isinstance(value, BaseResponse):
+        if dumps is not None and isinstance(value, (JSONResponse, StreamingJSONResponse)):
+            if value.dumps is None:
+                value.dumps = dumps
+        return value
+    if isinstance(value, dict):
+        return JSONResponse(body=value, dumps=dumps)
+    return PlainTextResponse(body=value)
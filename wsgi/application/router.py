@@ -1,6 +1,8 @@
 """A module for the router class."""
-from typing import Callable
-from dataclasses import dataclass
+import math
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+from dataclasses import dataclass, field
 
 
 @dataclass(frozen=True, eq=True)
@@ -20,11 +22,137 @@ class Routes:
         return not self.__eq__(other)
 
 
+def convert_str(value: str) -> str:
+    """Convert a str path parameter, it must not be empty."""
+    if not value:
+        raise ValueError("empty path segment")
+    return value
+
+
+def convert_int(value: str) -> int:
+    """Convert an int path parameter, only ASCII digits are accepted."""
+    if not (value.isascii() and value.isdigit()):
+        raise ValueError(f"invalid int: {value!r}")
+    return int(value)
+
+
+def convert_float(value: str) -> float:
+    """Convert a float path parameter, any ASCII literal of float() is
+    accepted (signs, exponents) except the infinities and NaN."""
+    if not value.isascii() or value != value.strip():
+        raise ValueError(f"invalid float: {value!r}")
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"invalid float: {value!r}")
+    return number
+
+
+def convert_uuid(value: str) -> uuid.UUID:
+    """Convert a uuid path parameter."""
+    return uuid.UUID(value)
+
+
+# The "path" type is the wildcard, it matches the rest of the path
+CONVERTERS = {
+    "str": convert_str,
+    "int": convert_int,
+    "float": convert_float,
+    "uuid": convert_uuid,
+    "path": str,
+}
+# The typed parameters are tried before the catch-all str parameters
+CONVERTER_PRIORITY = {"int": 0, "float": 1, "uuid": 2, "str": 3}
+
+
+@dataclass
+class RouteNode:
+    """A node of the route tree, one per path segment."""
+
+    static: Dict[str, "RouteNode"] = field(default_factory=dict)
+    params: list = field(default_factory=list)
+    wildcard: Optional[Tuple[str, Dict[str, Routes]]] = None
+    routes: Dict[str, Routes] = field(default_factory=dict)
+
+    def get_param_child(self, name: str, converter: str) -> "RouteNode":
+        """Get or create the child for a path parameter.
+        Args:
+            name (str): The parameter name.
+            converter (str): The parameter type.
+        Returns:
+            RouteNode: The child node.
+        """
+        for param_name, param_type, _, child in self.params:
+            if param_type == converter:
+                if param_name != name:
+                    raise ValueError(
+                        f"Conflicting path parameters {{{param_name}:{param_type}}}"
+                        f" and {{{name}:{converter}}}"
+                    )
+                return child
+        child = RouteNode()
+        self.params.append((name, converter, CONVERTERS[converter], child))
+        return child
+
+    def freeze(self):
+        """Freeze the node and its children for the lookups."""
+        self.params = tuple(
+            sorted(self.params, key=lambda param: CONVERTER_PRIORITY[param[1]])
+        )
+        for child in self.static.values():
+            child.freeze()
+        for *_, child in self.params:
+            child.freeze()
+
+
+@dataclass
+class RouteMatch:
+    """The result of a route lookup."""
+
+    handler: Optional[Callable] = None
+    route: Optional[Routes] = None
+    params: Dict[str, Any] = field(default_factory=dict)
+    allowed_methods: Tuple[str, ...] = ()
+
+
+def parse_segment(segment: str) -> Optional[Tuple[str, str]]:
+    """Parse a path template segment.
+    Args:
+        segment (str): The segment, e.g. "users" or "{id:int}".
+    Returns:
+        tuple: The parameter name and type, or None for a static segment.
+    """
+    if not (segment.startswith("{") and segment.endswith("}")):
+        return None
+    name, _, converter = segment[1:-1].partition(":")
+    converter = converter or "str"
+    if not name.isidentifier():
+        raise ValueError(f"Invalid path parameter name: {name!r}")
+    if converter not in CONVERTERS:
+        raise ValueError(f"Unknown path parameter type: {converter!r}")
+    return name, converter
+
+
+def normalize_path(path: str) -> str:
+    """Remove the trailing slash of a path."""
+    return path.rstrip("/") if path != "/" else path
+
+
 class Router:
-    """A class representing a router."""
+    """A class representing a router.
+
+    Routes are stored in a tree with one node per path segment. A segment is
+    static ("users"), a typed parameter ("{id:int}", "{name}" is a str) or
+    a wildcard matching the rest of the path ("{file:path}"). At each node
+    the static child is tried first, then the parameters by type and the
+    wildcard last. Once frozen, the routes without parameters are also
+    resolved with a single dict lookup.
+    """
 
     def __init__(self):
         self.routes = dict()
+        self.root = RouteNode()
+        self.static_routes = dict()
+        self.frozen = False
 
     def register(self, path: str, http_method: str, func: Callable):
         """Register a path operation.
@@ -32,9 +160,34 @@ class Router:
             path (str): The path.
             http_method (str): The HTTP method.
             func (Callable): The function to call.
+        Returns:
+            Routes: The route.
         """
+        if self.frozen:
+            raise RuntimeError("Cannot register a route on a frozen router")
+        path = normalize_path(path)
         route = Routes(path, http_method)
+        node = self.root
+        segments = path.strip("/").split("/") if path != "/" else []
+        for index, segment in enumerate(segments):
+            param = parse_segment(segment)
+            if param is None:
+                node = node.static.setdefault(segment, RouteNode())
+            elif param[1] == "path":
+                if index != len(segments) - 1:
+                    raise ValueError(f"A path parameter must be the last segment: {path}")
+                if node.wildcard is None:
+                    node.wildcard = (param[0], {})
+                elif node.wildcard[0] != param[0]:
+                    raise ValueError(f"Conflicting wildcards in {path}")
+                node.wildcard[1][http_method] = route
+                break
+            else:
+                node = node.get_param_child(*param)
+        else:
+            node.routes[http_method] = route
         self.routes[route] = func
+        return route
 
     def get(self, path: str):
         """Register a GET handler.
@@ -84,12 +237,92 @@ class Router:
 
         return decorator
 
+    def freeze(self):
+        """Freeze the router, no route can be registered after it. Called on
+        the first lookup if not done at startup.
+        """
+        if self.frozen:
+            return
+        self.root.freeze()
+        static_routes = {}
+        for route in self.routes:
+            if "{" not in route.path:
+                static_routes.setdefault(route.path, {})[route.http_method] = route
+        self.static_routes = static_routes
+        self.frozen = True
+
+    def match(self, path: str, http_method: str) -> RouteMatch:
+        """Find the path operation of a request.
+        Args:
+            path (str): The path.
+            http_method (str): The HTTP method.
+        Returns:
+            RouteMatch: The handler and the path parameters. The handler is None
+            if no route matches, allowed_methods is set if the path matches
+            with other methods.
+        """
+        if not self.frozen:
+            self.freeze()
+        path = normalize_path(path)
+        allowed = {}
+        routes = self.static_routes.get(path)
+        if routes is not None:
+            route = self.get_method_route(routes, http_method)
+            if route is not None:
+                return RouteMatch(self.routes[route], route)
+            allowed.update(routes)
+        segments = path[1:].split("/") if path != "/" else []
+        for routes, params in self.iter_matches(self.root, segments, 0, {}):
+            route = self.get_method_route(routes, http_method)
+            if route is not None:
+                return RouteMatch(self.routes[route], route, params)
+            allowed.update(routes)
+        if "GET" in allowed:
+            allowed["HEAD"] = None
+        return RouteMatch(allowed_methods=tuple(sorted(allowed)))
+
+    @staticmethod
+    def get_method_route(routes: Dict[str, Routes], http_method: str):
+        """Get the route of a method, HEAD falls back to GET."""
+        route = routes.get(http_method)
+        if route is None and http_method == "HEAD":
+            route = routes.get("GET")
+        return route
+
+    def iter_matches(self, node: RouteNode, segments: list, index: int, params: dict):
+        """Iterate over the routes matching the path segments.
+        Args:
+            node (RouteNode): The current node.
+            segments (list): The path segments.
+            index (int): The index of the current segment.
+            params (dict): The parameters captured so far.
+        Yields:
+            tuple: The routes by method and the path parameters.
+        """
+        if index == len(segments):
+            if node.routes:
+                yield node.routes, params
+            return
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            yield from self.iter_matches(child, segments, index + 1, params)
+        for name, _, converter, child in node.params:
+            try:
+                value = converter(segment)
+            except ValueError:
+                continue
+            yield from self.iter_matches(
+                child, segments, index + 1, {**params, name: value}
+            )
+        if node.wildcard is not None:
+            name, routes = node.wildcard
+            yield routes, {**params, name: "/".join(segments[index:])}
+
     def get_route_handler(self, path: str, http_method: str):
-        """Get the path operation. 
+        """Get the path operation.
         Args:
             path (str): The path.
             http_method (str): The HTTP method.
         """
-        path = path.rstrip("/") if path != "/" else path
-        route = Routes(path, http_method)
-        return self.routes.get(route)
+        return self.match(path, http_method).handler
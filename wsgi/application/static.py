@@ -0,0 +1,386 @@
+"""A module for serving static files."""
+
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from functools import partial
+from typing import Callable, Optional, Tuple
+
+from .request import get_path_info
+
+BLOCK_SIZE = 65536
+STAT_CACHE_SIZE = 1024
+STAT_CACHE_TTL = 1.0
+
+
+@dataclass
+class StaticFile:
+    """A class representing a cached static file.
+
+    The open file is shared by the cache and the responses reading it: it is
+    closed once the entry is evicted (`cached` is False) and no response
+    uses it anymore (`users` is 0).
+    """
+
+    path: str
+    file: object
+    size: int
+    mtime: float
+    content_type: str
+    last_modified: str
+    etag: str
+    checked_at: float
+    users: int = 0
+    cached: bool = False
+
+
+class FileRange:
+    """A class representing a read-only file-like view of a byte range of a
+    shared open file. Reads use `os.pread` (`os.preadv` for `readinto`) so
+    several requests can read the same file descriptor concurrently. Closing
+    the range releases its reference on the shared file."""
+
+    def __init__(self, file, offset: int, length: int, release: Optional[Callable] = None):
+        self.file = file
+        self.position = offset
+        self.end = offset + length
+        self.release = release
+
+    def fileno(self) -> int:
+        """Get the file descriptor."""
+        return self.file.fileno()
+
+    def tell(self) -> int:
+        """Get the current position in the file."""
+        return self.position
+
+    def seek(self, position: int, whence: int = os.SEEK_SET) -> int:
+        """Move the current position, only absolute positions are supported."""
+        self.position = position
+        return self.position
+
+    def read(self, size: int = -1) -> bytes:
+        """Read at most size bytes up to the end of the range."""
+        remaining = max(self.end - self.position, 0)
+        if size < 0 or size > remaining:
+            size = remaining
+        data = os.pread(self.fileno(), size, self.position)
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer) -> int:
+        """Read up to the end of the range into a writable buffer.
+        Args:
+            buffer: The buffer, e.g. a bytearray or a memoryview.
+        Returns:
+            int: The number of bytes read, 0 at the end of the range.
+        """
+        view = memoryview(buffer).cast("B")
+        remaining = max(self.end - self.position, 0)
+        if len(view) > remaining:
+            view = view[:remaining]
+        if not view:
+            return 0
+        if hasattr(os, "preadv"):
+            count = os.preadv(self.fileno(), [view], self.position)
+        else:
+            data = os.pread(self.fileno(), len(view), self.position)
+            count = len(data)
+            view[:count] = data
+        self.position += count
+        return count
+
+    def readable(self) -> bool:
+        """The range can be read."""
+        return True
+
+    def __iter__(self):
+        while True:
+            data = self.read(BLOCK_SIZE)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        """Release the shared file, the cache closes it once it is evicted."""
+        release, self.release = self.release, None
+        if release is not None:
+            release()
+
+
+class StaticFiles:
+    """A WSGI application serving the files of a directory.
+
+    The stat result and an open file of the hot files are kept in a bounded
+    LRU cache and revalidated at most once per `cache_ttl` seconds, an evicted
+    file is closed when the last response reading it is done. Files are
+    returned through `wsgi.file_wrapper` so the server can send them with
+    `os.sendfile`. Conditional requests (`If-None-Match`, `If-Modified-Since`)
+    and single byte ranges (`Range`, `If-Range`) are supported.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        index: str = "index.html",
+        cache_size: int = STAT_CACHE_SIZE,
+        cache_ttl: float = STAT_CACHE_TTL,
+        max_age: Optional[int] = None,
+    ):
+        """Initialize the static files application.
+        Args:
+            directory (str): The directory to serve.
+            index (str, optional): The file served for a directory. Defaults to "index.html".
+            cache_size (int, optional): The number of cached files. Defaults to 1024.
+            cache_ttl (float, optional): Seconds between two stats of a cached file. Defaults to 1.
+            max_age (int, optional): The Cache-Control max-age sent. Defaults to None.
+        """
+        self.directory = os.path.realpath(directory)
+        self.index = index
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.max_age = max_age
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        """Serve the file at PATH_INFO.
+        Args:
+            environ (dict): The WSGI environment.
+            start_response (callable): The start response function.
+        Returns:
+            iterable: The response body.
+        """
+        if environ["REQUEST_METHOD"] not in ("GET", "HEAD"):
+            return self.error(start_response, "405 Method Not Allowed", [("Allow", "GET, HEAD")])
+        static_file = self.get_file(get_path_info(environ) or "/")
+        if static_file is None:
+            return self.error(start_response, "404 Not Found")
+        # get_file took a reference on the file for this response
+        release = partial(self.release, static_file)
+        try:
+            return self.respond(environ, start_response, static_file, release)
+        except BaseException:
+            release()
+            raise
+
+    def respond(self, environ, start_response, static_file: StaticFile, release: Callable):
+        """Answer with a file, the body releases the file when it is closed.
+        Args:
+            environ (dict): The WSGI environment.
+            start_response (callable): The start response function.
+            static_file (StaticFile): The file.
+            release (callable): Release the reference on the file.
+        Returns:
+            iterable: The response body.
+        """
+        headers = [
+            ("Content-Type", static_file.content_type),
+            ("Last-Modified", static_file.last_modified),
+            ("ETag", static_file.etag),
+            ("Accept-Ranges", "bytes"),
+        ]
+        if self.max_age is not None:
+            headers.append(("Cache-Control", f"public, max-age={self.max_age}"))
+        if self.not_modified(environ, static_file):
+            start_response("304 Not Modified", headers)
+            release()
+            return []
+        status = "200 OK"
+        offset, length = 0, static_file.size
+        byte_range = self.get_range(environ, static_file)
+        if byte_range == ():
+            headers = [("Content-Range", f"bytes */{static_file.size}")]
+            body = self.error(start_response, "416 Range Not Satisfiable", headers)
+            release()
+            return body
+        if byte_range is not None:
+            status = "206 Partial Content"
+            offset, length = byte_range
+            headers.append(
+                ("Content-Range", f"bytes {offset}-{offset + length - 1}/{static_file.size}")
+            )
+        headers.append(("Content-Length", str(length)))
+        start_response(status, headers)
+        body = FileRange(static_file.file, offset, length, release)
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper is not None:
+            return file_wrapper(body, BLOCK_SIZE)
+        return body
+
+    def error(self, start_response, status: str, headers: list = None):
+        """Answer with an error status."""
+        body = status.encode("utf-8")
+        start_response(
+            status,
+            [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))]
+            + (headers or []),
+        )
+        return [body]
+
+    def resolve(self, path: str) -> Optional[str]:
+        """Get the file system path of a URL path inside the directory.
+        Args:
+            path (str): The URL path.
+        Returns:
+            str: The file path, None if it escapes the directory or is not a valid path.
+        """
+        if "\x00" in path:
+            # A decoded %00, the file system calls reject it
+            return None
+        file_path = os.path.realpath(os.path.join(self.directory, path.lstrip("/")))
+        if file_path != self.directory and not file_path.startswith(self.directory + os.sep):
+            return None
+        if os.path.isdir(file_path):
+            file_path = os.path.join(file_path, self.index)
+        return file_path
+
+    def get_file(self, path: str) -> Optional[StaticFile]:
+        """Get a file from the cache, (re)loading it when its stat is stale.
+        The caller gets a reference on the file and must release it.
+        Args:
+            path (str): The URL path.
+        Returns:
+            StaticFile: The file, None if it does not exist.
+        """
+        now = time.monotonic()
+        with self.lock:
+            static_file = self.cache.get(path)
+            if static_file is not None and now - static_file.checked_at < self.cache_ttl:
+                self.cache.move_to_end(path)
+                static_file.users += 1
+                return static_file
+        file_path = self.resolve(path)
+        if file_path is None:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            stat = None
+        if stat is None or not os.path.isfile(file_path):
+            with self.lock:
+                evicted = self.cache.pop(path, None)
+                if evicted is not None:
+                    self.uncache(evicted)
+            return None
+        if (
+            static_file is not None
+            and static_file.path == file_path
+            and static_file.mtime == stat.st_mtime
+            and static_file.size == stat.st_size
+        ):
+            static_file.checked_at = now
+        else:
+            static_file = self.load_file(file_path, stat, now)
+            if static_file is None:
+                return None
+        with self.lock:
+            if static_file.file.closed:
+                # Evicted and closed by another thread since it was read
+                static_file = None
+            else:
+                current = self.cache.get(path)
+                if current is not static_file:
+                    if current is not None:
+                        self.uncache(current)
+                    self.cache[path] = static_file
+                    static_file.cached = True
+                static_file.users += 1
+                self.cache.move_to_end(path)
+                while len(self.cache) > self.cache_size:
+                    _, evicted = self.cache.popitem(last=False)
+                    self.uncache(evicted)
+        if static_file is None:
+            return self.get_file(path)
+        return static_file
+
+    def uncache(self, static_file: StaticFile):
+        """Mark a file evicted from the cache, the lock must be held."""
+        static_file.cached = False
+        if static_file.users == 0:
+            static_file.file.close()
+
+    def release(self, static_file: StaticFile):
+        """Release the reference of a response on a file, the file is closed
+        when it is evicted and no response uses it anymore."""
+        with self.lock:
+            static_file.users -= 1
+            if static_file.users == 0 and not static_file.cached:
+                static_file.file.close()
+
+    def load_file(self, file_path: str, stat: os.stat_result, now: float) -> Optional[StaticFile]:
+        """Open a file and build its cache entry."""
+        try:
+            file = open(file_path, "rb")
+        except OSError:
+            return None
+        content_type, _ = mimetypes.guess_type(file_path)
+        if content_type is None:
+            content_type = "application/octet-stream"
+        elif content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+        return StaticFile(
+            path=file_path,
+            file=file,
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            content_type=content_type,
+            last_modified=formatdate(stat.st_mtime, usegmt=True),
+            etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            checked_at=now,
+        )
+
+    def not_modified(self, environ: dict, static_file: StaticFile) -> bool:
+        """Check the conditional request headers."""
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+        if if_none_match is not None:
+            etags = [etag.strip() for etag in if_none_match.split(",")]
+            return "*" in etags or static_file.etag in etags
+        if_modified_since = environ.get("HTTP_IF_MODIFIED_SINCE")
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(static_file.mtime) <= since
+        return False
+
+    def get_range(self, environ: dict, static_file: StaticFile) -> Optional[Tuple[int, int]]:
+        """Parse a single byte range request.
+        Returns:
+            tuple: The offset and length, None to send the whole file and an
+                empty tuple when the range can not be satisfied.
+        """
+        range_header = environ.get("HTTP_RANGE")
+        if range_header is None or not range_header.startswith("bytes="):
+            return None
+        if_range = environ.get("HTTP_IF_RANGE")
+        if if_range is not None and if_range not in (static_file.etag, static_file.last_modified):
+            return None
+        ranges = range_header[len("bytes=") :].split(",")
+        if len(ranges) != 1:
+            # Multiple ranges are answered with the whole file
+            return None
+        start, separator, end = ranges[0].strip().partition("-")
+        size = static_file.size
+        try:
+            if not separator:
+                return None
+            if not start:
+                suffix = int(end)
+                if suffix <= 0:
+                    return ()
+                offset = max(size - suffix, 0)
+                return offset, size - offset
+            offset = int(start)
+            last = int(end) if end else size - 1
+        except ValueError:
+            return None
+        if offset >= size or last < offset:
+            return ()
+        last = min(last, size - 1)
+        return offset, last - offset + 1
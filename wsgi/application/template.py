@@ -2,26 +2,74 @@
 
 import os
 import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from .template_compiler import TemplateCompiler
+
+TEMPLATE_CACHE_SIZE = 256
+TEMPLATE_CHECK_INTERVAL = 1.0
+TEMPLATE_CHUNK_SIZE = 8192
+AUTOESCAPE_EXTENSIONS = (".html", ".htm", ".xml")
+
+
+def get_template_dir() -> str:
+    """Get the template directory of the application."""
+    app_path = sys.path[0]
+    if not os.path.exists(app_path):
+        return "templates"
+    if os.path.exists(app_path + "/templates"):
+        return app_path + "/templates"
+    return "templates"
 
 
 class Template:
-    """A class representing a template."""
+    """A class representing a template.
+
+    The template is compiled once to Python generator functions when it is
+    loaded (see template_compiler for the syntax). `render` returns the whole
+    page, `generate` yields it in chunks to stream large pages.
+    """
 
-    def __init__(self, template: str):
+    def __init__(
+        self,
+        template: str,
+        template_dir: Optional[str] = None,
+        environment: Optional["TemplateEnvironment"] = None,
+        autoescape: Optional[bool] = None,
+        source: Optional[str] = None,
+    ):
+        """Initialize the template.
+        Args:
+            template (str): The template name, relative to the template directory.
+            template_dir (str, optional): The template directory. Defaults to the templates of the application.
+            environment (TemplateEnvironment, optional): Loads the included and extended templates.
+            autoescape (bool, optional): Escape the expressions for HTML. Defaults to True for .html, .htm and .xml files.
+            source (str, optional): The template source, instead of reading the file.
+        """
         self.template = template
-        self.template_dir = self._get_template_dir()
-        self.template_body = None
+        self.template_dir = (
+            template_dir if template_dir is not None else self._get_template_dir()
+        )
+        self.environment = environment
+        self.autoescape = (
+            autoescape if autoescape is not None else template.endswith(AUTOESCAPE_EXTENSIONS)
+        )
+        self.template_body = source
         self.template_path = os.path.join(self.template_dir, self.template)
-        self._load_template()
+        self.root = None
+        self.blocks = {}
+        self.parent = None
+        if source is None:
+            self._load_template()
+        else:
+            self._compile()
 
     def _get_template_dir(self) -> str:
         """Get the template directory."""
-        app_path = sys.path[0]
-        if not os.path.exists(app_path):
-            return "templates"
-        if os.path.exists(app_path + "/templates"):
-            return app_path + "/templates"
-        return "templates"
+        return get_template_dir()
 
     def _load_template(self) -> None:
         """Load the template"""
@@ -29,19 +77,200 @@ class Template:
             return None
         with open(self.template_path, "r", encoding="UTF-8") as f:
             self.template_body = f.read()
+        self._compile()
 
     def _verify_template(self) -> bool:
-        """Verify the template"""
-        return os.path.exists(self.template_path) and os.path.isfile(self.template_path)
+        """Verify the template, it must be a file in the template directory."""
+        template_dir = os.path.abspath(self.template_dir)
+        template_path = os.path.abspath(self.template_path)
+        if os.path.commonpath([template_dir, template_path]) != template_dir:
+            return False
+        return os.path.isfile(self.template_path)
+
+    def _compile(self) -> None:
+        """Compile the template body."""
+        compiled = TemplateCompiler(
+            self.template_body, self.template, self.autoescape
+        ).compile()
+        self.root = compiled["root"]
+        self.blocks = compiled["blocks"]
+        self.parent = compiled["parent"]
+
+    def get_environment(self) -> "TemplateEnvironment":
+        """Get the environment loading the included and extended templates."""
+        if self.environment is None:
+            self.environment = TemplateEnvironment(self.template_dir)
+        return self.environment
 
-    def render(self, *args,**kwargs) -> str:
+    def generate_context(self, context: dict, blocks: Optional[dict] = None):
+        """Render the template with a context.
+        Args:
+            context (dict): The variables.
+            blocks (dict, optional): The blocks overriding the blocks of the template.
+        Returns:
+            iterator: The text chunks.
+        """
+        if self.root is None:
+            return iter(())
+        blocks = {**self.blocks, **blocks} if blocks else self.blocks
+        environment = self.get_environment()
+        if self.parent is not None:
+            parent = environment.get_template(self.parent)
+            return parent.generate_context(context, blocks)
+        return self.root(context, blocks, environment)
+
+    def generate(self, *args, **kwargs):
+        """Render the template in chunks.
+        Args:
+            *args: A mapping of the variables.
+            **kwargs: The variables.
+        Yields:
+            str: The chunks of about TEMPLATE_CHUNK_SIZE characters.
+        """
+        chunks, size = [], 0
+        for chunk in self.generate_context(dict(*args, **kwargs)):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= TEMPLATE_CHUNK_SIZE:
+                yield "".join(chunks)
+                chunks, size = [], 0
+        if chunks:
+            yield "".join(chunks)
+
+    def render(self, *args, **kwargs) -> str:
         """Render the template.
         Args:
-            *args: The arguments.
-            **kwargs: The keyword arguments.
+            *args: A mapping of the variables.
+            **kwargs: The variables.
         Returns:
             str: The rendered template.
         """
-        if self.template_body is None:
-            return ""
-        return self.template_body.format(*args, **kwargs)
+        return "".join(self.generate_context(dict(*args, **kwargs)))
+
+
+class TemplateEnvironment:
+    """A template loader caching the loaded templates.
+
+    The templates are kept in a bounded LRU cache shared by all the threads.
+    A cached template is revalidated with a stat of its file at most once per
+    `check_interval` seconds and reloaded when its mtime changed. With
+    `auto_reload` disabled the templates are never checked again, which is
+    the production mode. Calling the environment with a template name returns
+    the template, like the `Template` class it replaces.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        cache_size: int = TEMPLATE_CACHE_SIZE,
+        auto_reload: bool = True,
+        check_interval: float = TEMPLATE_CHECK_INTERVAL,
+        preload: bool = False,
+        autoescape: Optional[bool] = None,
+    ):
+        """Initialize the environment.
+        Args:
+            directory (str, optional): The template directory. Defaults to the templates of the application.
+            cache_size (int, optional): The number of cached templates. Defaults to 256.
+            auto_reload (bool, optional): Reload the modified templates. Defaults to True.
+            check_interval (float, optional): Seconds between two checks of a template. Defaults to 1.0.
+            preload (bool, optional): Load all the templates of the directory now. Defaults to False.
+            autoescape (bool, optional): Escape the expressions for HTML. Defaults to True for .html, .htm and .xml files.
+        """
+        self.directory = directory if directory is not None else get_template_dir()
+        self.cache_size = cache_size
+        self.auto_reload = auto_reload
+        self.check_interval = check_interval
+        self.autoescape = autoescape
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        if preload:
+            self.preload()
+
+    def __call__(self, name: str) -> Template:
+        """Get a template.
+        Args:
+            name (str): The template name, relative to the template directory.
+        Returns:
+            Template: The template, its body is None if it does not exist.
+        """
+        return self.get_template(name)
+
+    def get_template(self, name: str) -> Template:
+        """Get a template from the cache, loading it if needed.
+        Args:
+            name (str): The template name, relative to the template directory.
+        Returns:
+            Template: The template, its body is None if it does not exist.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.cache.get(name)
+            if entry is not None:
+                self.cache.move_to_end(name)
+        if entry is not None:
+            template, mtime, checked_at = entry
+            if not self.auto_reload or now - checked_at < self.check_interval:
+                return template
+            current_mtime = self.get_mtime(template.template_path)
+            if current_mtime == mtime:
+                with self.lock:
+                    if name in self.cache:
+                        self.cache[name] = (template, mtime, now)
+                return template
+            if current_mtime is None:
+                # The file was deleted, the cache follows the file system
+                with self.lock:
+                    self.cache.pop(name, None)
+        return self.load(name, now)
+
+    def load(self, name: str, now: Optional[float] = None) -> Template:
+        """Load a template and store it in the cache, a missing template is
+        not cached so requests for random names can not evict the others.
+        Args:
+            name (str): The template name.
+            now (float, optional): The monotonic time of the load.
+        Returns:
+            Template: The template.
+        """
+        # The mtime is read first, a file modified while it is read is reloaded
+        mtime = self.get_mtime(os.path.join(self.directory, name))
+        template = Template(name, self.directory, self, self.autoescape)
+        if template.root is None:
+            return template
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            self.cache[name] = (template, mtime, now)
+            self.cache.move_to_end(name)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return template
+
+    def preload(self) -> int:
+        """Load all the templates of the directory, up to the cache size.
+        Returns:
+            int: The number of loaded templates.
+        """
+        count = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in sorted(files):
+                if count >= self.cache_size:
+                    return count
+                name = os.path.relpath(os.path.join(root, filename), self.directory)
+                self.load(name)
+                count += 1
+        return count
+
+    def clear(self):
+        """Empty the cache."""
+        with self.lock:
+            self.cache.clear()
+
+    @staticmethod
+    def get_mtime(path: str) -> Optional[int]:
+        """Get the modification time of a file, None if it does not exist."""
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
@@ -0,0 +1,396 @@
+"""A compiler turning templates into Python generator functions.
+
+The syntax is a small subset of Jinja:
+
+    {{ user.name|upper }}            an expression and its filters
+    {% if x %}...{% elif y %}...{% else %}...{% endif %}
+    {% for item in items %}...{% endfor %}
+    {% set total = price * count %}
+    {% include "header.html" %}
+    {% extends "base.html" %} and {% block content %}...{% endblock %}
+    {# a comment #}
+
+A "-" next to a delimiter ({%- or -%}) strips the whitespace before or after
+the tag. The expressions are Python expressions: the names are looked up in
+the context (missing names are empty strings) and "a.b" reads the attribute
+or the key b of a. A filter has the precedence of the Python "|" operator,
+use parentheses to combine it with arithmetic: "(items|length) * 2".
+
+A template is compiled once into a Python module defining a `root` generator
+function and one generator function per block, called with the context and
+the variables of the code around the block. They yield the text chunks,
+the output of the expressions being HTML escaped when autoescape is enabled.
+"""
+
+import ast
+import builtins
+import html
+import re
+
+DELIMITERS = re.compile(r"(\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\})", re.DOTALL)
+NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+UNDEFINED = ""
+
+
+class TemplateSyntaxError(Exception):
+    """Exception raised for an invalid template."""
+
+    def __init__(self, message: str, name: str = "<string>", lineno: int = 1):
+        super().__init__(f"{message} ({name}, line {lineno})")
+        self.name = name
+        self.lineno = lineno
+
+
+class Markup(str):
+    """A string that is not escaped again."""
+
+
+def escape(value) -> str:
+    """Escape a value for HTML, markup is kept as is."""
+    if isinstance(value, Markup):
+        return value
+    return html.escape(str(value))
+
+
+def getattr_or_item(obj, name: str):
+    """Get an item of a dict, or an attribute of an object, or its item."""
+    if type(obj) is dict and name in obj:
+        return obj[name]
+    try:
+        return getattr(obj, name)
+    except AttributeError:
+        try:
+            return obj[name]
+        except (TypeError, LookupError):
+            return UNDEFINED
+
+
+def filter_default(value, default="", boolean=False):
+    """Replace an undefined (or a false value if boolean) by a default."""
+    if value is UNDEFINED or value is None or (boolean and not value):
+        return default
+    return value
+
+
+def filter_truncate(value, length=255, end="..."):
+    """Truncate a string."""
+    value = str(value)
+    return value if len(value) <= length else value[: length - len(end)] + end
+
+
+FILTERS = {
+    "upper": lambda value: str(value).upper(),
+    "lower": lambda value: str(value).lower(),
+    "title": lambda value: str(value).title(),
+    "capitalize": lambda value: str(value).capitalize(),
+    "trim": lambda value: str(value).strip(),
+    "length": len,
+    "first": lambda value: next(iter(value), UNDEFINED),
+    "last": lambda value: value[-1] if value else UNDEFINED,
+    "join": lambda value, separator="": str(separator).join(map(str, value)),
+    "replace": lambda value, old, new: str(value).replace(old, new),
+    "int": lambda value, default=0: int(value) if str(value).strip().lstrip("-").isdigit() else default,
+    "float": float,
+    "string": str,
+    "default": filter_default,
+    "truncate": filter_truncate,
+    "escape": lambda value: Markup(escape(value)),
+    "e": lambda value: Markup(escape(value)),
+    "safe": Markup,
+}
+
+# The builtins usable in the expressions, the context takes precedence
+GLOBALS = {
+    name: getattr(builtins, name)
+    for name in (
+        "len", "range", "enumerate", "zip", "sorted", "reversed",
+        "min", "max", "sum", "abs", "round", "str", "int", "float",
+        "bool", "list", "dict", "tuple", "set", "any", "all",
+    )
+}
+
+
+class NameRewriter(ast.NodeTransformer):
+    """Rename the variables of an expression to the locals of the generated
+    function, turn the attribute access into getattr_or_item calls and the
+    filters into calls of the FILTERS functions.
+    """
+
+    def __init__(self):
+        self.names = set()
+
+    def visit_BinOp(self, node):
+        # "value|name" or "value|name(args)" is a filter
+        if not isinstance(node.op, ast.BitOr):
+            return self.generic_visit(node)
+        right = node.right
+        call = right if isinstance(right, ast.Call) else None
+        name = call.func if call is not None else right
+        if not isinstance(name, ast.Name):
+            return self.generic_visit(node)
+        if name.id not in FILTERS:
+            raise ValueError(f"Unknown filter {name.id!r}")
+        function = ast.Subscript(
+            value=ast.Name(id="_filters", ctx=ast.Load()),
+            slice=ast.Constant(name.id),
+            ctx=ast.Load(),
+        )
+        args = [self.visit(node.left)]
+        keywords = []
+        if call is not None:
+            args += [self.visit(arg) for arg in call.args]
+            keywords = [self.visit(keyword) for keyword in call.keywords]
+        return ast.copy_location(ast.Call(function, args, keywords), node)
+
+    def visit_Name(self, node):
+        self.names.add(node.id)
+        return ast.copy_location(ast.Name(id="l_" + node.id, ctx=node.ctx), node)
+
+    def visit_Attribute(self, node):
+        self.generic_visit(node)
+        if not isinstance(node.ctx, ast.Load):
+            return node
+        call = ast.Call(
+            func=ast.Name(id="_getattr", ctx=ast.Load()),
+            args=[node.value, ast.Constant(node.attr)],
+            keywords=[],
+        )
+        return ast.copy_location(call, node)
+
+
+class CodeWriter:
+    """The source code of one generated function."""
+
+    def __init__(self, name: str, args: str):
+        self.name = name
+        self.args = args
+        self.lines = []
+        self.names = set()
+        self.indent = 1
+        self.outputs = []
+
+    def write(self, line: str):
+        """Write a line at the current indentation."""
+        self.flush()
+        self.lines.append("    " * self.indent + line)
+
+    def output(self, code: str):
+        """Write the code of a text chunk, consecutive chunks are joined to
+        yield once.
+        """
+        self.outputs.append(code)
+
+    def flush(self):
+        """Write the yield of the pending text chunks."""
+        if not self.outputs:
+            return
+        outputs, self.outputs = self.outputs, []
+        if len(outputs) == 1:
+            code = outputs[0]
+        else:
+            code = '"".join((' + ", ".join(outputs) + "))"
+        self.lines.append("    " * self.indent + f"yield {code}")
+
+    def source(self) -> str:
+        """Get the source of the function, the context lookups first."""
+        prologue = [
+            f"    l_{name} = _ctx.get({name!r}, _globals.get({name!r}, _undefined))"
+            for name in sorted(self.names)
+        ]
+        self.flush()
+        # "yield" makes it a generator even when the template is empty
+        body = prologue + self.lines + ["    return", "    yield"]
+        return f"def {self.name}({self.args}):\n" + "\n".join(body)
+
+
+class TemplateCompiler:
+    """Compile the source of a template into Python code."""
+
+    def __init__(self, source: str, name: str = "<string>", autoescape: bool = False):
+        """Initialize the compiler.
+        Args:
+            source (str): The template source.
+            name (str, optional): The template name, for the errors. Defaults to "<string>".
+            autoescape (bool, optional): Escape the expressions for HTML. Defaults to False.
+        """
+        self.source = source
+        self.name = name
+        self.autoescape = autoescape
+        self.functions = []
+        self.blocks = []
+        self.parent = None
+        self.lineno = 1
+
+    def error(self, message: str) -> TemplateSyntaxError:
+        """Create a syntax error at the current line."""
+        return TemplateSyntaxError(message, self.name, self.lineno)
+
+    def compile(self) -> dict:
+        """Compile the template.
+        Returns:
+            dict: The namespace with the root function, the blocks and the parent name.
+        """
+        writer = CodeWriter("root", "_ctx, _blocks, _env")
+        self.functions.append(writer)
+        stack = []
+        tokens = DELIMITERS.split(self.source)
+        strip_next = False
+        position = 0
+        for index, token in enumerate(tokens):
+            self.lineno = self.source.count("\n", 0, position) + 1
+            position += len(token)
+            if index % 2 == 0:
+                if strip_next:
+                    token = token.lstrip()
+                if index + 1 < len(tokens) and tokens[index + 1][2:3] == "-":
+                    token = token.rstrip()
+                if token:
+                    writer.output(repr(token))
+                continue
+            strip_next = token[-3:-2] == "-"
+            content = token[2:-2].strip("-").strip()
+            if token.startswith("{#"):
+                continue
+            if token.startswith("{{"):
+                writer.output(self.output(self.expression(content, writer)))
+                continue
+            writer = self.statement(content, writer, stack)
+        if stack:
+            raise self.error(f"Unclosed tag {stack[-1][0]!r}")
+        return self.build()
+
+    def statement(self, content: str, writer: CodeWriter, stack: list) -> CodeWriter:
+        """Compile a {% %} tag.
+        Args:
+            content (str): The tag content.
+            writer (CodeWriter): The current function.
+            stack (list): The open tags.
+        Returns:
+            CodeWriter: The function the next tokens are written to.
+        """
+        writer.flush()
+        keyword, _, rest = content.partition(" ")
+        rest = rest.strip()
+        if keyword == "if":
+            writer.write(f"if {self.expression(rest, writer)}:")
+            writer.indent += 1
+            writer.write("pass")
+            stack.append(("if", writer))
+        elif keyword in ("elif", "else"):
+            if not stack or stack[-1][0] != "if":
+                raise self.error(f"Unexpected {keyword!r}")
+            writer.indent -= 1
+            if keyword == "elif":
+                writer.write(f"elif {self.expression(rest, writer)}:")
+            else:
+                writer.write("else:")
+            writer.indent += 1
+            writer.write("pass")
+        elif keyword == "for":
+            target, separator, iterable = rest.partition(" in ")
+            names = [name.strip() for name in target.split(",")]
+            if not separator or not all(NAME.match(name) for name in names):
+                raise self.error(f"Invalid for loop {rest!r}")
+            writer.names.update(names)
+            targets = ", ".join("l_" + name for name in names)
+            writer.write(f"for {targets} in {self.expression(iterable, writer)}:")
+            writer.indent += 1
+            writer.write("pass")
+            stack.append(("for", writer))
+        elif keyword == "set":
+            name, separator, expression = rest.partition("=")
+            name = name.strip()
+            if not separator or not NAME.match(name):
+                raise self.error(f"Invalid set {rest!r}")
+            writer.names.add(name)
+            writer.write(f"l_{name} = {self.expression(expression, writer)}")
+        elif keyword == "include":
+            writer.write(
+                f"yield from _env.get_template({self.expression(rest, writer)})"
+                f".generate_context({{**_ctx, **{self.locals(writer)}}})"
+            )
+        elif keyword == "extends":
+            if self.parent is not None:
+                raise self.error("A template can only extend one template")
+            self.parent = self.literal(rest)
+        elif keyword == "block":
+            if not NAME.match(rest) or rest in self.blocks:
+                raise self.error(f"Invalid block {rest!r}")
+            # The block sees the loop and set variables of the enclosing code
+            context = f"{{**_ctx, **{self.locals(writer)}}}" if writer.names else "_ctx"
+            writer.write(f"yield from _blocks[{rest!r}]({context}, _blocks, _env)")
+            self.blocks.append(rest)
+            block = CodeWriter(f"block_{rest}", "_ctx, _blocks, _env")
+            self.functions.append(block)
+            stack.append(("block", writer))
+            return block
+        elif keyword in ("endif", "endfor", "endblock"):
+            if not stack or stack[-1][0] != keyword[3:]:
+                raise self.error(f"Unexpected {keyword!r}")
+            _, parent = stack.pop()
+            if keyword == "endblock":
+                return parent
+            writer.indent -= 1
+        else:
+            raise self.error(f"Unknown tag {keyword!r}")
+        return writer
+
+    def expression(self, expression: str, writer: CodeWriter) -> str:
+        """Compile an expression and its filters.
+        Args:
+            expression (str): The expression.
+            writer (CodeWriter): The function using it.
+        Returns:
+            str: The Python code.
+        """
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+            rewriter = NameRewriter()
+            tree = ast.fix_missing_locations(rewriter.visit(tree))
+        except SyntaxError as e:
+            raise self.error(f"Invalid expression {expression!r}: {e.msg}") from None
+        except ValueError as e:
+            raise self.error(str(e)) from None
+        writer.names.update(rewriter.names)
+        return f"({ast.unparse(tree)})"
+
+    def literal(self, expression: str) -> str:
+        """Get the value of a string literal."""
+        try:
+            value = ast.literal_eval(expression)
+        except (ValueError, SyntaxError):
+            value = None
+        if not isinstance(value, str):
+            raise self.error(f"Expected a string, got {expression!r}")
+        return value
+
+    def output(self, code: str) -> str:
+        """Convert the value of an expression to the output string."""
+        return f"_escape({code})" if self.autoescape else f"_str({code})"
+
+    @staticmethod
+    def locals(writer: CodeWriter) -> str:
+        """Get the code of the dict of the variables of a function."""
+        return "{" + ", ".join(f"{name!r}: l_{name}" for name in sorted(writer.names)) + "}"
+
+    def build(self) -> dict:
+        """Execute the generated code.
+        Returns:
+            dict: The namespace with the root function, the blocks and the parent name.
+        """
+        source = "\n\n".join(function.source() for function in self.functions)
+        namespace = {
+            "_escape": escape,
+            "_str": str,
+            "_getattr": getattr_or_item,
+            "_filters": FILTERS,
+            "_globals": GLOBALS,
+            "_undefined": UNDEFINED,
+        }
+        exec(compile(source, f"<template {self.name}>", "exec"), namespace)
+        return {
+            "root": namespace["root"],
+            "blocks": {name: namespace[f"block_{name}"] for name in self.blocks},
+            "parent": self.parent,
+            "source": source,
+        }
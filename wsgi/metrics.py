@@ -0,0 +1,307 @@
+"""Metrics of the server and the application in the Prometheus text format.
+
+The metrics are recorded without locks: every thread updates its own shard
+of a metric and the shards are only added up when the metrics are
+collected. Recording is off until `enable` is called (the `metrics_path`
+server option does it), the instrumented code checks `registry.enabled`
+first so disabled metrics cost a single branch. Each process has its own
+registry, with several workers every worker reports its own values.
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# The seconds of the default histogram buckets
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)  # fmt: skip
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# The environ key the application stores the matched route pattern in
+ROUTE_ENVIRON_KEY = "own_wsgi.route"
+
+
+def escape_label(value: str) -> str:
+    """Escape a label value of the text format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    """Format the labels of a sample, e.g. {route="/",method="GET"}."""
+    labels = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + labels + "}" if labels else ""
+
+
+def format_value(value: float) -> str:
+    """Format a sample value."""
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    """The base class of the metrics, holding the per-thread shards.
+
+    A shard maps the label values to the values recorded by one thread. The
+    shards of the threads that exited are merged into `retired` when the
+    metrics are collected, so short-lived threads do not accumulate.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards: List[Tuple[threading.Thread, dict]] = []
+        self.retired: dict = {}
+
+    def shard(self) -> dict:
+        """Get the shard of the current thread."""
+        try:
+            return self.local.values
+        except AttributeError:
+            values = self.local.values = {}
+            with self.lock:
+                self.shards.append((threading.current_thread(), values))
+            return values
+
+    def collect_values(self) -> Dict[tuple, object]:
+        """Add up the shards.
+        Returns:
+            dict: The values by label values.
+        """
+        with self.lock:
+            alive = []
+            for thread, values in self.shards:
+                if thread.is_alive():
+                    alive.append((thread, values))
+                else:
+                    self.merge(self.retired, values)
+            self.shards = alive
+            total = self.copy(self.retired)
+            for _, values in alive:
+                self.merge(total, dict(values))
+        return total
+
+    @staticmethod
+    def copy(values: dict) -> dict:
+        """Copy the values of a shard."""
+        return dict(values)
+
+    @staticmethod
+    def merge(total: dict, values: dict):
+        """Add the values of a shard to a total."""
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def samples(self) -> Iterable[Tuple[str, tuple, tuple, float]]:
+        """Get the samples of the metric.
+        Returns:
+            iterable: The sample name, the label names and values and the value.
+        """
+        for labels, value in sorted(self.collect_values().items()):
+            yield self.name, self.labelnames, labels, value
+
+    def render(self) -> str:
+        """Format the metric in the text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labelnames, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labelnames, labels)} {format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def inc(self, labels: tuple = (), value: float = 1):
+        """Increment the counter.
+        Args:
+            labels (tuple, optional): The label values, in the order of the label names.
+            value (float, optional): The increment. Defaults to 1.
+        """
+        values = self.shard()
+        values[labels] = values.get(labels, 0) + value
+
+
+class Gauge(Metric):
+    """A value that goes up and down, or is read from a function when the
+    metrics are collected.
+
+    Use either `set` or `inc`/`dec` on a gauge, the value set and the
+    increments are added up.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        function: Optional[Callable[[], Dict[tuple, float]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self.fixed: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), value: float = 1):
+        """Increment the gauge."""
+        values = self.shard()
+        values[labels] = values.get(labels, 0) + value
+
+    def dec(self, labels: tuple = (), value: float = 1):
+        """Decrement the gauge."""
+        values = self.shard()
+        values[labels] = values.get(labels, 0) - value
+
+    def set(self, value: float, labels: tuple = ()):
+        """Set the gauge."""
+        self.fixed[labels] = value
+
+    def collect_values(self) -> Dict[tuple, object]:
+        if self.function is not None:
+            return self.function()
+        total = super().collect_values()
+        self.merge(total, dict(self.fixed))
+        return total
+
+
+class Histogram(Metric):
+    """Counts the observed values in fixed buckets.
+
+    The value of a shard is a list: the sum, the count and the number of
+    values falling in each bucket, the last one being +Inf.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: tuple = ()):
+        """Record a value.
+        Args:
+            value (float): The value.
+            labels (tuple, optional): The label values, in the order of the label names.
+        """
+        values = self.shard()
+        entry = values.get(labels)
+        if entry is None:
+            entry = values[labels] = [0.0, 0] + [0] * (len(self.buckets) + 1)
+        entry[0] += value
+        entry[1] += 1
+        entry[2 + bisect_left(self.buckets, value)] += 1
+
+    @staticmethod
+    def copy(values: dict) -> dict:
+        return {labels: list(entry) for labels, entry in values.items()}
+
+    @staticmethod
+    def merge(total: dict, values: dict):
+        for labels, entry in values.items():
+            current = total.get(labels)
+            if current is None:
+                total[labels] = list(entry)
+            else:
+                for index, value in enumerate(entry):
+                    current[index] += value
+
+    def samples(self) -> Iterable[Tuple[str, tuple, tuple, float]]:
+        labelnames = self.labelnames + ("le",)
+        for labels, entry in sorted(self.collect_values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[2:]):
+                cumulative += count
+                yield f"{self.name}_bucket", labelnames, labels + (format_value(bound),), cumulative
+            yield f"{self.name}_sum", self.labelnames, labels, entry[0]
+            yield f"{self.name}_count", self.labelnames, labels, entry[1]
+
+
+class MetricsRegistry:
+    """The metrics of a process, by name."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+        self.enabled = False
+
+    def register(self, metric: Metric) -> Metric:
+        """Register a metric, the metric already registered with its name is returned."""
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Get or create a counter."""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        function: Optional[Callable[[], Dict[tuple, float]]] = None,
+    ) -> Gauge:
+        """Get or create a gauge.
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labelnames (tuple, optional): The label names.
+            function (callable, optional): Returns the values by label values
+                when the metrics are collected, it replaces the function of
+                a gauge already registered (e.g. by a previous server).
+        """
+        gauge = self.register(Gauge(name, documentation, labelnames, function))
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Get or create a histogram."""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def enable(self):
+        """Start recording the metrics."""
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording the metrics."""
+        self.enabled = False
+
+    def render(self) -> str:
+        """Format all the metrics in the Prometheus text format."""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def metrics_app(environ, start_response):
+    """A WSGI application answering the metrics of the process."""
+    body = registry.render().encode("utf-8")
+    start_response(
+        "200 OK",
+        [("Content-Type", CONTENT_TYPE), ("Content-Length", str(len(body))), ("Cache-Control", "no-store")],
+    )
+    return [body]
@@ -0,0 +1,7 @@
+"""Serve the files of a directory: python -m wsgi.server --directory <path>."""
+
+from .constant import HOST, PORT
+from .server import WSGIServer
+
+if __name__ == "__main__":
+    WSGIServer(HOST, PORT).server_forever()
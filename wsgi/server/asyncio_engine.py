@@ -0,0 +1,249 @@
+"""A module containing the asyncio I/O engine.
+
+Every connection is an asyncio buffered protocol receiving straight into
+the request parser buffer. The
+requests are handed to the application on the event loop: applications
+providing `call_async` (like `WSGIApplication`) await their async handlers
+directly and run the sync ones in the executor, any other WSGI application
+is called in the executor. Only the bodies known not to block (bytes, lists
+and tuples) are iterated on the loop, the other iterables (generators,
+streaming responses) are consumed in the executor. Responses are streamed
+with the transport flow control.
+"""
+
+import asyncio
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .file_wrapper import FileWrapper
+from .http_request_parse import HttpParserError
+from .log import print_debug, print_log
+from .server import Session
+
+
+class AsyncioConnection(Session, asyncio.BufferedProtocol):
+    """A client connection handled by the asyncio engine."""
+
+    def __init__(self, engine: "AsyncioEngine") -> None:
+        self.engine = engine
+        self.loop = None
+        self.transport = None
+        self.in_flight = False
+        self.idle_handle = None
+        self.write_ready = None
+
+    def connection_made(self, transport: asyncio.Transport):
+        """Handle a new connection."""
+        super().__init__(
+            transport.get_extra_info("socket"),
+            transport.get_extra_info("peername"),
+            self.engine.server,
+        )
+        self.transport = transport
+        self.loop = asyncio.get_running_loop()
+        print_debug(f"Socket established with {self.client_address}.")
+        self.wait_idle()
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        """Let the transport receive straight into the parser buffer."""
+        return self.parser.buffer.get_write_buffer(self.server.buffer_size)
+
+    def buffer_updated(self, nbytes: int):
+        """Parse the data received in the buffer."""
+        self.wait_idle()
+        self.parser.buffer.commit(nbytes)
+        try:
+            self.parser.parse()
+        except HttpParserError as e:
+            self.transport.write(self.error_response(e))
+            self.transport.close()
+
+    def connection_lost(self, exc):
+        """Handle the connection being closed."""
+        if self.idle_handle is not None:
+            self.idle_handle.cancel()
+        # Unblock a response waiting for the transport
+        self.resume_writing()
+        self.connection_closed()
+        print_debug(f"Socket closed with {self.client_address}.")
+
+    def wait_idle(self):
+        """(Re)start the keep-alive timer of the connection."""
+        if self.idle_handle is not None:
+            self.idle_handle.cancel()
+        self.idle_handle = asyncio.get_running_loop().call_later(
+            self.server.keep_alive_timeout, self.on_idle
+        )
+
+    def on_idle(self):
+        """Close the connection when it stays idle for too long."""
+        if not self.in_flight:
+            self.transport.close()
+
+    def on_message_complete(self):
+        """Handle the message complete callback, the request is processed in
+        a task and parsing waits until the response is written."""
+        self.request.parsed_time = time.perf_counter()
+        self.parser.pause()
+        self.transport.pause_reading()
+        self.in_flight = True
+        asyncio.get_running_loop().create_task(self.handle_request())
+
+    def pause_writing(self):
+        """Handle the transport write buffer going over the high watermark."""
+        self.write_ready = asyncio.get_running_loop().create_future()
+
+    def resume_writing(self):
+        """Handle the transport write buffer draining below the low watermark."""
+        if self.write_ready is not None:
+            self.write_ready.set_result(None)
+            self.write_ready = None
+
+    async def drain(self):
+        """Wait until the transport accepts more data."""
+        if self.write_ready is not None:
+            await self.write_ready
+
+    def send_buffers(self, buffers: list):
+        """Hand the buffers to the transport. The `write` callable of a WSGI
+        application running in the executor sends from a worker thread, the
+        buffers are then handed over on the loop, transports are not thread-safe.
+        Args:
+            buffers (list): The buffers to send.
+        """
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            self.transport.writelines(buffers)
+            return
+        asyncio.run_coroutine_threadsafe(self.send_threadsafe(buffers), self.loop).result()
+
+    async def send_threadsafe(self, buffers: list):
+        """Send buffers on the loop and wait until the transport accepts more.
+        Args:
+            buffers (list): The buffers to send.
+        """
+        self.transport.writelines(buffers)
+        await self.drain()
+
+    async def handle_request(self):
+        """Call the application and write the response."""
+        try:
+            await self.process_request_async()
+        except Exception as e:
+            print_log(f"An error occurred: {e}", error=True)
+            self.transport.close()
+            return
+        if self.transport.is_closing():
+            return
+        self.finish_request()
+        self.in_flight = False
+        if not self.keep_alive:
+            self.transport.close()
+            return
+        self.wait_idle()
+        self.transport.resume_reading()
+        # Parse the pipelined requests already buffered
+        try:
+            self.parser.resume()
+        except HttpParserError as e:
+            self.transport.write(self.error_response(e))
+            self.transport.close()
+
+    async def process_request_async(self):
+        """Call the application with the parsed request and stream the
+        response to the client."""
+        environ = self.prepare_environ()
+        self.response.send = self.send_buffers
+        loop = asyncio.get_running_loop()
+        app = self.get_app(environ)
+        call_async = getattr(app, "call_async", None)
+        try:
+            if call_async is not None:
+                body_chunks = await call_async(environ, self.response.start_response)
+            else:
+                body_chunks = await loop.run_in_executor(
+                    None, app, environ, self.response.start_response
+                )
+        except Exception as e:
+            self.internal_error(e)
+            return
+        finally:
+            self.request.app_end_time = time.perf_counter()
+        try:
+            if isinstance(body_chunks, FileWrapper):
+                file_range = self.response.start_file(body_chunks)
+                if file_range is not None:
+                    filelike, offset, count = file_range
+                    if count:
+                        await loop.sendfile(self.transport, filelike, offset, count)
+                    self.response.finish_file(count)
+                    self.keep_alive = self.response.keep_alive
+                    return
+            self.response.set_length_hint(body_chunks)
+            if isinstance(body_chunks, (bytes, bytearray)):
+                self.response.write(body_chunks)
+                await self.drain()
+            elif isinstance(body_chunks, (list, tuple)):
+                for chunk in body_chunks:
+                    self.response.write(chunk)
+                    await self.drain()
+            else:
+                # Any other iterable, even from an async handler, may block
+                iterator = iter(body_chunks)
+                while True:
+                    chunk = await loop.run_in_executor(None, next, iterator, None)
+                    if chunk is None:
+                        break
+                    self.response.write(chunk)
+                    await self.drain()
+            self.response.finish()
+        except Exception as e:
+            if self.response.headers_sent:
+                raise
+            self.internal_error(e)
+        finally:
+            close = getattr(body_chunks, "close", None)
+            if close is not None:
+                # Closing a generator runs its cleanup, which may block
+                await loop.run_in_executor(None, close)
+        self.keep_alive = self.response.keep_alive
+
+
+class AsyncioEngine:
+    """A class representing the asyncio event loop."""
+
+    def __init__(self, server) -> None:
+        self.server = server
+
+    def serve(self, server_socket: socket.socket):
+        """Run the event loop.
+        Args:
+            server_socket (socket.socket): The listening socket.
+        """
+        try:
+            asyncio.run(self.main(server_socket))
+        except KeyboardInterrupt:
+            print_log("Server is shutting down.", error=True)
+
+    async def main(self, server_socket: socket.socket):
+        """Serve the connections until the server is stopped.
+        Args:
+            server_socket (socket.socket): The listening socket.
+        """
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=self.server.max_threads, thread_name_prefix="asyncio-worker"
+            )
+        )
+        async_server = await loop.create_server(
+            lambda: AsyncioConnection(self),
+            sock=server_socket,
+            backlog=self.server.listen_backlog,
+        )
+        async with async_server:
+            await async_server.serve_forever()
@@ -2,7 +2,38 @@
 
 HOST = "localhost"
 PORT = 4221
-BUFFER_ZISE = 1024
+BUFFER_ZISE = 65536
 CRLF = "\r\n"
 END_HEADERS = CRLF + CRLF
 ACCEPT_ENCODING = ["gzip"]
+KEEP_ALIVE_TIMEOUT = 5.0
+MAX_KEEP_ALIVE_REQUESTS = 100
+SELECTOR_WORKERS = 4
+LISTEN_BACKLOG = 128
+MIN_THREADS = 4
+MAX_THREADS = 64
+QUEUE_SIZE = 128
+WORKER_IDLE_TIMEOUT = 30.0
+GRACEFUL_TIMEOUT = 10.0
+# A worker exiting within WORKER_MIN_UPTIME seconds failed fast, its slot is
+# respawned after an exponential backoff and the master stops after
+# WORKER_MAX_FAST_FAILURES consecutive fast failures of a slot
+WORKER_MIN_UPTIME = 5.0
+WORKER_RESTART_BACKOFF = 0.5
+WORKER_MAX_RESTART_BACKOFF = 30.0
+WORKER_MAX_FAST_FAILURES = 5
+MAX_REQUEST_LINE = 8190
+MAX_HEADERS = 100
+MAX_HEADER_BYTES = 65536
+WRITE_COALESCE_SIZE = 16384
+MAX_WRITE_BUFFERS = 512
+# Unsent response bytes a selector worker queues before pausing the body
+WRITE_HIGH_WATER = 262144
+FILE_BLOCK_SIZE = 65536
+SERVER_NAME = "own-wsgi"
+MAX_STATUS_LINES = 256
+MAX_ENVIRON_KEYS = 1024
+
+# Logging
+LOG_BATCH_SIZE = 256
+LOG_QUEUE_SIZE = 65536
@@ -24,3 +24,33 @@ class HttpStatusCode(Enum):
     def __init__(self, code: int, message: str) -> None:
         self.code = code
         self.message = message
+
+
+class ServerEngine(StrEnum):
+    """An enum representing the I/O engines the server can run with."""
+
+    THREADED = "threaded"
+    SELECTOR = "selector"
+    ASYNCIO = "asyncio"
+
+
+class ParserState(Enum):
+    """An enum representing the states of the HTTP request parser."""
+
+    START_LINE = "start_line"
+    HEADERS = "headers"
+    BODY = "body"
+    CHUNK_SIZE = "chunk_size"
+    CHUNK_DATA = "chunk_data"
+    CHUNK_DATA_END = "chunk_data_end"
+    TRAILERS = "trailers"
+    COMPLETE = "complete"
+
+
+class AccessLogFormat(StrEnum):
+    """The access log formats."""
+
+    DEFAULT = "default"
+    COMMON = "common"
+    COMBINED = "combined"
+    JSON = "json"
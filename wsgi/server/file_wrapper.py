@@ -0,0 +1,42 @@
+"""A module containing the wsgi.file_wrapper implementation."""
+
+from .constant import FILE_BLOCK_SIZE
+
+
+class FileWrapper:
+    """A class representing the `wsgi.file_wrapper` of PEP 3333.
+
+    Iterating the wrapper reads the file in blocks, but the server sends the
+    file with `os.sendfile` instead when the file-like object has a real
+    file descriptor: from the current position of the file and for
+    Content-Length bytes (or up to the end of the file).
+    """
+
+    def __init__(self, filelike, block_size: int = FILE_BLOCK_SIZE):
+        """Initialize the wrapper.
+        Args:
+            filelike: The file-like object, opened in binary mode.
+            block_size (int): The size of the blocks read when iterating.
+        """
+        self.filelike = filelike
+        self.block_size = block_size
+
+    def fileno(self):
+        """Get the file descriptor of the file, None if it has none."""
+        try:
+            return self.filelike.fileno()
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    def __iter__(self):
+        while True:
+            data = self.filelike.read(self.block_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        """Close the file-like object."""
+        close = getattr(self.filelike, "close", None)
+        if close is not None:
+            close()
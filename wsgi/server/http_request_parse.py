@@ -1,20 +1,72 @@
 """A module for parsing HTTP requests."""
 
+from .constant import BUFFER_ZISE, MAX_HEADER_BYTES, MAX_HEADERS, MAX_REQUEST_LINE
+from .enums import ParserState
 from .splitbuffer import SplitBuffer
 
+HEADER_WHITESPACE = b" \t"
+HEX_DIGITS = b"0123456789abcdefABCDEF"
+
+
+class HttpParserError(Exception):
+    """An error raised when a request is malformed or exceeds the limits."""
+
+    def __init__(self, message: str, status: str = "400 Bad Request"):
+        super().__init__(message)
+        self.status = status
+
 
 class HttpRequestParser:
-    """A class representing a HTTP request parser."""
+    """A class representing a HTTP request parser.
+
+    The parser is an explicit state machine: every call parses as many
+    complete tokens (request line, header lines, body bytes, chunks) as the
+    buffer holds and the protocol callbacks are called as they are found:
+    `on_message_begin` with the first byte of a request, `on_url`,
+    `on_header` for each header, `on_headers_complete`, `on_body` for each
+    body fragment and `on_message_complete`.
+    The parser outlives a single request: once a message is complete its
+    state is reset and any pipelined data left in the buffer is parsed as
+    the next request, unless the parser has been paused.
+    """
 
-    def __init__(self, protocol):
+    def __init__(
+        self,
+        protocol,
+        buffer_size: int = BUFFER_ZISE,
+        max_request_line: int = MAX_REQUEST_LINE,
+        max_headers: int = MAX_HEADERS,
+        max_header_bytes: int = MAX_HEADER_BYTES,
+    ):
         self.protocol = protocol
-        self.buffer = SplitBuffer()
-        self.done_parsing_start = False
-        self.done_parsing_headers = False
+        self.buffer = SplitBuffer(buffer_size)
+        self.max_request_line = max_request_line
+        self.max_headers = max_headers
+        self.max_header_bytes = max_header_bytes
+        self.paused = False
+        self.reset()
+
+    def reset(self):
+        """Reset the per-request state, keeping the buffered data."""
+        self.state = ParserState.START_LINE
+        self.message_begun = False
+        self.header_count = 0
+        self.header_bytes = 0
+        self.content_length = None
+        self.chunked = False
         self.expected_body_length = 0
         self.http_method = None
         self.http_version = None
 
+    def pause(self):
+        """Stop parsing, the data in the buffer is kept until resumed."""
+        self.paused = True
+
+    def resume(self):
+        """Resume parsing the data left in the buffer."""
+        self.paused = False
+        self.parse()
+
     def feed_data(self, data: bytes):
         """Feed data to the parser.
         Args:
@@ -23,40 +75,209 @@ class HttpRequestParser:
         self.buffer.feed_data(data)
         self.parse()
 
-    def parse(self):
-        """Parse the data in the buffer."""
-        if not self.done_parsing_start:
-            self.parse_startline()
-        elif not self.done_parsing_headers:
-            self.parse_headerline()
-        elif self.expected_body_length:
-            data = self.buffer.flush()
-            self.expected_body_length -= len(data)
-            self.protocol.on_body(data)
+    def recv_into(self, sock, size: int) -> int:
+        """Receive data from a socket straight into the buffer and parse it.
+        Args:
+            sock (socket.socket): The socket.
+            size (int): The maximum number of bytes to receive.
+        Returns:
+            int: The number of bytes received, 0 when the peer closed the connection.
+        """
+        received = self.buffer.recv_into(sock, size)
+        if received:
             self.parse()
-        else:
-            self.protocol.on_message_complete()
+        return received
 
-    def parse_startline(self):
-        """Parse the start line of the HTTP request."""
+    def parse(self):
+        """Parse the data in the buffer.
+        Raises:
+            HttpParserError: If the request is malformed or exceeds the limits.
+        """
+        while not self.paused:
+            state = self.state
+            if state is ParserState.START_LINE:
+                progressed = self.parse_startline()
+            elif state is ParserState.HEADERS:
+                progressed = self.parse_headerline()
+            elif state is ParserState.BODY:
+                progressed = self.parse_body()
+            elif state is ParserState.CHUNK_SIZE:
+                progressed = self.parse_chunk_size()
+            elif state is ParserState.CHUNK_DATA:
+                progressed = self.parse_chunk_data()
+            elif state is ParserState.CHUNK_DATA_END:
+                progressed = self.parse_chunk_data_end()
+            elif state is ParserState.TRAILERS:
+                progressed = self.parse_trailerline()
+            else:
+                self.protocol.on_message_complete()
+                self.reset()
+                progressed = True
+            if not progressed:
+                return
+
+    def pop_line(self, limit: int, status: str):
+        """Pop a line from the buffer, enforcing its maximum length.
+        Args:
+            limit (int): The maximum line length.
+            status (str): The error status when the line is too long.
+        Returns:
+            bytes: The line without CRLF or None if the line is not complete yet.
+        """
         line = self.buffer.pop(separator=b"\r\n")
-        if line is not None:
-            http_method, url, http_version = line.strip().split()
-            self.http_method = http_method
-            self.http_version = http_version
-            self.done_parsing_start = True
-            self.protocol.on_url(url)
-            self.parse()
+        if line is None:
+            if len(self.buffer) > limit:
+                raise HttpParserError("Line too long.", status)
+            return None
+        if len(line) > limit:
+            raise HttpParserError("Line too long.", status)
+        return line
+
+    def parse_startline(self) -> bool:
+        """Parse the start line of the HTTP request."""
+        if not self.message_begun:
+            if not len(self.buffer):
+                return False
+            self.message_begun = True
+            self.protocol.on_message_begin()
+        line = self.pop_line(self.max_request_line, "414 URI Too Long")
+        if line is None:
+            return False
+        # empty lines before the request line are ignored (RFC 9112 2.2)
+        if not line:
+            return True
+        parts = line.split(b" ")
+        if len(parts) != 3 or not all(parts):
+            raise HttpParserError("Malformed request line.")
+        http_method, url, http_version = parts
+        if not http_version.startswith(b"HTTP/"):
+            raise HttpParserError("Malformed request line.")
+        if http_version not in (b"HTTP/1.1", b"HTTP/1.0"):
+            raise HttpParserError(
+                "Unsupported HTTP version.", "505 HTTP Version Not Supported"
+            )
+        self.http_method = http_method
+        self.http_version = http_version
+        self.state = ParserState.HEADERS
+        self.protocol.on_url(url)
+        return True
+
+    def parse_field(self, line: bytes):
+        """Parse a header or trailer field line, enforcing the header limits.
+        Args:
+            line (bytes): The field line.
+        Returns:
+            tuple: The field name and value.
+        """
+        self.header_count += 1
+        self.header_bytes += len(line) + 2
+        if self.header_count > self.max_headers or self.header_bytes > self.max_header_bytes:
+            raise HttpParserError(
+                "Too many headers.", "431 Request Header Fields Too Large"
+            )
+        name, separator, value = line.partition(b":")
+        if not separator or not name or name[-1:] in HEADER_WHITESPACE:
+            raise HttpParserError("Malformed header line.")
+        if line[:1] in HEADER_WHITESPACE:
+            # obsolete line folding is rejected (RFC 9112 5.2)
+            raise HttpParserError("Malformed header line.")
+        return name, value.strip(HEADER_WHITESPACE)
 
-    def parse_headerline(self):
+    def parse_headerline(self) -> bool:
         """Parse the header line of the HTTP request."""
-        line = self.buffer.pop(separator=b"\r\n")
-        if line is not None:
-            if line:
-                name, value = line.strip().split(b": ", maxsplit=1)
-                if name.lower() == b"content-length":
-                    self.expected_body_length = int(value.decode("utf-8"))
-                self.protocol.on_header(name, value)
-            else:
-                self.done_parsing_headers = True
-            self.parse()
+        line = self.pop_line(self.max_header_bytes, "431 Request Header Fields Too Large")
+        if line is None:
+            return False
+        if not line:
+            self.end_headers()
+            return True
+        name, value = self.parse_field(line)
+        lower_name = name.lower()
+        if lower_name == b"content-length":
+            if not value.isdigit():
+                raise HttpParserError("Invalid Content-Length.")
+            content_length = int(value)
+            if self.content_length not in (None, content_length):
+                raise HttpParserError("Conflicting Content-Length.")
+            self.content_length = content_length
+        elif lower_name == b"transfer-encoding":
+            codings = [coding.strip(HEADER_WHITESPACE).lower() for coding in value.split(b",")]
+            if codings[-1] != b"chunked":
+                raise HttpParserError(
+                    "Unsupported Transfer-Encoding.", "501 Not Implemented"
+                )
+            self.chunked = True
+        self.protocol.on_header(name, value)
+        return True
+
+    def end_headers(self):
+        """Choose how the body is framed once the headers are parsed."""
+        self.protocol.on_headers_complete()
+        if self.chunked:
+            if self.content_length is not None:
+                # The framing is ambiguous, a proxy may have used the other
+                # header, this is how requests are smuggled (RFC 9112 6.3)
+                raise HttpParserError("Both Transfer-Encoding and Content-Length.")
+            self.state = ParserState.CHUNK_SIZE
+        elif self.content_length:
+            self.expected_body_length = self.content_length
+            self.state = ParserState.BODY
+        else:
+            self.state = ParserState.COMPLETE
+
+    def parse_body(self) -> bool:
+        """Parse the body of a request framed by Content-Length."""
+        data = self.buffer.read(self.expected_body_length)
+        if not data:
+            return False
+        self.expected_body_length -= len(data)
+        self.protocol.on_body(data)
+        if not self.expected_body_length:
+            self.state = ParserState.COMPLETE
+        return True
+
+    def parse_chunk_size(self) -> bool:
+        """Parse the size line of a chunk."""
+        line = self.pop_line(self.max_request_line, "400 Bad Request")
+        if line is None:
+            return False
+        size = line.split(b";", maxsplit=1)[0].strip(HEADER_WHITESPACE)
+        if not size or size.strip(HEX_DIGITS):
+            raise HttpParserError("Invalid chunk size.")
+        self.expected_body_length = int(size, 16)
+        if self.expected_body_length:
+            self.state = ParserState.CHUNK_DATA
+        else:
+            self.state = ParserState.TRAILERS
+        return True
+
+    def parse_chunk_data(self) -> bool:
+        """Parse the data of a chunk."""
+        data = self.buffer.read(self.expected_body_length)
+        if not data:
+            return False
+        self.expected_body_length -= len(data)
+        self.protocol.on_body(data)
+        if not self.expected_body_length:
+            self.state = ParserState.CHUNK_DATA_END
+        return True
+
+    def parse_chunk_data_end(self) -> bool:
+        """Parse the CRLF closing the data of a chunk."""
+        if len(self.buffer) < 2:
+            return False
+        if self.buffer.read(2) != b"\r\n":
+            raise HttpParserError("Malformed chunk.")
+        self.state = ParserState.CHUNK_SIZE
+        return True
+
+    def parse_trailerline(self) -> bool:
+        """Parse a trailer line of a chunked body, trailers are discarded."""
+        line = self.pop_line(self.max_header_bytes, "431 Request Header Fields Too Large")
+        if line is None:
+            return False
+        if not line:
+            self.state = ParserState.COMPLETE
+        else:
+            self.parse_field(line)
+        return True
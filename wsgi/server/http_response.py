@@ -1,7 +1,25 @@
 """Create a HTTP response."""
 
+import time
+from email.utils import formatdate
+from http import HTTPStatus
 from typing import List, Tuple
 
+from .constant import MAX_STATUS_LINES, SERVER_NAME
+
+# The status lines by status, the standard ones are encoded at import
+STATUS_LINES = {
+    f"{status.value} {status.phrase}": f"HTTP/1.1 {status.value} {status.phrase}\r\n".encode("utf-8")
+    for status in HTTPStatus
+}
+SERVER_HEADER = f"Server: {SERVER_NAME}\r\n".encode("utf-8")
+CONNECTION_HEADERS = {
+    True: b"Connection: keep-alive\r\n",
+    False: b"Connection: close\r\n",
+}
+# The Date and Server headers and the second they were formatted for
+common_headers = (0, b"")
+
 
 def create_status_line(status: str = "200 OK") -> str:
     """Create the status line for the HTTP response.
@@ -13,6 +31,35 @@ def create_status_line(status: str = "200 OK") -> str:
     return f"HTTP/1.1 {status}\r\n"
 
 
+def get_status_line(status: str = "200 OK") -> bytes:
+    """Get the encoded status line, cached by status.
+    Args:
+        status (str): The status.
+    Returns:
+        bytes: The status line.
+    """
+    line = STATUS_LINES.get(status)
+    if line is None:
+        line = create_status_line(status).encode("utf-8")
+        if len(STATUS_LINES) < MAX_STATUS_LINES:
+            STATUS_LINES[status] = line
+    return line
+
+
+def get_common_headers() -> bytes:
+    """Get the Date and Server headers, the date is formatted once per second.
+    Returns:
+        bytes: The encoded header lines.
+    """
+    global common_headers
+    now = int(time.time())
+    second, block = common_headers
+    if second != now:
+        block = f"Date: {formatdate(now, usegmt=True)}\r\n".encode("utf-8") + SERVER_HEADER
+        common_headers = (now, block)
+    return block
+
+
 def format_headers(headers: List[Tuple[str, str]]) -> str:
     """Format the headers for the HTTP response.
     Args:
@@ -23,6 +70,32 @@ def format_headers(headers: List[Tuple[str, str]]) -> str:
     return "".join([f"{key}: {value}\r\n" for key, value in headers])
 
 
+def make_header_block(
+    status: str,
+    headers: List[Tuple[str, str]],
+    common: bool = True,
+    connection: bool = None,
+) -> bytes:
+    """Create the status line and the headers of a response.
+    Args:
+        status (str): The status.
+        headers (list): The headers.
+        common (bool): Add the Date and Server headers.
+        connection (bool): Add a Connection header, keep-alive if True,
+            close if False, none if None.
+    Returns:
+        bytes: The header block, with the empty line ending it.
+    """
+    # Encoding the headers at once is faster than encoding each of them
+    parts = [get_status_line(status), format_headers(headers).encode("utf-8")]
+    if common:
+        parts.append(get_common_headers())
+    if connection is not None:
+        parts.append(CONNECTION_HEADERS[connection])
+    parts.append(b"\r\n")
+    return b"".join(parts)
+
+
 def make_response(
     status: str = "200 OK",
     headers: List[Tuple[str, str]] = None,
@@ -36,12 +109,5 @@ def make_response(
     Returns:
         bytes: The HTTP response.
     """
-    if headers is None:
-        headers = []
-    content = [
-        create_status_line(status).encode("utf-8"),
-        format_headers(headers).encode("utf-8"),
-        b"\r\n" if body else b"",
-        body,
-    ]
-    return b"".join(content)
+    header_block = make_header_block(status, headers or [])
+    return header_block + body if body else header_block
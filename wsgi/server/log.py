@@ -1,10 +1,53 @@
-"""Log Middleware."""
+"""Log Middleware.
 
+The request threads only put records in a queue, a background thread formats
+them and writes them in batches, so a slow terminal or disk does not slow
+down the requests.
+"""
+
+import atexit
 import datetime
+import json
 import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
 
+from .constant import LOG_BATCH_SIZE, LOG_QUEUE_SIZE
+from .enums import AccessLogFormat
 from .wsgi import WSGIRequest, WSGIResponse
 
+ACCESS_LOG_FORMATS = {
+    AccessLogFormat.DEFAULT: "[{time}] {status} {method} {path} {remote_addr} - {remote_port}",
+    AccessLogFormat.COMMON: '{remote_addr} - - [{time_clf}] "{method} {path} {version}" {status_code} {bytes}',
+    AccessLogFormat.COMBINED: (
+        '{remote_addr} - - [{time_clf}] "{method} {path} {version}" {status_code} {bytes}'
+        ' "{referer}" "{user_agent}"'
+    ),
+}
+# Sample values of the access log fields, a format is checked with them
+ACCESS_LOG_FIELDS = {
+    "remote_addr": "127.0.0.1",
+    "remote_port": 0,
+    "method": "GET",
+    "path": "/",
+    "version": "HTTP/1.1",
+    "status": "200 OK",
+    "status_code": "200",
+    "bytes": 0,
+    "duration": 0.0,
+    "referer": "-",
+    "user_agent": "-",
+    "request_id": "-",
+    "time": "01/01/1970 00:00:00",
+    "time_clf": "01/Jan/1970:00:00:00 +0000",
+}
+# A record is a tuple (kind, timestamp, payload)
+MESSAGE, ERROR, DEBUG, ACCESS = range(4)
+
 
 def log_output(func):
     """Log the request and response."""
@@ -19,19 +62,255 @@ def log_output(func):
     return wrapper
 
 
+class LogWriter:
+    """Write the log records queued by the request threads in batches."""
+
+    def __init__(self):
+        self.queue = queue.Queue(LOG_QUEUE_SIZE)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stream_lock = threading.Lock()
+        self.files = []
+        self.dropped = 0
+        self.time_cache = {}
+        self.configure()
+
+    def configure(
+        self,
+        access_log: str = None,
+        error_log: str = None,
+        access_log_format: str = AccessLogFormat.DEFAULT,
+        access_log_sampling: dict = None,
+        debug: bool = False,
+    ):
+        """Configure the logs.
+        Args:
+            access_log (str, optional): The access log file, None or "-" for stdout.
+            error_log (str, optional): The error log file, None or "-" for stdout.
+            access_log_format (str, optional): "default", "common", "combined", "json"
+                or a format string using the access log fields. Defaults to "default".
+            access_log_sampling (dict, optional): The share of the requests logged
+                (0 to 1) by path prefix, the errors are always logged.
+            debug (bool, optional): Log the per-request debug messages. Defaults to False.
+        Raises:
+            ValueError: If the access log format uses an unknown field.
+        """
+        access_log_format = ACCESS_LOG_FORMATS.get(access_log_format, access_log_format)
+        self.check_format(access_log_format)
+        access_stream = self.open_stream(access_log)
+        error_stream = self.open_stream(error_log)
+        with self.stream_lock:
+            # Close the files of the previous configuration, not stdout
+            for file in self.files:
+                file.close()
+            self.files = [
+                stream for stream in (access_stream, error_stream) if stream is not sys.stdout
+            ]
+            self.access_stream = access_stream
+            self.error_stream = error_stream
+        self.access_log_format = access_log_format
+        self.json_format = access_log_format == AccessLogFormat.JSON
+        self.needs_headers = self.json_format or (
+            "{referer}" in self.access_log_format or "{user_agent}" in self.access_log_format
+        )
+        self.needs_request_id = self.json_format or "{request_id}" in self.access_log_format
+        self.sampling = sorted(
+            (access_log_sampling or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+        self.debug = debug
+
+    @staticmethod
+    def check_format(access_log_format: str):
+        """Check that an access log format only uses the access log fields.
+        Args:
+            access_log_format (str): The format string.
+        Raises:
+            ValueError: If the format is invalid.
+        """
+        try:
+            access_log_format.format(**ACCESS_LOG_FIELDS)
+        except (KeyError, IndexError, ValueError, TypeError) as e:
+            raise ValueError(f"Invalid access log format {access_log_format!r}: {e!r}") from None
+
+    @staticmethod
+    def open_stream(path: str):
+        """Open a log file, None or "-" is stdout."""
+        if path is None or path == "-":
+            return sys.stdout
+        return open(path, "a", encoding="utf-8")
+
+    def emit(self, record: tuple):
+        """Queue a record, it is dropped if the writer cannot keep up.
+        Args:
+            record (tuple): The kind, the timestamp and the payload.
+        """
+        if self.thread is None:
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        """Start the writer thread."""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+                self.thread.start()
+
+    def run(self):
+        """Write the queued records until the None sentinel."""
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            try:
+                self.write([record for record in batch if record is not None])
+            except Exception as e:
+                sys.stderr.write(f"Cannot write the logs: {e!r}\n")
+            if stop:
+                return
+
+    def write(self, batch: list):
+        """Format and write a batch of records.
+        Args:
+            batch (list): The records.
+        """
+        access_lines, error_lines = [], []
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            batch.append((ERROR, time.time(), f"{dropped} log records were dropped."))
+        for kind, timestamp, payload in batch:
+            if kind == ACCESS:
+                # A record that cannot be formatted must not lose the batch
+                try:
+                    access_lines.append(self.format_access(timestamp, payload))
+                except Exception as e:
+                    error_lines.append(
+                        f"[{self.format_time(timestamp)}] Cannot format an access record: {e!r}"
+                    )
+                continue
+            line = f"[{self.format_time(timestamp)}] {payload}"
+            error_lines.append(line)
+            if kind == ERROR:
+                logging.error(line)
+            elif kind == MESSAGE:
+                logging.info(line)
+        with self.stream_lock:
+            for stream, lines in (
+                (self.access_stream, access_lines),
+                (self.error_stream, error_lines),
+            ):
+                if not lines:
+                    continue
+                try:
+                    stream.write("\n".join(lines) + "\n")
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+
+    def format_time(self, timestamp: float, fmt: str = "%d/%m/%Y %H:%M:%S") -> str:
+        """Format a timestamp, the result is cached for the second.
+        Args:
+            timestamp (float): The timestamp.
+            fmt (str, optional): The strftime format.
+        Returns:
+            str: The formatted local time.
+        """
+        second = int(timestamp)
+        cached = self.time_cache.get(fmt)
+        if cached is None or cached[0] != second:
+            value = datetime.datetime.fromtimestamp(second).astimezone().strftime(fmt)
+            cached = self.time_cache[fmt] = (second, value)
+        return cached[1]
+
+    def format_access(self, timestamp: float, fields: dict) -> str:
+        """Format an access log record.
+        Args:
+            timestamp (float): The timestamp.
+            fields (dict): The access log fields.
+        Returns:
+            str: The log line.
+        """
+        if self.json_format:
+            return json.dumps(
+                {"time": datetime.datetime.fromtimestamp(timestamp).astimezone().isoformat(), **fields}
+            )
+        return self.access_log_format.format(
+            time=self.format_time(timestamp),
+            time_clf=self.format_time(timestamp, "%d/%b/%Y:%H:%M:%S %z"),
+            **fields,
+        )
+
+    def sample(self, path: str) -> bool:
+        """Decide if the access of a path is logged."""
+        for prefix, rate in self.sampling:
+            if path.startswith(prefix):
+                return rate >= 1 or random.random() < rate
+        return True
+
+    def close(self, timeout: float = 5.0):
+        """Write the queued records and stop the writer thread.
+        Args:
+            timeout (float, optional): Seconds to wait for the writer. Defaults to 5.
+        """
+        thread = self.thread
+        if thread is None:
+            return
+        self.queue.put(None)
+        thread.join(timeout)
+        self.thread = None
+
+    def after_fork(self):
+        """The writer thread does not exist in a forked child, start a new one."""
+        self.queue = queue.Queue(LOG_QUEUE_SIZE)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stream_lock = threading.Lock()
+
+
+writer = LogWriter()
+atexit.register(writer.close)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=writer.after_fork)
+
+
+def configure_logging(**kwargs):
+    """Configure the logs, see LogWriter.configure for the options."""
+    writer.configure(**kwargs)
+
+
+def close_logs():
+    """Write the queued records, before a process exits."""
+    writer.close()
+
+
 def print_log(message: str, error: bool = False):
     """Print the message in log.
     Args:
         message (str): The message to print.
+        error (bool, optional): Whether the message is an error. Defaults to False.
     """
-    date_time = datetime.datetime.now()
-    date_time_format = date_time.strftime("%d/%m/%Y %H:%M:%S")
-    log_message = f"[{date_time_format}] {message}"
-    print(log_message)
-    if error:
-        logging.error(log_message)
-    else:
-        logging.info(log_message)
+    writer.emit((ERROR if error else MESSAGE, time.time(), message))
+
+
+def print_debug(message: str):
+    """Print a debug message in log, only when the debug logs are enabled.
+    Args:
+        message (str): The message to print.
+    """
+    if writer.debug:
+        writer.emit((DEBUG, time.time(), message))
+
+
+def needs_request_id() -> bool:
+    """Check if the access log format shows the request ID."""
+    return writer.needs_request_id
+
 
 def log_request(client_address, request: WSGIRequest, response: WSGIResponse):
     """Print the request in log.
@@ -40,5 +319,23 @@ def log_request(client_address, request: WSGIRequest, response: WSGIResponse):
         request (WSGIRequest): The request object.
         response (WSGIResponse): The response object.
     """
-    log_message = f"{response.status} {request.http_method} {request.path} {client_address[0]} - {client_address[1]}"
-    print_log(log_message)
+    status = response.status or ""
+    if writer.sampling and not status.startswith("5") and not writer.sample(request.path):
+        return
+    now = time.time()
+    fields = {
+        "remote_addr": client_address[0],
+        "remote_port": client_address[1],
+        "method": request.http_method,
+        "path": request.path,
+        "version": request.http_version,
+        "status": status,
+        "status_code": status[:3],
+        "bytes": response.bytes_sent,
+        "duration": round(time.perf_counter() - request.start_time, 6) if request.start_time else 0.0,
+        "request_id": request.request_id or "-",
+    }
+    if writer.needs_headers:
+        fields["referer"] = request.get_header("Referer") or "-"
+        fields["user_agent"] = request.get_header("User-Agent") or "-"
+    writer.emit((ACCESS, now, fields))
@@ -0,0 +1,191 @@
+"""A module containing the pre-fork master/worker process model.
+
+The master process binds the listening socket (or lets every worker bind
+its own with SO_REUSEPORT), forks the workers and supervises them: crashed
+workers are respawned, SIGTERM/SIGINT stop them gracefully and SIGHUP
+replaces them one by one (rolling restart). Every worker has a slot, a slot
+whose workers keep exiting right after their start is respawned with an
+exponential backoff, and the master gives up when it keeps failing.
+"""
+
+import os
+import signal
+import time
+
+from .constant import (
+    GRACEFUL_TIMEOUT,
+    WORKER_MAX_FAST_FAILURES,
+    WORKER_MAX_RESTART_BACKOFF,
+    WORKER_MIN_UPTIME,
+    WORKER_RESTART_BACKOFF,
+)
+from .log import close_logs, print_log
+from .utils import print_welcome_message
+
+
+class PreforkMaster:
+    """A class representing the master process supervising the workers."""
+
+    def __init__(self, server) -> None:
+        self.server = server
+        self.server_socket = None
+        # The slot of every worker process
+        self.workers = {}
+        self.started_at = [0.0] * server.workers
+        self.fast_failures = [0] * server.workers
+        # The monotonic time the empty slots are respawned at
+        self.respawn_at = {}
+        self.running = False
+        self.reload = False
+        self.failed = False
+
+    def run(self) -> int:
+        """Fork the workers and supervise them until the master is stopped.
+        Returns:
+            int: The exit code, 1 when the workers kept failing at startup.
+        """
+        if not self.server.reuse_port:
+            self.server_socket = self.server.create_server_socket()
+        print_welcome_message(self.server.app)
+        self.running = True
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+        for slot in range(self.server.workers):
+            self.spawn_worker(slot)
+        while self.running:
+            if self.reload:
+                self.reload = False
+                self.restart_workers()
+            self.reap_workers()
+            self.respawn_workers()
+            time.sleep(0.5)
+        print_log("Server is shutting down.", error=True)
+        self.stop_workers()
+        if self.server_socket is not None:
+            self.server_socket.close()
+        return 1 if self.failed else 0
+
+    def handle_stop(self, signum, frame):
+        """Handle SIGTERM and SIGINT."""
+        self.running = False
+
+    def handle_reload(self, signum, frame):
+        """Handle SIGHUP."""
+        self.reload = True
+
+    def spawn_worker(self, slot: int):
+        """Fork a worker process.
+        Args:
+            slot (int): The slot of the worker.
+        """
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = slot
+            self.started_at[slot] = time.monotonic()
+            print_log(f"Worker {pid} started.")
+            return
+        # The worker stops on SIGTERM, Ctrl+C is handled by the master
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            server_socket = self.server_socket
+            if server_socket is None:
+                server_socket = self.server.create_server_socket()
+            self.server.serve(server_socket)
+        except BaseException as e:
+            print_log(f"Worker {os.getpid()} failed: {e}", error=True)
+            exit_code = 1
+        finally:
+            # os._exit skips the atexit handlers
+            close_logs()
+            os._exit(exit_code)
+
+    def reap_workers(self):
+        """Collect the exited workers and schedule the respawn of their slot,
+        after a backoff when the worker exited right after its start."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            slot = self.workers.pop(pid, None)
+            if slot is None:
+                # A worker retired by a restart
+                continue
+            print_log(
+                f"Worker {pid} exited with code {os.waitstatus_to_exitcode(status)}.",
+                error=True,
+            )
+            if not self.running:
+                continue
+            now = time.monotonic()
+            if now - self.started_at[slot] >= WORKER_MIN_UPTIME:
+                self.fast_failures[slot] = 0
+                self.respawn_at[slot] = now
+                continue
+            self.fast_failures[slot] += 1
+            if self.fast_failures[slot] >= WORKER_MAX_FAST_FAILURES:
+                print_log(
+                    f"Workers exited {self.fast_failures[slot]} times in a row right after"
+                    " their start, stopping the server.",
+                    error=True,
+                )
+                self.failed = True
+                self.running = False
+                return
+            delay = min(
+                WORKER_RESTART_BACKOFF * 2 ** (self.fast_failures[slot] - 1),
+                WORKER_MAX_RESTART_BACKOFF,
+            )
+            print_log(f"Respawning the worker in {delay:g} seconds.", error=True)
+            self.respawn_at[slot] = now + delay
+
+    def respawn_workers(self):
+        """Fork the workers of the slots whose backoff is over."""
+        now = time.monotonic()
+        for slot, respawn_at in list(self.respawn_at.items()):
+            if self.running and respawn_at <= now:
+                del self.respawn_at[slot]
+                self.spawn_worker(slot)
+
+    def restart_workers(self):
+        """Replace the workers one at a time so the port keeps being served."""
+        print_log("Restarting workers.")
+        for pid, slot in list(self.workers.items()):
+            self.spawn_worker(slot)
+            del self.workers[pid]
+            self.terminate(pid)
+
+    def stop_workers(self):
+        """Stop every worker, killing the ones still running after the grace period."""
+        workers = list(self.workers)
+        self.workers.clear()
+        for pid in workers:
+            self.terminate(pid)
+
+    def terminate(self, pid: int):
+        """Stop a worker gracefully and wait for it.
+        Args:
+            pid (int): The worker process id.
+        """
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                exited, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if exited:
+                return
+            time.sleep(0.05)
+        print_log(f"Worker {pid} did not stop in time, killing it.", error=True)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
@@ -0,0 +1,418 @@
+"""A module containing the selector (epoll on Linux) I/O engine.
+
+A single thread multiplexes every client socket with non-blocking reads and
+feeds the bytes into the request parser. Only fully parsed requests are
+handed to a small pool of worker threads that call the application. The
+socket stays non-blocking: the worker sends what the socket accepts and
+queues the rest, the event loop flushes the queue (and the files sent with
+`os.sendfile`) when the socket is writable. A body produced faster than the
+client reads it is paused once WRITE_HIGH_WATER bytes wait, and resumed in
+the pool when they are sent, so slow clients never hold a worker.
+"""
+
+import os
+import selectors
+import socket
+import time
+from collections import deque
+
+from .constant import MAX_WRITE_BUFFERS, WORKER_IDLE_TIMEOUT, WRITE_HIGH_WATER
+from .file_wrapper import FileWrapper
+from .http_request_parse import HttpParserError
+from .log import print_debug, print_log
+from .server import Session
+from .worker_pool import WorkerPool
+
+
+def advance(buffers: list, sent: int) -> list:
+    """Drop the bytes sent from the start of a list of buffers.
+    Args:
+        buffers (list): The buffers.
+        sent (int): The number of bytes sent.
+    Returns:
+        list: The buffers left to send.
+    """
+    index = 0
+    while sent:
+        size = len(buffers[index])
+        if sent >= size:
+            sent -= size
+            index += 1
+        else:
+            buffers[index] = memoryview(buffers[index])[sent:]
+            sent = 0
+    return buffers[index:]
+
+
+class Connection(Session):
+    """A client connection handled by the selector engine."""
+
+    def __init__(
+        self, client_socket: socket.socket, client_address: tuple, engine: "SelectorEngine"
+    ) -> None:
+        super().__init__(client_socket, client_address, engine.server)
+        self.engine = engine
+        self.events = 0
+        self.in_flight = False
+        self.last_activity = time.monotonic()
+        # The response bytes waiting for the socket, the file left to send
+        # and the body iterator paused at the high water mark
+        self.outgoing = []
+        self.outgoing_size = 0
+        self.file_range = None
+        self.body = None
+        self.body_iterator = None
+
+    def on_message_complete(self):
+        """Handle the message complete callback, the request is dispatched to
+        the worker pool and parsing waits until the response is written."""
+        self.request.parsed_time = time.perf_counter()
+        self.parser.pause()
+        self.in_flight = True
+        self.engine.dispatch(self)
+
+    def handle_request(self):
+        """Call the application and write the response until it is done or
+        paused, this runs in a worker thread."""
+        try:
+            self.start_request()
+            succeeded = True
+        except Exception as e:
+            print_log(f"An error occurred: {e}", error=True)
+            self.close_body()
+            succeeded = False
+        self.engine.complete(self, succeeded)
+
+    def resume_request(self):
+        """Write the rest of a paused body, this runs in a worker thread."""
+        try:
+            self.write_body()
+            succeeded = True
+        except Exception as e:
+            print_log(f"An error occurred: {e}", error=True)
+            self.close_body()
+            succeeded = False
+        self.engine.complete(self, succeeded)
+
+    def start_request(self):
+        """Call the application and start writing its response."""
+        environ = self.prepare_environ()
+        self.response.send = self.send_buffers
+        try:
+            self.body = self.get_app(environ)(environ, self.response.start_response)
+        except Exception as e:
+            self.internal_error(e)
+            return
+        finally:
+            self.request.app_end_time = time.perf_counter()
+        if isinstance(self.body, FileWrapper):
+            try:
+                self.file_range = self.response.start_file(self.body)
+            except Exception:
+                self.close_body()
+                raise
+            if self.file_range is not None:
+                filelike, offset, count = self.file_range
+                self.file_range = [filelike.fileno(), offset, count, count]
+                if not count:
+                    self.finish_file()
+                return
+        self.response.set_length_hint(self.body)
+        self.body_iterator = iter(self.body)
+        self.write_body()
+
+    def write_body(self):
+        """Write the body chunks until the body ends or WRITE_HIGH_WATER
+        bytes wait for the client."""
+        done = False
+        try:
+            for chunk in self.body_iterator:
+                self.response.write(chunk)
+                if self.outgoing_size >= WRITE_HIGH_WATER:
+                    return
+            done = True
+            self.response.finish()
+        except Exception as e:
+            done = True
+            if self.response.headers_sent:
+                raise
+            self.internal_error(e)
+        finally:
+            if done:
+                self.close_body()
+
+    def close_body(self):
+        """Close the iterable of the application once the body is written."""
+        body, self.body, self.body_iterator = self.body, None, None
+        close = getattr(body, "close", None)
+        if close is not None:
+            close()
+        self.keep_alive = self.keep_alive and self.response.keep_alive
+
+    def finish_file(self):
+        """Mark the file of a `wsgi.file_wrapper` body sent."""
+        self.response.finish_file(self.file_range[3])
+        self.file_range = None
+        self.close_body()
+
+    def send_buffers(self, buffers: list):
+        """Send what the socket accepts without blocking and queue the rest.
+        Args:
+            buffers (list): The buffers to send.
+        """
+        buffers = list(buffers)
+        if not self.outgoing:
+            try:
+                sent = self.client_socket.sendmsg(buffers[:MAX_WRITE_BUFFERS])
+            except BlockingIOError:
+                sent = 0
+            buffers = advance(buffers, sent)
+        if buffers:
+            self.outgoing.extend(buffers)
+            self.outgoing_size += sum(len(buffer) for buffer in buffers)
+
+    def flush(self) -> bool:
+        """Send the queued bytes and the file without blocking, from the event loop.
+        Returns:
+            bool: Whether everything queued was sent.
+        """
+        while self.outgoing:
+            try:
+                sent = self.client_socket.sendmsg(self.outgoing[:MAX_WRITE_BUFFERS])
+            except BlockingIOError:
+                return False
+            if not sent:
+                return False
+            self.last_activity = time.monotonic()
+            self.outgoing = advance(self.outgoing, sent)
+            self.outgoing_size -= sent
+        while self.file_range is not None:
+            fd, offset, count, total = self.file_range
+            if not count:
+                self.finish_file()
+                break
+            try:
+                sent = os.sendfile(self.client_socket.fileno(), fd, offset, count)
+            except BlockingIOError:
+                return False
+            if not sent:
+                # The file is shorter than announced, the response cannot be completed
+                raise ConnectionError("The file ended before Content-Length bytes were sent.")
+            self.last_activity = time.monotonic()
+            self.file_range = [fd, offset + sent, count - sent, total]
+        return True
+
+
+class SelectorEngine:
+    """A class representing the selector based event loop."""
+
+    def __init__(self, server) -> None:
+        self.server = server
+        self.selector = selectors.DefaultSelector()
+        self.worker_pool = WorkerPool(
+            server.selector_workers,
+            server.selector_workers,
+            server.queue_size,
+            WORKER_IDLE_TIMEOUT,
+            name="selector-worker",
+        )
+        server.worker_pool = self.worker_pool
+        self.connections = {}
+        # Responses produced by the workers, waiting to be written by the loop
+        self.completed = deque()
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+        self.wakeup_reader.setblocking(False)
+        self.wakeup_writer.setblocking(False)
+
+    def serve(self, server_socket: socket.socket):
+        """Run the event loop.
+        Args:
+            server_socket (socket.socket): The listening socket.
+        """
+        server_socket.setblocking(False)
+        self.worker_pool.start()
+        self.selector.register(server_socket, selectors.EVENT_READ)
+        self.selector.register(self.wakeup_reader, selectors.EVENT_READ)
+        next_sweep = time.monotonic() + 1
+        try:
+            while True:
+                for key, events in self.selector.select(timeout=1):
+                    if key.fileobj is server_socket:
+                        self.accept(server_socket)
+                    elif key.fileobj is self.wakeup_reader:
+                        self.drain_completed()
+                    elif events & selectors.EVENT_WRITE:
+                        self.write(key.data)
+                    else:
+                        self.read(key.data)
+                if time.monotonic() >= next_sweep:
+                    self.close_idle_connections()
+                    next_sweep = time.monotonic() + 1
+        except KeyboardInterrupt:
+            print_log("Server is shutting down.", error=True)
+        finally:
+            for connection in list(self.connections.values()):
+                self.close(connection)
+            self.worker_pool.shutdown()
+            self.selector.close()
+            self.wakeup_reader.close()
+            self.wakeup_writer.close()
+
+    def accept(self, server_socket: socket.socket):
+        """Accept every pending connection."""
+        while True:
+            try:
+                client_socket, client_address = server_socket.accept()
+            except BlockingIOError:
+                return
+            print_debug(f"Socket established with {client_address}.")
+            client_socket.setblocking(False)
+            connection = Connection(client_socket, client_address, self)
+            self.connections[client_socket.fileno()] = connection
+            self.set_events(connection, selectors.EVENT_READ)
+
+    def read(self, connection: Connection):
+        """Read the available data of a connection and parse it."""
+        connection.last_activity = time.monotonic()
+        try:
+            received = connection.parser.recv_into(
+                connection.client_socket, self.server.buffer_size
+            )
+        except BlockingIOError:
+            return
+        except ConnectionError:
+            received = 0
+        except HttpParserError as e:
+            self.reject(connection, e)
+            return
+        if not received:
+            # The client closed the connection
+            self.close(connection)
+
+    def reject(self, connection: Connection, error: HttpParserError):
+        """Answer a request rejected by the parser and close the connection.
+        Args:
+            connection (Connection): The connection.
+            error (HttpParserError): The parser error.
+        """
+        try:
+            connection.client_socket.send(connection.error_response(error))
+        except OSError:
+            pass
+        self.close(connection)
+
+    def write(self, connection: Connection):
+        """Flush the queued response of a writable connection."""
+        try:
+            flushed = connection.flush()
+        except OSError:
+            self.close(connection)
+            return
+        if flushed:
+            self.response_written(connection)
+
+    def response_written(self, connection: Connection):
+        """Resume a paused body or finish the request once its queued bytes are sent.
+        Args:
+            connection (Connection): The connection.
+        """
+        if connection.body_iterator is not None:
+            self.set_events(connection, 0)
+            connection.in_flight = True
+            self.worker_pool.submit(connection.resume_request)
+            return
+        connection.finish_request()
+        if not connection.keep_alive:
+            self.close(connection)
+            return
+        self.set_events(connection, selectors.EVENT_READ)
+        # Parse the pipelined requests already buffered
+        try:
+            connection.parser.resume()
+        except HttpParserError as e:
+            self.reject(connection, e)
+
+    def dispatch(self, connection: Connection):
+        """Hand a parsed request to the worker pool.
+        Args:
+            connection (Connection): The connection with a complete request.
+        """
+        # Stop reading while the request is processed, the kernel buffers the rest
+        self.set_events(connection, 0)
+        # Blocks the loop while the queue is full, new requests wait in the kernel
+        self.worker_pool.submit(connection.handle_request)
+
+    def complete(self, connection: Connection, succeeded: bool):
+        """Queue a request handled by a worker and wake up the event loop.
+        Args:
+            connection (Connection): The connection the request belongs to.
+            succeeded (bool): Whether the response was sent.
+        """
+        self.completed.append((connection, succeeded))
+        try:
+            self.wakeup_writer.send(b"\0")
+        except BlockingIOError:
+            # The loop has pending wake ups already
+            pass
+
+    def drain_completed(self):
+        """Take back the connections whose response has been sent."""
+        try:
+            while self.wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self.completed:
+            connection, succeeded = self.completed.popleft()
+            if connection.client_socket.fileno() == -1:
+                continue
+            connection.in_flight = False
+            connection.last_activity = time.monotonic()
+            if not succeeded:
+                self.close(connection)
+                continue
+            if connection.outgoing or connection.file_range is not None:
+                # The client is slower than the response, the loop writes the rest
+                self.set_events(connection, selectors.EVENT_WRITE)
+                continue
+            self.response_written(connection)
+
+    def set_events(self, connection: Connection, events: int):
+        """Update the events the selector waits for on a connection.
+        Args:
+            connection (Connection): The connection.
+            events (int): The selector events, 0 to stop watching the socket.
+        """
+        if events == connection.events:
+            return
+        if not events:
+            self.selector.unregister(connection.client_socket)
+        elif not connection.events:
+            self.selector.register(connection.client_socket, events, connection)
+        else:
+            self.selector.modify(connection.client_socket, events, connection)
+        connection.events = events
+
+    def close_idle_connections(self):
+        """Close the connections idle for longer than the keep-alive timeout,
+        including the clients reading no response byte for that long."""
+        deadline = time.monotonic() - self.server.keep_alive_timeout
+        for connection in list(self.connections.values()):
+            if not connection.in_flight and connection.last_activity < deadline:
+                self.close(connection)
+
+    def close(self, connection: Connection):
+        """Close a connection.
+        Args:
+            connection (Connection): The connection to close.
+        """
+        if connection.client_socket.fileno() == -1:
+            return
+        self.set_events(connection, 0)
+        self.connections.pop(connection.client_socket.fileno(), None)
+        if not connection.in_flight and connection.body is not None:
+            # A body paused or a file waiting for a client that went away
+            connection.close_body()
+        connection.client_socket.close()
+        connection.connection_closed()
+        print_debug(f"Socket closed with {connection.client_address}.")
@@ -1,103 +1,395 @@
 """A module containing the WSGI server implementation."""
 
 import socket
-import threading
 import sys
+import time
 
-from .constant import BUFFER_ZISE
-from .wsgi import WSGIResponse, WSGIRequest
-from .http_request_parse import HttpRequestParser
-from .log import log_request, print_log
-from .utils import print_welcome_message
+from .constant import (
+    BUFFER_ZISE,
+    GRACEFUL_TIMEOUT,
+    KEEP_ALIVE_TIMEOUT,
+    MAX_KEEP_ALIVE_REQUESTS,
+    LISTEN_BACKLOG,
+    MAX_THREADS,
+    MIN_THREADS,
+    QUEUE_SIZE,
+    SELECTOR_WORKERS,
+    WORKER_IDLE_TIMEOUT,
+)
+from .enums import AccessLogFormat, ServerEngine
+from ..application.static import StaticFiles
+from ..metrics import ROUTE_ENVIRON_KEY, metrics_app, registry
+from ..tracing import (
+    REQUEST_ID_ENVIRON_KEY,
+    TRACE_BUFFER_SIZE,
+    TRACE_ENVIRON_KEY,
+    get_request_id,
+    tracer,
+)
+from .wsgi import WSGIResponse, WSGIRequest, make_base_environ
+from .http_request_parse import HttpParserError, HttpRequestParser
+from .file_wrapper import FileWrapper
+from .http_response import make_response
+from .log import configure_logging, log_request, needs_request_id, print_debug, print_log
+from .prefork import PreforkMaster
+from .utils import get_directory_path, print_welcome_message
+from .worker_pool import WorkerPool
+
+CONNECTIONS_ACTIVE = registry.gauge("http_connections_active", "Open client connections.")
+CONNECTIONS_TOTAL = registry.counter("http_connections_total", "Accepted client connections.")
+REQUESTS_TOTAL = registry.counter(
+    "http_requests_total", "Answered requests.", ("route", "method", "status")
+)
+REQUEST_BYTES = registry.counter(
+    "http_request_bytes_total", "Bytes received in the requests.", ("route",)
+)
+RESPONSE_BYTES = registry.counter(
+    "http_response_bytes_total", "Bytes sent in the responses.", ("route",)
+)
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Seconds from the request line to the end of the response.",
+    ("route", "method"),
+)
+PHASE_DURATION = registry.histogram(
+    "http_request_phase_seconds",
+    "Seconds spent parsing the request, waiting for a thread, in the application call and sending the response.",
+    ("route", "phase"),
+)
 
 
 class WSGIServer:
     """A class representing a WSGI server."""
 
     def __init__(
-        self, host: str = "localhost", port: int = 8080, app: callable = None
+        self,
+        host: str = "localhost",
+        port: int = 8080,
+        app: callable = None,
+        keep_alive_timeout: float = KEEP_ALIVE_TIMEOUT,
+        max_keep_alive_requests: int = MAX_KEEP_ALIVE_REQUESTS,
+        engine: ServerEngine = ServerEngine.THREADED,
+        selector_workers: int = SELECTOR_WORKERS,
+        min_threads: int = MIN_THREADS,
+        max_threads: int = MAX_THREADS,
+        queue_size: int = QUEUE_SIZE,
+        listen_backlog: int = LISTEN_BACKLOG,
+        workers: int = 1,
+        reuse_port: bool = False,
+        buffer_size: int = BUFFER_ZISE,
+        directory: str = None,
+        access_log: str = None,
+        error_log: str = None,
+        access_log_format: str = AccessLogFormat.DEFAULT,
+        access_log_sampling: dict = None,
+        debug: bool = False,
+        script_name: str = "",
+        metrics_path: str = None,
+        trace_path: str = None,
+        trace_buffer_size: int = TRACE_BUFFER_SIZE,
+        slow_request_threshold: float = None,
     ) -> None:
+        """Initialize the WSGI server.
+        Args:
+            host (str): The host to bind.
+            port (int): The port to bind.
+            app (callable): The WSGI application.
+            keep_alive_timeout (float): Seconds an idle connection is kept open.
+            max_keep_alive_requests (int): Requests served per connection before closing it.
+            engine (ServerEngine): The I/O engine, a thread per connection, a
+                selector event loop multiplexing all the connections or an
+                asyncio event loop awaiting the async handlers.
+            selector_workers (int): Threads calling the application in the selector engine.
+            min_threads (int): Session threads kept alive in the threaded engine.
+            max_threads (int): Upper limit of session threads in the threaded engine,
+                or of executor threads running sync handlers in the asyncio engine.
+            queue_size (int): Accepted connections (or parsed requests in the selector
+                engine) waiting for a free thread before the server stops accepting.
+            listen_backlog (int): Connections the kernel queues while the server is busy.
+            workers (int): Worker processes forked by a master process, 1 serves
+                from the current process.
+            reuse_port (bool): Each worker binds its own socket with SO_REUSEPORT
+                instead of sharing the socket bound by the master.
+            buffer_size (int): Bytes received from a socket at once.
+            directory (str): The directory served when there is no application,
+                defaults to the --directory command line argument.
+            access_log (str): The access log file, stdout by default.
+            error_log (str): The error log file, stdout by default.
+            access_log_format (str): "default", "common", "combined", "json" or
+                a format string using the access log fields.
+            access_log_sampling (dict): The share of the requests logged (0 to 1)
+                by path prefix, the errors are always logged.
+            debug (bool): Log the per-connection and per-request debug messages.
+            script_name (str): The path the application is mounted at behind a
+                proxy, it is moved from PATH_INFO to SCRIPT_NAME.
+            metrics_path (str): Record the metrics and answer them at this
+                path in the Prometheus text format, e.g. "/metrics".
+            trace_path (str): Trace the phases of the requests and answer the
+                recent traces at this path in the Chrome trace event format,
+                e.g. "/_trace".
+            trace_buffer_size (int): The recent traces kept.
+            slow_request_threshold (float): Trace the requests and log the
+                ones taking at least these seconds, their traces are kept apart.
+        """
         self.host = host
         self.port = port
         self.app = app
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_keep_alive_requests = max_keep_alive_requests
+        self.engine = ServerEngine(engine)
+        self.selector_workers = selector_workers
+        self.min_threads = min_threads
+        self.max_threads = max_threads
+        self.queue_size = queue_size
+        self.listen_backlog = listen_backlog
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.buffer_size = buffer_size
+        self.script_name = script_name
+        self.base_environ = None
+        self.worker_pool = None
+        self.metrics_path = metrics_path
+        if metrics_path is not None:
+            self.enable_metrics()
+        configure_logging(
+            access_log=access_log,
+            error_log=error_log,
+            access_log_format=access_log_format,
+            access_log_sampling=access_log_sampling,
+            debug=debug,
+        )
+        self.trace_path = trace_path
+        if trace_path is not None or slow_request_threshold is not None:
+            tracer.enable(trace_buffer_size, slow_request_threshold)
+        # The request IDs are only generated when something shows them
+        self.request_ids = tracer.enabled or needs_request_id()
 
         if self.app is None:
-            # TODO: run the server statically without an app
-            print_log("Please provide a WSGI application.", error=True)
-            sys.exit(1)
+            # Run the server statically without an app
+            directory = directory or get_directory_path()
+            if directory is None:
+                print_log("Please provide a WSGI application or a directory.", error=True)
+                sys.exit(1)
+            self.app = StaticFiles(directory)
+
+    def enable_metrics(self):
+        """Record the metrics, with the utilization of the thread pool."""
+        registry.enable()
+        for name, documentation, stat in (
+            ("server_threads", "Threads of the worker pool.", "threads"),
+            ("server_threads_busy", "Threads of the worker pool running a task.", "busy_threads"),
+            ("server_queued_tasks", "Tasks waiting for a thread of the worker pool.", "queued_tasks"),
+        ):
+            registry.gauge(name, documentation, function=lambda stat=stat: self.get_pool_stat(stat))
+
+    def get_pool_stat(self, name: str) -> dict:
+        """Get a counter of the worker pool as gauge values."""
+        if self.worker_pool is None:
+            return {}
+        return {(): self.worker_pool.stats()[name]}
 
     def server_forever(self):
         """Run the server."""
+        self.app.host = self.host
+        self.app.port = self.port
+        # Build the lookup structures once, before the workers are forked
+        freeze = getattr(self.app, "freeze", None)
+        if freeze is not None:
+            freeze()
+        exit_code = 0
+        if self.workers > 1:
+            exit_code = PreforkMaster(self).run()
+        else:
+            server_socket = self.create_server_socket()
+            # Print the welcome message
+            print_welcome_message(self.app)
+            self.serve(server_socket)
+        # Print the server shutdown message
+        print_log("Server has been shutdown.", error=True)
+        sys.exit(exit_code)  # Exit the program
+
+    def serve(self, server_socket: socket.socket):
+        """Serve the connections of a listening socket with the configured engine.
+        Args:
+            server_socket (socket.socket): The listening socket.
+        """
+        self.base_environ = self.get_base_environ(server_socket)
+        try:
+            # Imported here, the other engines build on top of Session
+            if self.engine == ServerEngine.SELECTOR:
+                from .selector_engine import SelectorEngine
+
+                SelectorEngine(self).serve(server_socket)
+            elif self.engine == ServerEngine.ASYNCIO:
+                from .asyncio_engine import AsyncioEngine
+
+                AsyncioEngine(self).serve(server_socket)
+            else:
+                self.serve_threaded(server_socket)
+        finally:
+            # Close the server socket
+            server_socket.close()
+
+    def create_server_socket(self) -> socket.socket:
+        """Create the listening socket.
+        Returns:
+            socket.socket: The server socket.
+        """
         # Create a TCP server socket
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)  # IPv4, TCP
-        server_socket.bind((self.host, self.port))  # Bind the socket to the address
         server_socket.setsockopt(
             socket.SOL_SOCKET, socket.SO_REUSEADDR, 1
         )  # Reuse the address
-        server_socket.listen(1)  # Listen for incoming connections
-        self.app.host = self.host
-        self.app.port = self.port
-        # Print the welcome message
-        print_welcome_message(self.app)
+        if self.reuse_port:
+            # Let every worker bind the port, the kernel balances the connections
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        server_socket.bind((self.host, self.port))  # Bind the socket to the address
+        server_socket.listen(self.listen_backlog)  # Listen for incoming connections
+        return server_socket
+
+    def get_base_environ(self, server_socket: socket.socket) -> dict:
+        """Build the environ keys shared by the requests of a listening socket.
+        Args:
+            server_socket (socket.socket): The listening socket.
+        Returns:
+            dict: The base environ.
+        """
+        server_port = server_socket.getsockname()[1]
+        server_name = self.host
+        if server_name in ("", "0.0.0.0", "::"):
+            server_name = socket.gethostname()
+        return make_base_environ(
+            server_name, server_port, self.script_name, multiprocess=self.workers > 1
+        )
+
+    def serve_threaded(self, server_socket: socket.socket):
+        """Serve the connections with a bounded pool of session threads.
+        Args:
+            server_socket (socket.socket): The listening socket.
+        """
+        self.worker_pool = WorkerPool(
+            self.min_threads,
+            self.max_threads,
+            self.queue_size,
+            WORKER_IDLE_TIMEOUT,
+            name="session",
+        )
+        self.worker_pool.start()
         # Keep the server running forever
         while True:
             try:
                 # Accept the connection from TCP client
                 client_socket, client_address = server_socket.accept()
-                print_log(f"Socket established with {client_address}.")
+                print_debug(f"Socket established with {client_address}.")
                 # Create a session for the client
-                session = Session(client_socket, client_address, self.app)
-                # Create a thread to handle the client connection
-                thread = threading.Thread(
-                    target=session.run,
-                )
-                # Start the thread
-                thread.start()
+                session = Session(client_socket, client_address, self)
+                # Wait for room in the queue, meanwhile the backlog absorbs new connections
+                self.worker_pool.submit(session.run)
             except KeyboardInterrupt:
                 print_log("Server is shutting down.", error=True)
-                server_socket.close()
                 break
             except Exception as e:
                 print_log(f"An error occurred: {e}", error=True)
-                server_socket.close()
                 break
-        # Close the server socket
-        server_socket.close()
-        # Print the server shutdown message
-        print_log("Server has been shutdown.", error=True)
-        sys.exit(0)  # Exit the program
+        self.worker_pool.shutdown(timeout=GRACEFUL_TIMEOUT)
 
 
 class Session:
-    """A class representing a session."""
+    """A class representing a session.
+
+    A session serves every request sent over one client connection, it is
+    kept open between requests (HTTP keep-alive) until the client asks to
+    close it, it stays idle for too long or it reaches the request limit.
+    """
 
     def __init__(
-        self, client_socket: socket.socket, client_address: tuple, app: callable
+        self, client_socket: socket.socket, client_address: tuple, server: WSGIServer
     ) -> None:
         self.client_socket = client_socket
         self.client_address = client_address
-        self.app = app
-        self.parser = HttpRequestParser(self)
+        self.server = server
+        self.app = server.app
+        self.parser = HttpRequestParser(self, server.buffer_size)
         self.response = WSGIResponse()
         self.request = WSGIRequest()
+        self.requests_handled = 0
+        self.keep_alive = True
+        self.environ = None
+        self.trace = None
+        self.accepted_time = time.perf_counter()
+        if registry.enabled:
+            CONNECTIONS_ACTIVE.inc()
+            CONNECTIONS_TOTAL.inc()
 
     def run(self):
         """Run the server."""
-        while True:
-            if self.response.is_sent:
-                break
-            data = self.client_socket.recv(BUFFER_ZISE)
-            self.parser.feed_data(data)
-        self.client_socket.close()
-        print_log(f"Socket closed with {self.client_address}.")
+        self.client_socket.settimeout(self.server.keep_alive_timeout)
+        try:
+            while self.keep_alive:
+                received = self.parser.recv_into(self.client_socket, self.server.buffer_size)
+                if not received:
+                    # The client closed the connection
+                    break
+        except HttpParserError as e:
+            self.client_socket.sendall(self.error_response(e))
+        except (TimeoutError, ConnectionError):
+            pass
+        finally:
+            self.client_socket.close()
+            self.connection_closed()
+            print_debug(f"Socket closed with {self.client_address}.")
+
+    def connection_closed(self):
+        """Count the connection closed."""
+        if registry.enabled:
+            CONNECTIONS_ACTIVE.dec()
+
+    def should_keep_alive(self) -> bool:
+        """Check if the connection can be reused after the current request.
+        HTTP/1.1 connections are persistent unless the client sends
+        `Connection: close`, HTTP/1.0 ones only with `Connection: keep-alive`.
+        Returns:
+            bool: Whether the connection should be kept open.
+        """
+        if self.requests_handled >= self.server.max_keep_alive_requests:
+            return False
+        connection = (self.request.get_header("Connection") or "").lower()
+        if self.request.http_version == "HTTP/1.1":
+            return connection != "close"
+        return connection == "keep-alive"
+
+    def error_response(self, error: HttpParserError) -> bytes:
+        """Build the response to a request the parser rejected, the
+        connection is closed after it.
+        Args:
+            error (HttpParserError): The parser error.
+        Returns:
+            bytes: The HTTP response message.
+        """
+        print_log(f"Bad request from {self.client_address}: {error}", error=True)
+        self.keep_alive = False
+        self.parser.pause()
+        body = str(error).encode("utf-8")
+        headers = [
+            ("Content-Type", "text/plain"),
+            ("Content-Length", str(len(body))),
+            ("Connection", "close"),
+        ]
+        return make_response(error.status, headers, body)
+
+    def on_message_begin(self):
+        """Handle the message begin callback, the first byte of a request was received."""
+        self.request.first_byte_time = time.perf_counter()
 
     def on_url(self, url: bytes):
         """Handle the URL callback.
         Args:
             url (bytes): The URL.
         """
-        print_log(f"Received url: {url}")
+        print_debug(f"Received url: {url}")
+        self.request.start_time = time.perf_counter()
         self.request.http_method = self.parser.http_method.decode("utf-8")
+        self.request.http_version = self.parser.http_version.decode("utf-8")
         self.request.path = url.decode("utf-8")
 
     def on_header(self, name: bytes, value: bytes):
@@ -109,6 +401,10 @@ class Session:
         # print_log(f"Received header: ({name}, {value})")
         self.request.headers.append((name.decode("utf-8"), value.decode("utf-8")))
 
+    def on_headers_complete(self):
+        """Handle the headers complete callback."""
+        self.request.headers_time = time.perf_counter()
+
     def on_body(self, body: bytes):
         """Handle the body callback.
         Args:
@@ -116,14 +412,192 @@ class Session:
         """
         # print_log(f"Received body: {body}")
         self.request.body.write(body)
-        self.request.body.seek(0)
 
     def on_message_complete(self):
         """Handle the message complete callback"""
-        print_log("Received request completely.")
-        environ = self.request.to_environ()
-        body_chunks = self.app(environ, self.response.start_response)
-        # print_log("App callable has returned.")
-        self.response.body = b"".join(body_chunks)
-        self.client_socket.send(self.response.to_http())
+        print_debug("Received request completely.")
+        self.request.parsed_time = time.perf_counter()
+        self.process_request()
+        self.finish_request()
+
+    def process_request(self):
+        """Call the application with the parsed request and stream the
+        response to the client."""
+        environ = self.prepare_environ()
+        self.response.send = self.send_buffers
+        try:
+            body_chunks = self.get_app(environ)(environ, self.response.start_response)
+        except Exception as e:
+            self.internal_error(e)
+            return
+        finally:
+            self.request.app_end_time = time.perf_counter()
+        try:
+            if not (isinstance(body_chunks, FileWrapper) and self.send_file(body_chunks)):
+                self.response.set_length_hint(body_chunks)
+                for chunk in body_chunks:
+                    self.response.write(chunk)
+                self.response.finish()
+        except Exception as e:
+            if self.response.headers_sent:
+                raise
+            self.internal_error(e)
+        finally:
+            # print_log("App callable has returned.")
+            close = getattr(body_chunks, "close", None)
+            if close is not None:
+                close()
+        self.keep_alive = self.response.keep_alive
+
+    def prepare_environ(self) -> dict:
+        """Count the request and build its WSGI environ.
+        Returns:
+            dict: The WSGI environ.
+        """
+        self.requests_handled += 1
+        self.request.body.seek(0)
+        self.response.prepare(self.request, self.should_keep_alive())
+        self.environ = self.request.to_environ(self.server.base_environ, self.client_address)
+        if self.server.request_ids:
+            request_id = self.request.request_id = get_request_id(self.environ)
+            self.environ[REQUEST_ID_ENVIRON_KEY] = request_id
+            if tracer.enabled:
+                self.trace = self.environ[TRACE_ENVIRON_KEY] = tracer.start(request_id)
+        self.request.app_start_time = time.perf_counter()
+        return self.environ
+
+    def get_app(self, environ: dict):
+        """Get the application answering a request, the metrics or traces
+        endpoint or the server application."""
+        path = environ["PATH_INFO"]
+        if path == self.server.metrics_path:
+            return metrics_app
+        if path == self.server.trace_path:
+            return tracer.trace_app
+        return self.app
+
+    def internal_error(self, error: Exception):
+        """Answer 500 when the application fails before sending the headers.
+        Args:
+            error (Exception): The application error.
+        """
+        print_log(f"An error occurred: {error}", error=True)
+        self.response.status = ""
+        self.response.start_response(
+            "500 Internal Server Error", [("Content-Type", "text/plain")]
+        )
+        body = b"Internal Server Error"
+        self.response.keep_alive = False
+        self.response.content_length = len(body)
+        self.response.pending = []
+        self.response.pending_size = 0
+        self.response.write(body)
+        self.response.finish()
+        self.keep_alive = False
+
+    def send_file(self, file_wrapper: FileWrapper) -> bool:
+        """Send a `wsgi.file_wrapper` body with zero-copy `os.sendfile`.
+        Args:
+            file_wrapper (FileWrapper): The body returned by the application.
+        Returns:
+            bool: Whether the file was sent, False when it must be iterated.
+        """
+        file_range = self.response.start_file(file_wrapper)
+        if file_range is None:
+            return False
+        filelike, offset, count = file_range
+        if count:
+            self.client_socket.sendfile(filelike, offset, count)
+        self.response.finish_file(count)
+        return True
+
+    def send_buffers(self, buffers: list):
+        """Send the buffers with scatter/gather I/O, handling partial sends.
+        Args:
+            buffers (list): The buffers to send.
+        """
+        buffers = list(buffers)
+        while buffers:
+            sent = self.client_socket.sendmsg(buffers)
+            while sent:
+                size = len(buffers[0])
+                if sent >= size:
+                    sent -= size
+                    buffers.pop(0)
+                else:
+                    buffers[0] = memoryview(buffers[0])[sent:]
+                    sent = 0
+
+    def finish_request(self):
+        """Log the request once the response is sent and get ready for the next one."""
+        if registry.enabled:
+            self.record_metrics()
+        if self.trace is not None:
+            self.record_trace()
         log_request(self.client_address, self.request, self.response)
+        self.request = WSGIRequest()
+        self.environ = None
+        self.trace = None
+        self.response = WSGIResponse()
+        if not self.keep_alive:
+            self.parser.pause()
+
+    def record_metrics(self):
+        """Record the metrics of the request once the response is sent."""
+        request, response = self.request, self.response
+        if not request.start_time or self.environ is None:
+            return
+        now = time.perf_counter()
+        route = self.environ.get(ROUTE_ENVIRON_KEY)
+        if route is None:
+            app = self.get_app(self.environ)
+            route = "metrics" if app is metrics_app else "traces" if app == tracer.trace_app else "unmatched"
+        REQUESTS_TOTAL.inc((route, request.http_method, response.status[:3]))
+        received = len(request.http_method) + len(request.path) + len(request.http_version) + 6
+        for name, value in request.headers:
+            received += len(name) + len(value) + 4
+        REQUEST_BYTES.inc((route,), received + request.body.seek(0, 2))
+        RESPONSE_BYTES.inc((route,), response.bytes_sent)
+        REQUEST_DURATION.observe(now - request.start_time, (route, request.http_method))
+        parsed = request.parsed_time or request.app_start_time
+        PHASE_DURATION.observe(parsed - request.start_time, (route, "parse"))
+        PHASE_DURATION.observe(request.app_start_time - parsed, (route, "queue"))
+        PHASE_DURATION.observe(request.app_end_time - request.app_start_time, (route, "app"))
+        PHASE_DURATION.observe(now - request.app_end_time, (route, "send"))
+
+    def record_trace(self):
+        """Add the server phases to the trace of the request once the
+        response is sent, keep it and log it when the request is slow."""
+        trace, request = self.trace, self.request
+        now = time.perf_counter()
+        first_byte = request.first_byte_time or request.start_time
+        headers = request.headers_time or first_byte
+        parsed = request.parsed_time or headers
+        app_start = request.app_start_time or parsed
+        app_end = request.app_end_time or app_start
+        if self.requests_handled == 1:
+            # In the threaded engine this includes the wait for a session thread
+            trace.add_instant("accept", self.accepted_time)
+            trace.add_span("connection wait", self.accepted_time, first_byte, "server")
+        trace.start, trace.end = first_byte, now
+        trace.args = {
+            "request_id": trace.request_id,
+            "method": request.http_method,
+            "path": request.path,
+            "route": self.environ.get(ROUTE_ENVIRON_KEY, "unmatched"),
+            "status": self.response.status,
+            "bytes": self.response.bytes_sent,
+        }
+        trace.add_span("request", first_byte, now, "server", trace.args)
+        trace.add_span("read headers", first_byte, headers, "parser")
+        trace.add_span("read body", headers, parsed, "parser")
+        trace.add_span("queue", parsed, app_start, "server")
+        trace.add_span("app", app_start, app_end, "server")
+        trace.add_span("send", app_end, now, "server")
+        if tracer.finish(trace):
+            print_log(
+                f"Slow request {trace.request_id}: {request.http_method} {request.path}"
+                f" took {(now - first_byte) * 1000:.1f} ms (read {(parsed - first_byte) * 1000:.1f} ms,"
+                f" queue {(app_start - parsed) * 1000:.1f} ms, app {(app_end - app_start) * 1000:.1f} ms,"
+                f" send {(now - app_end) * 1000:.1f} ms)."
+            )
@@ -1,28 +1,106 @@
 """SplitBuffer class for splitting data."""
 
+from .constant import BUFFER_ZISE
+
 
 class SplitBuffer:
-    """SplitBuffer class."""
+    """SplitBuffer class.
+
+    The data lives in a preallocated `bytearray` between a read offset
+    (`start`) and a write offset (`end`). Consumed data is not copied away,
+    the offsets move instead and the unread bytes are compacted to the front
+    only when room is needed for new data. Sockets can receive straight into
+    the free space with `recv_into`.
+    """
+
+    def __init__(self, size: int = BUFFER_ZISE):
+        """Initialize the buffer.
+        Args:
+            size (int): The initial capacity in bytes.
+        """
+        self.size = size
+        self.data = bytearray(size)
+        self.start = 0
+        self.end = 0
+        # Position where the next separator search starts, bytes before it
+        # are known not to contain the separator
+        self.scan_from = 0
 
-    def __init__(self):
-        self.data = b""
+    def __len__(self):
+        return self.end - self.start
+
+    def reserve(self, size: int):
+        """Make room for at least size bytes after the data."""
+        if self.start == self.end:
+            self.start = self.end = self.scan_from = 0
+            if len(self.data) > 4 * self.size:
+                # Give back the memory taken by a large message
+                self.data = bytearray(self.size)
+        if len(self.data) - self.end >= size:
+            return
+        if self.start:
+            unread = self.end - self.start
+            self.data[:unread] = self.data[self.start : self.end]
+            self.scan_from -= self.start
+            self.start, self.end = 0, unread
+        missing = size - (len(self.data) - self.end)
+        if missing > 0:
+            self.data.extend(bytes(max(missing, len(self.data))))
 
     def feed_data(self, data: bytes):
         """Feed data to the buffer."""
-        self.data += data
+        self.reserve(len(data))
+        self.data[self.end : self.end + len(data)] = data
+        self.end += len(data)
+
+    def get_write_buffer(self, size: int) -> memoryview:
+        """Get a writable view of the free space, to be followed by `commit`.
+        Args:
+            size (int): The number of bytes to make room for.
+        Returns:
+            memoryview: The free space after the data.
+        """
+        self.reserve(size)
+        return memoryview(self.data)[self.end : self.end + size]
+
+    def commit(self, size: int):
+        """Mark size bytes written in the write buffer as data."""
+        self.end += size
+
+    def recv_into(self, sock, size: int) -> int:
+        """Receive data from a socket straight into the buffer.
+        Args:
+            sock (socket.socket): The socket.
+            size (int): The maximum number of bytes to receive.
+        Returns:
+            int: The number of bytes received, 0 when the peer closed the connection.
+        """
+        self.reserve(size)
+        with memoryview(self.data) as view:
+            received = sock.recv_into(view[self.end : self.end + size], size)
+        self.end += received
+        return received
 
     def pop(self, separator: bytes):
         """Pop data from the buffer."""
-        first, *rest = self.data.split(separator, maxsplit=1)
+        index = self.data.find(separator, self.scan_from, self.end)
         # no split was possible
-        if not rest:
+        if index == -1:
+            # Only the new bytes are searched next time
+            self.scan_from = max(self.start, self.end - len(separator) + 1)
             return None
-        else:
-            self.data = separator.join(rest)
-            return first
+        first = bytes(self.data[self.start : index])
+        self.start = self.scan_from = index + len(separator)
+        return first
+
+    def read(self, size: int):
+        """Read at most size bytes from the buffer."""
+        size = min(size, self.end - self.start)
+        temp = bytes(self.data[self.start : self.start + size])
+        self.start += size
+        self.scan_from = max(self.scan_from, self.start)
+        return temp
 
     def flush(self):
         """Flush the buffer."""
-        temp = self.data
-        self.data = b""
-        return temp
+        return self.read(self.end - self.start)
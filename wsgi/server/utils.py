@@ -29,6 +29,9 @@ def print_welcome_message(app):
 
 def print_avaliabe_endpoints(app):
     """Print the available endpoints."""
+    router = getattr(app, "router", None)
+    if router is None:
+        return
     print_log("Available endpoints:")
-    for route in app.router.routes:
+    for route in router.routes:
         print_log(f"[{route.http_method}] {route.path}")
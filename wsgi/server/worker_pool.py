@@ -0,0 +1,149 @@
+"""A module containing the bounded worker thread pool."""
+
+import itertools
+import queue
+import threading
+import time
+
+from .log import print_log
+
+
+class WorkerPool:
+    """A class representing a pool of reusable worker threads.
+
+    Tasks wait in a bounded queue, `submit` blocks while the queue is full so
+    the caller (the accept loop) stops accepting and the kernel listen backlog
+    absorbs the burst. The pool grows from `min_threads` up to `max_threads`
+    when tasks are waiting and shrinks back once the extra threads are idle.
+    """
+
+    def __init__(
+        self,
+        min_threads: int,
+        max_threads: int,
+        queue_size: int,
+        idle_timeout: float,
+        name: str = "worker",
+    ) -> None:
+        """Initialize the worker pool.
+        Args:
+            min_threads (int): Threads kept alive even when idle.
+            max_threads (int): Upper limit of threads.
+            queue_size (int): Tasks waiting for a thread before submit blocks.
+            idle_timeout (float): Seconds an extra thread waits for a task before exiting.
+            name (str): The prefix of the thread names.
+        """
+        if not 0 < min_threads <= max_threads:
+            raise ValueError("Expected 0 < min_threads <= max_threads.")
+        self.min_threads = min_threads
+        self.max_threads = max_threads
+        self.queue_size = queue_size
+        self.idle_timeout = idle_timeout
+        self.name = name
+        self.tasks = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.threads = set()
+        self.thread_ids = itertools.count()
+        self.idle_threads = 0
+        self.running = False
+
+    def start(self):
+        """Start the minimum number of threads."""
+        self.running = True
+        with self.lock:
+            for _ in range(self.min_threads):
+                self._spawn()
+
+    def submit(self, task: callable):
+        """Queue a task, blocking while the queue is full.
+        Args:
+            task (callable): The callable to run in a worker thread.
+        """
+        self.tasks.put(task)
+        with self.lock:
+            if self.idle_threads < self.tasks.qsize() and len(self.threads) < self.max_threads:
+                self._spawn()
+
+    def shutdown(self, timeout: float = None):
+        """Stop the threads once the queued tasks are done. The threads exit
+        when they find the queue empty, a stop sentinel wakes the idle ones,
+        it is skipped when the queue is full (the threads are all busy then).
+        Args:
+            timeout (float, optional): Seconds to wait for the threads to finish.
+                Defaults to None, which returns without waiting.
+        """
+        self.running = False
+        with self.lock:
+            threads = list(self.threads)
+        for _ in threads:
+            try:
+                self.tasks.put_nowait(None)
+            except queue.Full:
+                break
+        if timeout is None:
+            return
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def stats(self) -> dict:
+        """Get the current utilization of the pool.
+        Returns:
+            dict: The thread and queue counters.
+        """
+        with self.lock:
+            threads = len(self.threads)
+            idle_threads = self.idle_threads
+        return {
+            "min_threads": self.min_threads,
+            "max_threads": self.max_threads,
+            "threads": threads,
+            "busy_threads": threads - idle_threads,
+            "idle_threads": idle_threads,
+            "queue_size": self.queue_size,
+            "queued_tasks": self.tasks.qsize(),
+        }
+
+    def _spawn(self):
+        """Start a new thread, the lock must be held."""
+        thread = threading.Thread(
+            target=self._work, name=f"{self.name}-{next(self.thread_ids)}", daemon=True
+        )
+        self.threads.add(thread)
+        self.idle_threads += 1
+        thread.start()
+
+    def _work(self):
+        """Run the queued tasks until the pool shuts down or the thread is
+        idle for too long and not needed to keep the minimum."""
+        thread = threading.current_thread()
+        while True:
+            try:
+                # Once the pool is stopping the thread only drains the queue
+                task = self.tasks.get(timeout=self.idle_timeout if self.running else 0)
+            except queue.Empty:
+                if not self.running:
+                    break
+                with self.lock:
+                    if len(self.threads) > self.min_threads:
+                        self.threads.discard(thread)
+                        self.idle_threads -= 1
+                        return
+                continue
+            if task is None:
+                break
+            with self.lock:
+                self.idle_threads -= 1
+                # submit may have counted this thread as idle, grow for the tasks left
+                if self.idle_threads < self.tasks.qsize() and len(self.threads) < self.max_threads:
+                    self._spawn()
+            try:
+                task()
+            except Exception as e:
+                print_log(f"An error occurred: {e}", error=True)
+            finally:
+                with self.lock:
+                    self.idle_threads += 1
+        with self.lock:
+            self.threads.discard(thread)
+            self.idle_threads -= 1
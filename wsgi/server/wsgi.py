@@ -1,10 +1,71 @@
 """A module for WSGI request and response classes."""
 
 from dataclasses import dataclass, field
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
 
+import os
+import sys
+from email.utils import formatdate
 from io import BytesIO
-from .http_response import make_response
+from urllib.parse import unquote
+from .constant import MAX_ENVIRON_KEYS, MAX_WRITE_BUFFERS, SERVER_NAME, WRITE_COALESCE_SIZE
+from .file_wrapper import FileWrapper
+from .http_response import make_header_block
+
+NO_BODY_STATUSES = ("204", "304")
+# The environ keys of the header names received, e.g. "User-Agent" -> "HTTP_USER_AGENT"
+ENVIRON_KEYS = {"Content-Type": "CONTENT_TYPE", "Content-Length": "CONTENT_LENGTH"}
+
+
+def get_environ_key(name: str) -> str:
+    """Get the environ key of a header name and cache it.
+    Args:
+        name (str): The header name as received.
+    Returns:
+        str: The environ key, empty for the names containing an underscore,
+            which would be confused with a dash once translated.
+    """
+    if "_" in name:
+        key = ""
+    else:
+        key = name.upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = sys.intern("HTTP_" + key)
+    if len(ENVIRON_KEYS) < MAX_ENVIRON_KEYS:
+        ENVIRON_KEYS[name] = key
+    return key
+
+
+def make_base_environ(
+    server_name: str, server_port: int, script_name: str = "", multiprocess: bool = False
+) -> dict:
+    """Build the environ keys shared by all the requests of a server.
+    Args:
+        server_name (str): The host name of the server.
+        server_port (int): The port the server is bound to.
+        script_name (str, optional): The path the application is mounted at.
+        multiprocess (bool, optional): Whether the application runs in several processes.
+    Returns:
+        dict: The base environ, copied for each request.
+    """
+    script_name = script_name.rstrip("/")
+    if script_name and not script_name.startswith("/"):
+        script_name = "/" + script_name
+    return {
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SCRIPT_NAME": script_name,
+        "CONTENT_TYPE": "",
+        "CONTENT_LENGTH": "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": multiprocess,
+        "wsgi.run_once": False,
+        "wsgi.input_terminated": True,
+        "wsgi.file_wrapper": FileWrapper,
+    }
 
 
 @dataclass
@@ -13,52 +74,264 @@ class WSGIRequest:
 
     http_method: str = ""
     path: str = ""
+    http_version: str = "HTTP/1.1"
     headers: List[Tuple[str, str]] = field(default_factory=lambda: [])
-    body: BytesIO = BytesIO()
-
-    def to_environ(self):
-        """Convert the request to a WSGI environ."""
-        path_parts = self.path.split("?")
-        headers_dict = {k: v for k, v in self.headers}
-        environ = {
-            "REQUEST_METHOD": self.http_method,
-            "PATH_INFO": path_parts[0],
-            "QUERY_STRING": path_parts[1] if len(path_parts) > 1 else "",
-            "SERVER_NAME": "127.0.0.1",
-            "SERVER_PORT": "5000",
-            "SERVER_PROTOCOL": "HTTP/1.1",
-            "CONTENT_TYPE": headers_dict.get("Content-Type", ""),
-            "CONTENT_LENGTH": headers_dict.get("Content-Length", ""),
-            "wsgi.version": (1, 0),
-            "wsgi.url_scheme": "http",
-            "wsgi.input": self.body,
-            "wsgi.errors": BytesIO(),
-            "wsgi.multithread": True,
-            "wsgi.multiprocess": False,
-            "wsgi.run_once": False,
-            **{f"HTTP_{name}": value for name, value in self.headers},
-        }
+    body: BytesIO = field(default_factory=BytesIO)
+    request_id: str = ""
+    # perf_counter times of the first byte, the request line, the end of the
+    # headers and of the message and the application call
+    first_byte_time: float = 0.0
+    start_time: float = 0.0
+    headers_time: float = 0.0
+    parsed_time: float = 0.0
+    app_start_time: float = 0.0
+    app_end_time: float = 0.0
+
+    def get_header(self, name: str) -> Optional[str]:
+        """Get the value of a header, the lookup is case-insensitive.
+        Args:
+            name (str): The header name.
+        Returns:
+            str: The header value or None if the header is not present.
+        """
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return None
+
+    def to_environ(self, base_environ: dict, client_address: Optional[tuple] = None) -> dict:
+        """Convert the request to a WSGI environ.
+        Args:
+            base_environ (dict): The keys shared by the requests of the server,
+                see `make_base_environ`.
+            client_address (tuple, optional): The address and port of the client.
+        Returns:
+            dict: The WSGI environ.
+        """
+        environ = base_environ.copy()
+        path, _, query = self.path.partition("?")
+        if "%" in path:
+            # PEP 3333: the decoded bytes of the path, as a latin-1 string
+            path = unquote(path, encoding="latin-1")
+        script_name = environ["SCRIPT_NAME"]
+        if script_name and path.startswith(script_name):
+            rest = path[len(script_name) :]
+            if not rest or rest[0] == "/":
+                path = rest
+        environ["REQUEST_METHOD"] = self.http_method
+        environ["PATH_INFO"] = path
+        environ["QUERY_STRING"] = query
+        environ["SERVER_PROTOCOL"] = self.http_version
+        environ["wsgi.input"] = self.body
+        if client_address:
+            environ["REMOTE_ADDR"] = client_address[0]
+            environ["REMOTE_PORT"] = str(client_address[1])
+        for name, value in self.headers:
+            key = ENVIRON_KEYS.get(name)
+            if key is None:
+                key = get_environ_key(name)
+            if not key:
+                continue
+            previous = environ.get(key)
+            if previous:
+                # Repeated headers are combined into one comma separated value
+                separator = "; " if key == "HTTP_COOKIE" else ","
+                environ[key] = previous + separator + value
+            else:
+                environ[key] = value
         return environ
 
 
 @dataclass
 class WSGIResponse:
-    """A class representing a WSGI response."""
+    """A class representing a WSGI response.
+
+    The response is streamed: the header block is sent with the first
+    non-empty body chunk and the chunks are sent as the application produces
+    them. Small writes are coalesced up to `WRITE_COALESCE_SIZE` and handed
+    to `send` as a list of buffers for scatter/gather I/O. Without a
+    Content-Length the body uses the chunked transfer coding (HTTP/1.1) or
+    is delimited by closing the connection (HTTP/1.0).
+    """
 
     status: str = ""
     headers: List[Tuple[str, str]] = field(default_factory=lambda: [])
-    body: BytesIO = BytesIO()
+    send: Optional[Callable[[List[bytes]], None]] = None
+    keep_alive: bool = True
+    http_version: str = "HTTP/1.1"
+    head: bool = False
+    content_length: Optional[int] = None
+    chunked: bool = False
+    headers_sent: bool = False
     is_sent: bool = False
+    bytes_sent: int = 0
+    pending: List[bytes] = field(default_factory=lambda: [])
+    pending_size: int = 0
 
     def start_response(
         self, status: str, headers: List[Tuple[str, str]], exc_info=None
     ):
-        """Start the response with the status and headers."""
-        print("Start response with", status, headers)
+        """Start the response with the status and headers.
+        Returns:
+            callable: The write callable.
+        """
+        if exc_info is not None:
+            try:
+                if self.headers_sent:
+                    raise exc_info[1].with_traceback(exc_info[2])
+            finally:
+                exc_info = None
+        elif self.status:
+            raise AssertionError("start_response was already called.")
         self.status = status
-        self.headers = headers
+        self.headers = list(headers)
+        return self.write
+
+    def prepare(self, request: WSGIRequest, keep_alive: bool):
+        """Set what the framing of the response depends on.
+        Args:
+            request (WSGIRequest): The request being answered.
+            keep_alive (bool): Whether the client allows reusing the connection.
+        """
+        self.keep_alive = keep_alive
+        self.http_version = request.http_version
+        self.head = request.http_method == "HEAD"
+
+    def set_length_hint(self, body_chunks):
+        """Remember the body length when the application returned a list or
+        tuple of chunks, so Content-Length can be sent instead of chunks.
+        Args:
+            body_chunks (iterable): The iterable returned by the application.
+        """
+        if isinstance(body_chunks, (list, tuple)):
+            self.content_length = sum(len(chunk) for chunk in body_chunks)
+
+    def get_header(self, name: str) -> Optional[str]:
+        """Get the value of a header, the lookup is case-insensitive.
+        Args:
+            name (str): The header name.
+        Returns:
+            str: The header value or None if the header is not present.
+        """
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return None
+
+    def set_connection_headers(self) -> Tuple[bool, Optional[bool]]:
+        """Add the framing headers, unless the application already set them,
+        and tell which of the pre-encoded headers the header block needs.
+        Returns:
+            tuple: Whether to add the Date and Server headers, and whether to
+            add a keep-alive (True) or close (False) Connection header, None
+            if the application set it.
+        """
+        names = {name.lower(): value for name, value in self.headers}
+        if self.status[:3] in NO_BODY_STATUSES or self.status[:1] == "1":
+            # These responses never have a body, they need no framing
+            self.head = True
+        elif "content-length" not in names:
+            if self.content_length is not None:
+                self.headers.append(("Content-Length", str(self.content_length)))
+            elif self.http_version == "HTTP/1.1":
+                self.headers.append(("Transfer-Encoding", "chunked"))
+                self.chunked = True
+            else:
+                # The end of the body is signaled by closing the connection
+                self.keep_alive = False
+        common = "date" not in names and "server" not in names
+        if not common:
+            # The application set one of them, add the other one
+            if "date" not in names:
+                self.headers.append(("Date", formatdate(usegmt=True)))
+            if "server" not in names:
+                self.headers.append(("Server", SERVER_NAME))
+        connection = names.get("connection")
+        if connection is None:
+            return common, self.keep_alive
+        if connection.lower() == "close":
+            self.keep_alive = False
+        return common, None
+
+    def send_headers(self):
+        """Queue the header block."""
+        if not self.status:
+            raise AssertionError("write was called before start_response.")
+        common, connection = self.set_connection_headers()
+        self.headers_sent = True
+        header_block = make_header_block(self.status, self.headers, common, connection)
+        self.pending.append(header_block)
+        self.pending_size += len(header_block)
+
+    def write(self, data: bytes):
+        """Write a body chunk, this is also the write callable of start_response.
+        Args:
+            data (bytes): The chunk.
+        """
+        if not data:
+            return
+        if not self.headers_sent:
+            self.send_headers()
+        if self.head:
+            return
+        if self.chunked:
+            self.pending.extend((b"%x\r\n" % len(data), data, b"\r\n"))
+        else:
+            self.pending.append(data)
+        self.pending_size += len(data)
+        if self.pending_size >= WRITE_COALESCE_SIZE or len(self.pending) >= MAX_WRITE_BUFFERS:
+            self.flush()
+
+    def flush(self):
+        """Send the pending buffers."""
+        if self.pending:
+            self.send(self.pending)
+            self.bytes_sent += self.pending_size
+            self.pending = []
+            self.pending_size = 0
+
+    def start_file(self, file_wrapper: FileWrapper):
+        """Send the header block of a `wsgi.file_wrapper` body that can be
+        sent with `os.sendfile`, the file is sent from its current position
+        for Content-Length bytes or up to its end.
+        Args:
+            file_wrapper (FileWrapper): The body returned by the application.
+        Returns:
+            tuple: The file, offset and byte count to send, None if the file
+                has no file descriptor and must be iterated instead.
+        """
+        fd = file_wrapper.fileno()
+        if fd is None or self.headers_sent:
+            return None
+        try:
+            offset = file_wrapper.filelike.tell()
+            size = os.fstat(fd).st_size
+        except (OSError, ValueError):
+            return None
+        content_length = self.get_header("Content-Length")
+        count = int(content_length) if content_length is not None else max(size - offset, 0)
+        self.content_length = count
+        self.send_headers()
+        self.flush()
+        if self.head:
+            count = 0
+        return file_wrapper.filelike, offset, count
+
+    def finish_file(self, count: int):
+        """Mark a file body sent.
+        Args:
+            count (int): The number of bytes of the file sent.
+        """
+        self.bytes_sent += count
+        self.is_sent = True
 
-    def to_http(self):
-        """Convert the response to a HTTP response message."""
+    def finish(self):
+        """Send the end of the response."""
+        if not self.headers_sent:
+            self.send_headers()
+        if self.chunked and not self.head:
+            self.pending.append(b"0\r\n\r\n")
+        self.flush()
         self.is_sent = True
-        return make_response(self.status, self.headers, self.body)
@@ -0,0 +1,249 @@
+"""Per-request phase traces in the Chrome trace event format.
+
+A trace holds the timeline of a request: the server records the accept,
+the first byte, the end of the headers and of the body, the wait for a
+thread, the application call and the send, the application records the
+route lookup, each middleware, the handler and the serialization of the
+response. The recent traces are kept in a ring buffer, the slow ones in a
+second buffer so the fast requests do not evict them. The export opens in
+a local trace viewer (chrome://tracing or ui.perfetto.dev), every request
+has its own track.
+
+Tracing is off until `enable` is called (the `trace_path` and
+`slow_request_threshold` server options do it), the instrumented code
+checks `tracer.enabled` first so disabled tracing costs a single branch.
+Each process has its own tracer, with several workers every worker keeps
+its own traces.
+"""
+
+import itertools
+import json
+import os
+import re
+import threading
+from collections import deque
+from typing import Iterable, List, Optional
+from urllib.parse import parse_qsl
+
+TRACE_BUFFER_SIZE = 256
+SLOW_TRACE_BUFFER_SIZE = 64
+# The environ keys of the request ID and of the trace of the request
+REQUEST_ID_ENVIRON_KEY = "own_wsgi.request_id"
+TRACE_ENVIRON_KEY = "own_wsgi.trace"
+# A request ID sent by a proxy is kept when it looks like one
+REQUEST_ID_PATTERN = re.compile(r"[\w.:@/+=-]{1,128}")
+
+request_id_prefix = os.urandom(4).hex()
+request_id_counter = itertools.count(1)
+
+
+def reset_request_ids():
+    """Give a forked worker its own request ID prefix."""
+    global request_id_prefix, request_id_counter
+    request_id_prefix = os.urandom(4).hex()
+    request_id_counter = itertools.count(1)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_request_ids)
+
+
+def get_request_id(environ: dict) -> str:
+    """Get the ID of a request, the X-Request-ID header or a new one.
+    Args:
+        environ (dict): The WSGI environ.
+    Returns:
+        str: The request ID, unique within the server when generated.
+    """
+    request_id = environ.get("HTTP_X_REQUEST_ID")
+    if request_id is not None and REQUEST_ID_PATTERN.fullmatch(request_id):
+        return request_id
+    return f"{request_id_prefix}-{next(request_id_counter):x}"
+
+
+class Trace:
+    """The spans of a request.
+
+    A span is a tuple: the name, the category, the perf_counter times of
+    its start and end (None for an instant) and its arguments. The spans
+    of a request are recorded by one thread at a time.
+    """
+
+    __slots__ = ("request_id", "index", "spans", "start", "end", "args")
+
+    def __init__(self, request_id: str, index: int):
+        self.request_id = request_id
+        self.index = index
+        self.spans = []
+        self.start = 0.0
+        self.end = 0.0
+        self.args = {}
+
+    @property
+    def duration(self) -> float:
+        """The seconds from the first byte to the end of the response."""
+        return self.end - self.start
+
+    def add_span(
+        self, name: str, start: float, end: float, category: str = "app", args: dict = None
+    ):
+        """Record a span.
+        Args:
+            name (str): The span name.
+            start (float): The perf_counter time of its start.
+            end (float): The perf_counter time of its end.
+            category (str, optional): "server", "parser" or "app". Defaults to "app".
+            args (dict, optional): The arguments shown with the span.
+        """
+        self.spans.append((name, category, start, end, args))
+
+    def add_instant(self, name: str, at: float, category: str = "server"):
+        """Record an instant event, e.g. the connection accepted."""
+        self.spans.append((name, category, at, None, None))
+
+    def to_events(self, pid: int) -> List[dict]:
+        """Convert the trace to Chrome trace events.
+        Args:
+            pid (int): The process ID.
+        Returns:
+            list: The events, on a track named after the request.
+        """
+        title = f"{self.args.get('method', '')} {self.args.get('path', '')} {self.request_id}"
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": self.index, "args": {"name": title}}
+        ]
+        # The enclosing spans first, the viewers nest the spans in this order
+        for name, category, start, end, args in sorted(
+            self.spans, key=lambda span: (span[2], -(span[3] or span[2]))
+        ):
+            event = {"name": name, "cat": category, "ts": start * 1e6, "pid": pid, "tid": self.index}
+            if end is None:
+                event["ph"] = "i"
+                event["s"] = "t"
+            else:
+                event["ph"] = "X"
+                event["dur"] = (end - start) * 1e6
+            if args:
+                event["args"] = args
+            events.append(event)
+        return events
+
+
+class Tracer:
+    """The recent and the slow traces of a process."""
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_threshold: Optional[float] = None
+        self.traces = deque(maxlen=TRACE_BUFFER_SIZE)
+        self.slow_traces = deque(maxlen=SLOW_TRACE_BUFFER_SIZE)
+        self.sequence = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def enable(
+        self,
+        buffer_size: int = TRACE_BUFFER_SIZE,
+        slow_threshold: Optional[float] = None,
+        slow_buffer_size: int = SLOW_TRACE_BUFFER_SIZE,
+    ):
+        """Start tracing the requests.
+        Args:
+            buffer_size (int, optional): The recent traces kept. Defaults to 256.
+            slow_threshold (float, optional): Keep the traces of the requests
+                taking at least these seconds in the slow traces.
+            slow_buffer_size (int, optional): The slow traces kept. Defaults to 64.
+        """
+        with self.lock:
+            self.traces = deque(self.traces, maxlen=buffer_size)
+            self.slow_traces = deque(self.slow_traces, maxlen=slow_buffer_size)
+        self.slow_threshold = slow_threshold
+        self.enabled = True
+
+    def disable(self):
+        """Stop tracing the requests, the traces are kept."""
+        self.enabled = False
+
+    def reset(self):
+        """Drop the traces."""
+        with self.lock:
+            self.traces.clear()
+            self.slow_traces.clear()
+
+    def start(self, request_id: str) -> Trace:
+        """Start the trace of a request."""
+        return Trace(request_id, next(self.sequence))
+
+    def finish(self, trace: Trace) -> bool:
+        """Keep a finished trace.
+        Args:
+            trace (Trace): The trace, with its start and end set.
+        Returns:
+            bool: Whether the request is slow.
+        """
+        slow = self.slow_threshold is not None and trace.duration >= self.slow_threshold
+        with self.lock:
+            self.traces.append(trace)
+            if slow:
+                self.slow_traces.append(trace)
+        return slow
+
+    def get_traces(self, slow: bool = False, request_id: Optional[str] = None) -> List[Trace]:
+        """Get the kept traces, the oldest first.
+        Args:
+            slow (bool, optional): Only the slow traces. Defaults to False.
+            request_id (str, optional): Only the traces of this request ID.
+        Returns:
+            list: The traces.
+        """
+        with self.lock:
+            traces = list(self.slow_traces if slow else self.traces)
+        if request_id is not None:
+            traces = [trace for trace in traces if trace.request_id == request_id]
+        return traces
+
+    @staticmethod
+    def export(traces: Iterable[Trace]) -> dict:
+        """Convert traces to the Chrome trace event format.
+        Args:
+            traces (iterable): The traces.
+        Returns:
+            dict: The JSON object to save as a .json file.
+        """
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"own-wsgi {pid}"}}]
+        for trace in traces:
+            events.extend(trace.to_events(pid))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: str, slow: bool = False) -> int:
+        """Write the kept traces to a file in the Chrome trace event format.
+        Args:
+            path (str): The file.
+            slow (bool, optional): Only the slow traces. Defaults to False.
+        Returns:
+            int: The number of traces written.
+        """
+        traces = self.get_traces(slow)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.export(traces), file)
+        return len(traces)
+
+    def trace_app(self, environ, start_response):
+        """A WSGI application answering the kept traces in the Chrome trace
+        event format, the query parameter slow=1 selects the slow traces and
+        request_id the traces of a request."""
+        query = dict(parse_qsl(environ.get("QUERY_STRING", "")))
+        traces = self.get_traces(query.get("slow") in ("1", "true"), query.get("request_id"))
+        body = json.dumps(self.export(traces)).encode("utf-8")
+        start_response(
+            "200 OK",
+            [
+                ("Content-Type", "application/json"),
+                ("Content-Length", str(len(body))),
+                ("Cache-Control", "no-store"),
+            ],
+        )
+        return [body]
+
+
+tracer = Tracer()